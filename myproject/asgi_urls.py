@@ -0,0 +1,14 @@
+"""
+URL configuration used for requests served over ASGI.
+
+Identical to ``myproject.urls`` except that userapp endpoints resolve to their
+native async implementations. Selected per request by
+``userapp.middleware.ASGIURLConfMiddleware``.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('userapp.async_urls'))
+]
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'userapp.middleware.ASGIURLConfMiddleware',
+    'userapp.middleware.MetricsMiddleware',
+    'userapp.middleware.ReadYourWritesMiddleware',
+    'userapp.middleware.ProfilingMiddleware',
+    'userapp.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,17 +78,75 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'myproject.wsgi.application'
 
+# Requests served over ASGI resolve against this URLconf, which maps the
+# userapp endpoints to their native async views (see ASGIURLConfMiddleware)
+ASGI_ROOT_URLCONF = 'myproject.asgi_urls'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# With tuning on, SQLite runs in WAL mode (readers never wait for the writer)
+# with the pragmas below, and transactions start with BEGIN IMMEDIATE: they
+# take the write lock up front and wait on busy_timeout for it, where a
+# deferred transaction that reads and then writes fails at once with
+# "database is locked". Connections are kept open between requests. Set
+# USERAPP_SQLITE_TUNING=0 to fall back to stock settings without the write
+# queue, e.g. to benchmark the difference.
+_SQLITE_TUNING = os.environ.get('USERAPP_SQLITE_TUNING', '1') != '0'
+_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable at each checkpoint rather than at every commit; WAL stays consistent either way
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # milliseconds
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,  # KiB
+    'mmap_size': 134217728,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in _SQLITE_PRAGMAS.items()),
+        } if _SQLITE_TUNING else {},
+        'CONN_MAX_AGE': 600 if _SQLITE_TUNING else 0,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+# A local read replica, kept in sync by `manage.py replicate` (userapp/replication.py)
+DATABASES['replica'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'db.replica.sqlite3'}
+
+# userapp reads go to these aliases and writes to 'default' (userapp/routers.py).
+# A client reads from 'default' for PIN_SECONDS after each successful write.
+DATABASE_ROUTERS = ['userapp.routers.PrimaryReplicaRouter']
+USERAPP_READ_REPLICAS = [alias for alias in os.environ.get('USERAPP_READ_REPLICAS', '').split(',') if alias]
+USERAPP_REPLICA_PIN_SECONDS = 5
+USERAPP_REPLICA_PIN_CACHE = 'default'
+
+# Registration inserts go through one writer thread that commits everything
+# queued meanwhile in a single transaction (userapp.write_queue). SQLite only.
+USERAPP_WRITE_QUEUE = _SQLITE_TUNING
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Local memory is per process; point 'default' at a shared backend (Redis,
+# Memcached) when running several workers so invalidation reaches all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
+# Read-through cache of organisation payloads (userapp.response_cache)
+USERAPP_RESPONSE_CACHE = 'default'
+USERAPP_RESPONSE_CACHE_TIMEOUT = 300  # seconds
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -102,6 +166,40 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.0/topics/auth/passwords/
+
+# The first hasher is used for new passwords; the others are still accepted and
+# stored hashes are upgraded to the preferred one on the next successful login.
+# Choose with USERAPP_PASSWORD_HASHER=pbkdf2|argon2|scrypt (argon2 needs argon2-cffi).
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+}
+_PREFERRED_HASHER = os.environ.get('USERAPP_PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[_PREFERRED_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != _PREFERRED_HASHER
+]
+
+# Hashing runs in a bounded thread pool (userapp.hashing); None means one worker per core
+USERAPP_HASHING_WORKERS = None
+# Requests beyond this many queued hashes are rejected with 503 instead of waiting
+USERAPP_HASHING_MAX_PENDING = None
+# Sync (WSGI) requests give up on a hash after this many seconds and get a 503,
+# so a backed-up pool cannot hold every worker; async requests hold no thread
+USERAPP_HASHING_TIMEOUT = 10
+
+# Rows per transaction for bulk user imports (api/users/import/, manage.py import_users)
+USERAPP_IMPORT_CHUNK_SIZE = 500
+
+# Most user ids accepted by one api/organisations/<orgId>/users/ call
+USERAPP_MEMBERSHIP_BATCH_LIMIT = 1000
+
+# Keyset pagination for organisation and member listings (clients pass ?pageSize=)
+USERAPP_PAGE_SIZE = 100
+USERAPP_MAX_PAGE_SIZE = 1000
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -124,3 +222,113 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+AUTH_USER_MODEL = 'userapp.User'
+
+# One indexed, case-insensitive query per login (userapp/backends.py)
+AUTHENTICATION_BACKENDS = ['userapp.backends.EmailBackend']
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'userapp.authentication.JWTAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'userapp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'userapp.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# drf_yasg UIs fetch the schema pre-rendered by `manage.py build_schema`
+# https://drf-yasg.readthedocs.io/en/stable/settings.html
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'schema-json',
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': 'schema-json',
+}
+# Where `manage.py build_schema` writes openapi.json/openapi.yaml
+USERAPP_SCHEMA_DIR = BASE_DIR / 'schema'
+USERAPP_SCHEMA_MAX_AGE = 86400  # seconds
+
+# Bounded per-process cache of verified user records used by JWTAuthentication.
+# Its entries, and those of the organisation id memo (userapp.permissions), are
+# checked against versions kept in USERAPP_AUTH_VERSION_CACHE, so a change in
+# one worker retires them in every worker sharing that cache.
+USERAPP_AUTH_CACHE_SIZE = 1024
+USERAPP_AUTH_CACHE_TTL = 60  # seconds
+USERAPP_AUTH_VERSION_CACHE = 'default'
+
+# Token buckets for login/registration, checked before any password hashing.
+# Per-scope overrides of userapp.throttling.DEFAULT_RATES, e.g. {'login_email': '5/min'}.
+# Rates use DRF's '<count>/<period>' syntax; None disables a scope.
+USERAPP_THROTTLE_RATES = {}
+# Cache alias shared by all workers for bucket state; None keeps buckets in-process
+USERAPP_THROTTLE_CACHE = None
+USERAPP_THROTTLE_SHARDS = 16
+USERAPP_THROTTLE_MAX_KEYS = 10000  # per shard
+
+# Refresh tokens are returned in the response body and as an httpOnly cookie
+# scoped to auth/refresh/ (lifetimes come from simplejwt's SIMPLE_JWT settings)
+USERAPP_REFRESH_COOKIE = 'refresh_token'
+USERAPP_REFRESH_COOKIE_SECURE = not DEBUG
+
+# Revoked-token filter (see userapp/revocation.py): sized for this many live
+# revocations at this false-positive rate, topped up from the database every
+# REFRESH seconds and rebuilt without expired entries every REBUILD seconds
+USERAPP_REVOCATION_FILTER_CAPACITY = 100000
+USERAPP_REVOCATION_FILTER_ERROR_RATE = 0.001
+USERAPP_REVOCATION_REFRESH = 30
+USERAPP_REVOCATION_REBUILD = 3600
+
+# Per-request SQL instrumentation (userapp.middleware.QueryInstrumentationMiddleware).
+# Requests are logged to 'userapp.queries' at DEBUG, or WARNING past WARN_COUNT
+# statements or when one statement repeats more than REPEAT_LIMIT times.
+# HEADERS adds X-DB-Queries/X-DB-Time to every response.
+USERAPP_QUERY_INSTRUMENTATION = True
+USERAPP_QUERY_HEADERS = False
+USERAPP_QUERY_WARN_COUNT = 20
+USERAPP_QUERY_REPEAT_LIMIT = 5
+
+# Request profiling (userapp.middleware.ProfilingMiddleware), off unless one of
+# SAMPLE_RATE, PATHS or TOKEN is set. A request is profiled when a random draw
+# falls under SAMPLE_RATE, its path starts with one of PATHS, or it sends
+# 'X-Profile: <TOKEN>'. MODE is 'cprofile' (.pstats files) or 'sample' (a stack
+# sampler every INTERVAL seconds, collapsed stacks for flame graphs). Each view's
+# profile is written to DIR after FLUSH_EVERY samples; DIR keeps MAX_FILES files.
+USERAPP_PROFILE_SAMPLE_RATE = 0
+USERAPP_PROFILE_PATHS = []
+USERAPP_PROFILE_TOKEN = os.environ.get('USERAPP_PROFILE_TOKEN')
+USERAPP_PROFILE_MODE = 'cprofile'
+USERAPP_PROFILE_INTERVAL = 0.005
+USERAPP_PROFILE_DIR = BASE_DIR / 'profiles'
+USERAPP_PROFILE_FLUSH_EVERY = 20
+USERAPP_PROFILE_MAX_FILES = 200
+
+# Prometheus metrics served at /metrics/ (userapp.metrics). With TOKEN set,
+# scrapes must send 'Authorization: Bearer <TOKEN>'. Under gunicorn or any
+# other multi-process server, point DIR at a directory shared by the workers
+# and clear it on start: each process writes its totals there every
+# FLUSH_INTERVAL seconds and a scrape adds them up.
+USERAPP_METRICS_DIR = os.environ.get('USERAPP_METRICS_DIR') or None
+USERAPP_METRICS_FLUSH_INTERVAL = 5
+USERAPP_METRICS_TOKEN = os.environ.get('USERAPP_METRICS_TOKEN')
+
+# Search endpoints (userapp/search.py): words shorter than this are ignored
+USERAPP_SEARCH_MIN_LENGTH = 2
+
+# Membership export (userapp/export.py): rows fetched and encoded per chunk
+USERAPP_EXPORT_CHUNK_SIZE = 2000
+
+# Registration responses kept for replay to retries sent with the same
+# Idempotency-Key header (see userapp/registration.py)
+USERAPP_IDEMPOTENCY_TTL = 86400  # seconds
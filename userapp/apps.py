@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class UserappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userapp'
+
+    def ready(self):
+        from . import instrumentation, search, signals  # noqa: F401
+        # Before any connection opens, so every thread's connection is wrapped
+        instrumentation.install()
+        post_migrate.connect(search.reinstall_triggers, sender=self)
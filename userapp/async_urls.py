@@ -0,0 +1,10 @@
+from django.urls import path
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# Same routes and names as urls.py; endpoints with a native async implementation use it
+urlpatterns = [
+    path(str(pattern.pattern), getattr(async_views, pattern.name), name=pattern.name)
+    if pattern.name in async_views.__all__ else pattern
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,434 @@
+"""
+Native async versions of the auth and organisation endpoints.
+
+These are served instead of the DRF views when the project runs under ASGI
+(see ``ASGIURLConfMiddleware``). They return the same envelopes as the views
+in ``views.py`` but use the async ORM and await password hashing on the
+hashing pool, so an idle or slow client never holds a thread.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from . import export, hashing, registration, search, throttling, tokens
+from .authentication import JWTAuthentication
+from .hashing import HashingQueueFull
+from .membership import add_members, parse_user_ids
+from .fast_serializers import organisation_serializer, user_serializer
+from .pagination import KeysetPagination
+from .parsers import parse_json
+from .renderers import render_json
+from . import response_cache
+from .models import Organisation, User
+from .permissions import aget_org_ids, ashares_organisation
+from .serializers import OrganisationSerializer, UserSerializer
+from .write_queue import write_queue
+
+__all__ = [
+    'register_user', 'login_user', 'get_user_details', 'get_organisations',
+    'get_organisation', 'get_organisation_members', 'create_organisation', 'add_user_to_organisation',
+    'search_organisations', 'search_users', 'export_memberships', 'health',
+]
+
+authenticator = JWTAuthentication()
+
+
+def json_response(data, status_code, headers=None):
+    # Rendered by the same renderer as the DRF views so both stacks emit the same bytes
+    return HttpResponse(render_json(data), status=status_code, headers=headers, content_type='application/json')
+
+
+def parse_body(request):
+    if request.method not in ('POST', 'PUT', 'PATCH'):
+        return {}
+    if request.content_type == 'application/json':
+        return parse_json(request.body or b'{}')
+    return request.POST
+
+
+def async_api_view(http_method_names, authenticated=False, throttle_classes=()):
+    """ Async counterpart of ``@api_view`` + ``@permission_classes`` for the views below """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in http_method_names:
+                return json_response(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status.HTTP_405_METHOD_NOT_ALLOWED, {'Allow': ', '.join(http_method_names)},
+                )
+            try:
+                if authenticated:
+                    result = await authenticator.aauthenticate(request)
+                    if result is None:
+                        raise exceptions.NotAuthenticated()
+                    request.user, request.auth = result
+                request.data = parse_body(request)
+                check_throttles(request, throttle_classes)
+            except exceptions.APIException as exc:
+                headers = None
+                if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                    headers = {'WWW-Authenticate': authenticator.authenticate_header(request)}
+                if getattr(exc, 'wait', None):
+                    headers = {'Retry-After': '%d' % exc.wait}
+                return json_response({'detail': exc.detail}, exc.status_code, headers)
+            return await view(request, *args, **kwargs)
+        # Like DRF views, these authenticate with bearer tokens rather than session cookies
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def check_throttles(request, throttle_classes):
+    """ Same as DRF's APIView.check_throttles(): consult every throttle, wait for the slowest """
+    waits = []
+    for throttle in (throttle_class() for throttle_class in throttle_classes):
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait())
+    if waits:
+        raise exceptions.Throttled(max(wait for wait in waits if wait is not None))
+
+
+def hashing_unavailable_response():
+    return json_response({
+        'status': 'Service Unavailable',
+        'message': 'Server is busy, please retry shortly',
+        'statusCode': status.HTTP_503_SERVICE_UNAVAILABLE
+    }, status.HTTP_503_SERVICE_UNAVAILABLE, {'Retry-After': '1'})
+
+
+def registration_response(body, replayed=False):
+    headers = {'Idempotent-Replayed': 'true'} if replayed else None
+    response = json_response(body, status.HTTP_201_CREATED, headers)
+    return tokens.set_refresh_cookie(response, body['data']['refreshToken'])
+
+
+async def replayed_registration(idempotency):
+    """ The stored response of the registration made with this idempotency key, or None """
+    try:
+        body = await sync_to_async(registration.replay)(idempotency)
+    except registration.IdempotencyKeyReused as e:
+        return json_response({
+            'status': 'Unprocessable Entity',
+            'message': str(e),
+            'statusCode': status.HTTP_422_UNPROCESSABLE_ENTITY
+        }, status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return registration_response(body, replayed=True) if body is not None else None
+
+
+@async_api_view(['POST'], throttle_classes=throttling.REGISTER_THROTTLES)
+async def register_user(request):
+    try:
+        idempotency = registration.idempotency(request.headers.get(registration.IDEMPOTENCY_HEADER), request.data)
+    except ValueError as e:
+        return json_response({
+            'status': 'Bad request',
+            'message': str(e),
+            'statusCode': status.HTTP_400_BAD_REQUEST
+        }, status.HTTP_400_BAD_REQUEST)
+    replayed = await replayed_registration(idempotency)
+    if replayed is not None:
+        return replayed
+
+    serializer = UserSerializer(data=request.data)
+    # Validation includes the unique-email lookup, which only has a sync implementation
+    if await sync_to_async(serializer.is_valid)():
+        try:
+            encoded = await hashing.amake_password(serializer.validated_data['password'])
+        except HashingQueueFull:
+            return hashing_unavailable_response()
+        # The user, their default organisation, the refresh token and the idempotency key commit together
+        try:
+            body = await write_queue.arun(registration.register, serializer.validated_data, encoded, idempotency)
+        except IntegrityError:
+            replayed = await replayed_registration(idempotency)
+            if replayed is not None:
+                return replayed
+            serializer = UserSerializer(data=request.data)
+            if await sync_to_async(serializer.is_valid)():
+                raise
+        else:
+            return registration_response(body)
+    else:
+        replayed = await replayed_registration(idempotency)
+        if replayed is not None:
+            return replayed
+    return json_response({
+        'status': 'Bad request',
+        'message': 'Registration unsuccessful',
+        'errors': serializer.errors
+    }, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view(['POST'], throttle_classes=throttling.LOGIN_THROTTLES)
+async def login_user(request):
+    email = request.data.get('email')
+    password = request.data.get('password')
+    try:
+        user = await aauthenticate(request, email=email, password=password)
+    except HashingQueueFull:
+        return hashing_unavailable_response()
+
+    if user:
+        refresh = await sync_to_async(tokens.issue_refresh_token)(user)
+        pair = tokens.encode_pair(refresh)
+        return tokens.set_refresh_cookie(json_response({
+            'status': 'success',
+            'message': 'Login successful',
+            'data': {
+                **pair,
+                'user': user_serializer.one(user)
+            }
+        }, status.HTTP_200_OK), pair['refreshToken'])
+    return json_response({
+        'status': 'Bad request',
+        'message': 'Authentication failed',
+        'statusCode': status.HTTP_401_UNAUTHORIZED
+    }, status.HTTP_401_UNAUTHORIZED)
+
+
+@async_api_view(['GET'], authenticated=True)
+async def get_user_details(request, id):
+    try:
+        user = await User.objects.aget(id=id)
+    except User.DoesNotExist:
+        return json_response({
+            'status': 'Not Found',
+            'message': 'User not found'
+        }, status.HTTP_404_NOT_FOUND)
+    if await ashares_organisation(request.user, user):
+        return json_response({
+            'status': 'success',
+            'message': 'User details retrieved',
+            'data': user_serializer.one(user)
+        }, status.HTTP_200_OK)
+    return json_response({
+        'status': 'Forbidden',
+        'message': 'You do not have permission to access this user details'
+    }, status.HTTP_403_FORBIDDEN)
+
+
+def invalid_cursor_response():
+    return json_response({
+        'status': 'Bad Request',
+        'message': 'Invalid cursor'
+    }, status.HTTP_400_BAD_REQUEST)
+
+
+async def paginate(queryset, request):
+    paginator = KeysetPagination()
+    # The paginator reads query params through DRF's Request wrapper
+    page = await sync_to_async(paginator.paginate_queryset)(queryset, Request(request))
+    return paginator, page
+
+
+@async_api_view(['GET'], authenticated=True)
+async def get_organisations(request):
+    try:
+        data = await sync_to_async(response_cache.get_organisations_page)(Request(request), request.user)
+        return json_response({
+            'status': 'success',
+            'message': 'Organisations retrieved',
+            'data': data
+        }, status.HTTP_200_OK)
+    except exceptions.NotFound:
+        return invalid_cursor_response()
+    except Exception as e:
+        return json_response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to retrieve organisations',
+            'error': str(e)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['GET'], authenticated=True)
+async def get_organisation_members(request, orgId):
+    try:
+        if not orgId.isdigit():
+            raise Organisation.DoesNotExist
+        organisation = await request.user.organisations.aget(id=orgId)
+        paginator, members = await paginate(organisation.members.values('id', *user_serializer.value_fields), request)
+        return json_response({
+            'status': 'success',
+            'message': 'Members retrieved',
+            'data': paginator.get_page_data('users', user_serializer.many(members))
+        }, status.HTTP_200_OK)
+    except Organisation.DoesNotExist:
+        return json_response({
+            'status': 'Not Found',
+            'message': 'Organisation not found'
+        }, status.HTTP_404_NOT_FOUND)
+    except exceptions.NotFound:
+        return invalid_cursor_response()
+    except Exception as e:
+        return json_response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to retrieve members',
+            'error': str(e)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def invalid_search_response():
+    return json_response({
+        'status': 'Bad Request',
+        'message': 'Search query needs a word of at least %d characters' % getattr(settings, 'USERAPP_SEARCH_MIN_LENGTH', 2)
+    }, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view(['GET'], authenticated=True)
+async def search_organisations(request):
+    words = search.parse_query(request.GET.get('q'))
+    if not words:
+        return invalid_search_response()
+    try:
+        queryset = search.organisations(await aget_org_ids(request.user), words)
+        paginator, rows = await paginate(queryset.values('id', *organisation_serializer.value_fields), request)
+        return json_response({
+            'status': 'success',
+            'message': 'Organisations found',
+            'data': paginator.get_page_data('organisations', organisation_serializer.many(rows))
+        }, status.HTTP_200_OK)
+    except exceptions.NotFound:
+        return invalid_cursor_response()
+    except Exception as e:
+        return json_response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to search organisations',
+            'error': str(e)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['GET'], authenticated=True)
+async def search_users(request):
+    words = search.parse_query(request.GET.get('q'))
+    if not words:
+        return invalid_search_response()
+    try:
+        queryset = search.users(await aget_org_ids(request.user), words)
+        paginator, rows = await paginate(queryset.values('id', *user_serializer.value_fields), request)
+        return json_response({
+            'status': 'success',
+            'message': 'Users found',
+            'data': paginator.get_page_data('users', user_serializer.many(rows))
+        }, status.HTTP_200_OK)
+    except exceptions.NotFound:
+        return invalid_cursor_response()
+    except Exception as e:
+        return json_response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to search users',
+            'error': str(e)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['GET'], authenticated=True)
+async def export_memberships(request):
+    try:
+        exporter = export.Exporter(request.GET.get('fmt', 'ndjson'), request.GET.get('compress'))
+        after = export.decode_cursor(request.GET.get('cursor'))
+    except ValueError as e:
+        return json_response({
+            'status': 'Bad Request',
+            'message': str(e)
+        }, status.HTTP_400_BAD_REQUEST)
+    querysets = export.memberships(await aget_org_ids(request.user), after)
+    return exporter.response(export.astream(exporter, querysets))
+
+
+@async_api_view(['GET'], authenticated=True)
+async def get_organisation(request, orgId):
+    try:
+        payload = None
+        if orgId.isdigit() and int(orgId) in await aget_org_ids(request.user):
+            payload = await sync_to_async(response_cache.get_organisation_payload)(int(orgId))
+        if payload is None:
+            raise Organisation.DoesNotExist
+        return json_response({
+            'status': 'success',
+            'message': 'Organisation retrieved',
+            'data': payload
+        }, status.HTTP_200_OK)
+    except Organisation.DoesNotExist:
+        return json_response({
+            'status': 'Not Found',
+            'message': 'Organisation not found'
+        }, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return json_response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to retrieve organisation',
+            'error': str(e)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['POST'], authenticated=True)
+async def create_organisation(request):
+    try:
+        serializer = OrganisationSerializer(data=request.data)
+        if serializer.is_valid():
+            organisation = await Organisation.objects.acreate(**serializer.validated_data)
+            await request.user.organisations.aadd(organisation)
+            return json_response({
+                'status': 'success',
+                'message': 'Organisation created successfully',
+                'data': OrganisationSerializer(organisation).data
+            }, status.HTTP_201_CREATED)
+        return json_response({
+            'status': 'Bad Request',
+            'message': 'Failed to create organisation',
+            'errors': serializer.errors
+        }, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return json_response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to create organisation',
+            'error': str(e)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['POST'], authenticated=True)
+async def add_user_to_organisation(request, orgId):
+    try:
+        organisation = await request.user.organisations.aget(id=orgId)
+        try:
+            user_ids, is_batch = parse_user_ids(
+                request.data, getattr(settings, 'USERAPP_MEMBERSHIP_BATCH_LIMIT', 1000)
+            )
+        except ValueError as e:
+            return json_response({
+                'status': 'Bad Request',
+                'message': str(e)
+            }, status.HTTP_400_BAD_REQUEST)
+
+        added, already_members, unknown = await sync_to_async(add_members)(organisation, user_ids)
+        if not is_batch and unknown:
+            raise User.DoesNotExist
+
+        return json_response({
+            'status': 'success',
+            'message': 'Users added to organisation' if is_batch else 'User added to organisation successfully',
+            'data': {'added': added, 'alreadyMembers': already_members, 'unknown': unknown}
+        }, status.HTTP_200_OK)
+    except Organisation.DoesNotExist:
+        return json_response({
+            'status': 'Not Found',
+            'message': 'Organisation not found'
+        }, status.HTTP_404_NOT_FOUND)
+    except User.DoesNotExist:
+        return json_response({
+            'status': 'Not Found',
+            'message': 'User not found'
+        }, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return json_response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to add user to organisation',
+            'error': str(e)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def health(request):
+    return JsonResponse({'status': 'ok'})
@@ -0,0 +1,65 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from .revocation import ais_revoked, is_revoked
+from .routers import identify_user
+from .utils import aget_cached_user, decode_access_token_claims, get_cached_user
+
+
+class JWTAuthentication(BaseAuthentication):
+    """
+    Bearer token authentication built on ``decode_access_token``.
+
+    The token signature and expiry are verified locally, the user record is
+    served from the bounded user cache and revocation is checked against the
+    user's cutoff and an in-memory filter, so a warm client is authenticated
+    without touching the database.
+    """
+    keyword = 'Bearer'
+
+    def get_claims(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid Authorization header.'))
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        claims = decode_access_token_claims(token)
+        if claims is None:
+            raise exceptions.AuthenticationFailed(_('Invalid or expired token.'))
+        # Before the user is loaded, so a client that just wrote reads it back from the primary
+        identify_user(claims['user_id'])
+        return claims
+
+    def check_user(self, user):
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User not found or inactive.'))
+
+    def authenticate(self, request):
+        claims = self.get_claims(request)
+        if claims is None:
+            return None
+        user = get_cached_user(claims['user_id'])
+        self.check_user(user)
+        if is_revoked(claims, user):
+            raise exceptions.AuthenticationFailed(_('Token has been revoked.'))
+        return (user, claims)
+
+    async def aauthenticate(self, request):
+        """ Async version of authenticate(), used by the ASGI views """
+        claims = self.get_claims(request)
+        if claims is None:
+            return None
+        user = await aget_cached_user(claims['user_id'])
+        self.check_user(user)
+        if await ais_revoked(claims, user):
+            raise exceptions.AuthenticationFailed(_('Token has been revoked.'))
+        return (user, claims)
+
+    def authenticate_header(self, request):
+        return self.keyword
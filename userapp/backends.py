@@ -0,0 +1,58 @@
+"""
+Email/password authentication in one indexed query.
+
+Users are looked up by ``User.normalized_email``, so ``Ada@Example.com`` and
+``ada@example.com`` hit the same index entry. Only the columns read by the
+password check and the login response are loaded. Unknown emails still cost
+one password hash, run in the hashing pool like a real check, so response
+time does not reveal whether an address is registered.
+"""
+from django.contrib.auth.backends import ModelBackend
+from . import hashing
+from .fast_serializers import user_serializer
+from .models import User, normalize_email_key
+
+# Read by check_password(), user_can_authenticate(), token minting and the login response
+LOGIN_FIELDS = ('password', 'is_active', *user_serializer.value_fields)
+
+
+def _pick(users, email):
+    if len(users) == 1:
+        return users[0]
+    # Rows from before normalisation that differ only in case: only an exact match is unambiguous
+    email = User.objects.normalize_email(email.strip())
+    return next((user for user in users if user.email == email), None)
+
+
+class EmailBackend(ModelBackend):
+
+    def candidates(self, email):
+        return User.objects.filter(normalized_email=normalize_email_key(email)).only(*LOGIN_FIELDS)[:2]
+
+    def authenticate(self, request, email=None, password=None, username=None, **kwargs):
+        email = email if email is not None else username
+        if not email or password is None:
+            return None
+        # A JSON body can carry any type; non-strings fail like an unknown email rather than error
+        valid = isinstance(email, str) and isinstance(password, str)
+        user = _pick(list(self.candidates(email)), email) if valid else None
+        if user is None:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            hashing.make_password(password if valid else '')
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, email=None, password=None, username=None, **kwargs):
+        email = email if email is not None else username
+        if not email or password is None:
+            return None
+        valid = isinstance(email, str) and isinstance(password, str)
+        user = _pick([user async for user in self.candidates(email)], email) if valid else None
+        if user is None:
+            await hashing.amake_password(password if valid else '')
+            return None
+        if await user.acheck_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,158 @@
+"""
+Streaming bulk user import.
+
+Rows are read incrementally from CSV or NDJSON and handled in chunks: each
+chunk is validated, its passwords are hashed in parallel on a dedicated
+hashing pool, and its users, default organisations and memberships are
+written with ``bulk_create`` inside one transaction. Rows that fail are
+recorded in the report instead of aborting the import.
+"""
+import codecs
+import csv
+import json
+from django.contrib.auth import hashers
+from django.db import IntegrityError, transaction
+from .hashing import HashingService
+from .models import Membership, Organisation, User, normalize_email_key
+from .serializers import UserSerializer
+from .utils import generate_id
+
+FORMATS = ('csv', 'ndjson')
+
+
+class UserImportSerializer(UserSerializer):
+
+    def validate_email(self, value):
+        # Uniqueness is checked once per chunk rather than with a query per row
+        return value
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': len(self.errors), 'errors': self.errors}
+
+
+def iter_rows(lines, fmt):
+    """
+    Yield ``(line_number, row)`` pairs from an iterable of text or byte lines.
+    Unparseable NDJSON lines are yielded with ``row=None``.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported import format: {fmt}')
+    lines = (line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def iter_byte_lines(stream):
+    """ Split a binary stream (an upload or a request body) into decoded lines """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    for chunk in iter(lambda: stream.read(64 * 1024), b''):
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def import_users(rows, chunk_size=500, hashing=None):
+    """ Import ``(line_number, row)`` pairs from iter_rows() and return an ImportReport """
+    report = ImportReport()
+    own_pool = hashing is None
+    if own_pool:
+        hashing = HashingService(max_pending=chunk_size)
+    try:
+        chunk = []
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                _import_chunk(chunk, hashing, report)
+                chunk = []
+        if chunk:
+            _import_chunk(chunk, hashing, report)
+    finally:
+        if own_pool:
+            hashing.shutdown()
+    return report
+
+
+def _import_chunk(chunk, hashing, report):
+    valid = []
+    for line, row in chunk:
+        if row is None:
+            report.add_error(line, {'non_field_errors': ['Row is not a JSON object.']})
+            continue
+        serializer = UserImportSerializer(data=row)
+        if not serializer.is_valid():
+            report.add_error(line, serializer.errors)
+            continue
+        data = dict(serializer.validated_data)
+        data['email'] = User.objects.normalize_email(data['email'])
+        valid.append((line, data))
+
+    # Reject emails that already exist or repeat within the chunk, in any capitalisation
+    existing = set(User.objects.filter(
+        normalized_email__in=[normalize_email_key(data['email']) for _, data in valid],
+    ).values_list('normalized_email', flat=True))
+    unique = []
+    for line, data in valid:
+        key = normalize_email_key(data['email'])
+        if key in existing:
+            report.add_error(line, {'email': ['user with this email already exists.']})
+            continue
+        existing.add(key)
+        unique.append((line, data))
+
+    # Hash the whole chunk in parallel
+    futures = [hashing.submit(hashers.make_password, data.pop('password')) for _, data in unique]
+    users = [
+        (line, User(userId=generate_id(), password=future.result(), **data))
+        for (line, data), future in zip(unique, futures)
+    ]
+
+    try:
+        with transaction.atomic():
+            _write_users([user for _, user in users])
+        report.created += len(users)
+    except IntegrityError:
+        # Something raced us (e.g. a concurrent registration); retry row by row
+        for line, user in users:
+            try:
+                with transaction.atomic():
+                    user.pk = None
+                    _write_users([user])
+                report.created += 1
+            except IntegrityError as e:
+                report.add_error(line, {'non_field_errors': [str(e)]})
+
+
+def _write_users(users):
+    User.objects.bulk_create(users)
+    organisations = Organisation.objects.bulk_create(
+        Organisation(orgId=generate_id(), name=f"{user.firstName}'s Organisation") for user in users
+    )
+    Membership.objects.bulk_create(
+        Membership(user=user, organisation=organisation) for user, organisation in zip(users, organisations)
+    )
@@ -0,0 +1,81 @@
+# cache.py
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.db import transaction
+
+_MISSING = object()
+
+
+class LRUCache:
+    """ Thread-safe, size-bounded LRU cache whose entries expire after ``ttl`` seconds """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_versions(cache, keys):
+    """
+    ``{key: current version}`` for these version keys in the Django ``cache``.
+    A fill reads the version before its query and stores what it read under
+    it; an invalidation replaces the version (see bump_versions()), so a fill
+    that raced it is never read back.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from a fresh value, so an evicted version can never resurrect old entries
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def bump_versions(cache, keys):
+    """ Replace these versions now and again once the surrounding transaction commits """
+    def bump():
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+    now_and_on_commit(bump)
+
+
+def now_and_on_commit(fn):
+    fn()
+    transaction.on_commit(fn)
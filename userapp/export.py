@@ -0,0 +1,146 @@
+"""
+Streaming export of the memberships of a user's organisations.
+
+Rows are read from ``Membership`` joined to its organisation and user. They
+are ordered by (organisation id, user id), so they come straight off
+``membership_org_user_idx`` without a sort. ``.iterator()`` fetches them
+``USERAPP_EXPORT_CHUNK_SIZE`` rows at a time, and each chunk is encoded
+(and compressed) before the next is read. Memory therefore stays flat
+however large the export is.
+
+Every row carries a ``cursor``. Sending the last one received as
+``?cursor=`` resumes an interrupted export after that row.
+"""
+import csv
+import io
+import zlib
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from .models import Membership
+from .renderers import render_json
+
+COLUMNS = (
+    'cursor', 'orgId', 'organisationName', 'userId', 'firstName', 'lastName', 'email', 'phone', 'dateJoined',
+)
+_VALUES = (
+    'organisation_id', 'user_id', 'organisation__orgId', 'organisation__name', 'user__userId',
+    'user__firstName', 'user__lastName', 'user__email', 'user__phone', 'date_joined',
+)
+_dates = serializers.DateTimeField()
+# Ids beyond a signed 64-bit integer overflow when bound to the query, after the response has started
+_MAX_ID = 2 ** 63 - 1
+
+
+def chunk_size():
+    return getattr(settings, 'USERAPP_EXPORT_CHUNK_SIZE', 2000)
+
+
+def encode_cursor(organisation_id, user_id):
+    return f'{organisation_id}.{user_id}'
+
+
+def decode_cursor(cursor):
+    """ ``(organisation_id, user_id)`` of the row to resume after, or None to start at the beginning """
+    if not cursor:
+        return None
+    try:
+        organisation_id, user_id = map(int, cursor.split('.'))
+    except ValueError:
+        raise ValueError('Invalid cursor') from None
+    if not all(-_MAX_ID - 1 <= value <= _MAX_ID for value in (organisation_id, user_id)):
+        raise ValueError('Invalid cursor')
+    return organisation_id, user_id
+
+
+def memberships(org_ids, after=None):
+    """
+    The querysets to read in turn. Resuming inside an organisation is its own
+    index range, as an OR of the two ranges would make the database sort.
+    """
+    rows = Membership.objects.order_by('organisation_id', 'user_id').values_list(*_VALUES)
+    if after is None:
+        return [rows.filter(organisation_id__in=sorted(org_ids))] if org_ids else []
+    organisation_id, user_id = after
+    querysets = []
+    if organisation_id in org_ids:
+        querysets.append(rows.filter(organisation_id=organisation_id, user_id__gt=user_id))
+    later = sorted(org_id for org_id in org_ids if org_id > organisation_id)
+    if later:
+        querysets.append(rows.filter(organisation_id__in=later))
+    return querysets
+
+
+def _record(row):
+    organisation_id, user_id, *values, date_joined = row
+    return (encode_cursor(organisation_id, user_id), *values, _dates.to_representation(date_joined))
+
+
+class Exporter:
+    """ Encodes rows as NDJSON or CSV, optionally gzipped, a chunk at a time """
+    formats = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+    def __init__(self, fmt='ndjson', compress=None):
+        if fmt not in self.formats:
+            raise ValueError(f"Unknown format {fmt!r}; use {' or '.join(self.formats)}")
+        if compress not in (None, '', 'gzip'):
+            raise ValueError(f"Unknown compression {compress!r}; use gzip")
+        self.fmt = fmt
+        # wbits=31: gzip framing rather than a bare zlib stream
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def _output(self, data):
+        return self.compressor.compress(data) if self.compressor else data
+
+    def start(self):
+        return self._output(self.encode_csv([COLUMNS]) if self.fmt == 'csv' else b'')
+
+    def encode(self, rows):
+        records = [_record(row) for row in rows]
+        if self.fmt == 'csv':
+            return self._output(self.encode_csv(records))
+        return self._output(b''.join(render_json(dict(zip(COLUMNS, record))) + b'\n' for record in records))
+
+    def encode_csv(self, records):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(records)
+        return buffer.getvalue().encode()
+
+    def finish(self):
+        return self.compressor.flush() if self.compressor else b''
+
+    def response(self, content):
+        filename = f'memberships.{self.fmt}' + ('.gz' if self.compressor else '')
+        return StreamingHttpResponse(
+            content,
+            content_type='application/gzip' if self.compressor else self.formats[self.fmt],
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Cache-Control': 'no-store',
+                # Ask proxies such as nginx to pass chunks on instead of buffering the whole export
+                'X-Accel-Buffering': 'no',
+            },
+        )
+
+
+def stream(exporter, querysets):
+    size = chunk_size()
+    yield exporter.start()
+    for queryset in querysets:
+        rows = queryset.iterator(chunk_size=size)
+        while batch := list(islice(rows, size)):
+            yield exporter.encode(batch)
+    yield exporter.finish()
+
+
+async def astream(exporter, querysets):
+    """
+    Async version of stream(); ASGI would otherwise read a sync stream whole
+    before sending it. Each chunk is read and encoded in the sync thread, so
+    neither the query nor the encoding blocks the event loop.
+    """
+    chunks = stream(exporter, querysets)
+    while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+        yield chunk
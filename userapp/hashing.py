@@ -0,0 +1,130 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2, scrypt and Argon2 all release the GIL while they work, so a bounded
+thread pool spreads hashing across cores while keeping a cap on how much
+hashing can be queued at once. When the queue is full callers get
+``HashingQueueFull`` straight away instead of piling up behind the pool,
+which leaves request workers free for the cheap endpoints.
+
+The async functions await the pool without holding a thread. The sync ones
+still block their request thread (a WSGI worker) until the hash is done, so
+they give up after ``USERAPP_HASHING_TIMEOUT`` seconds with
+``HashingTimeout``, which views answer with 503 like a full queue.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+from .metrics import password_hash_seconds
+
+
+class HashingQueueFull(Exception):
+    """ Raised when the hashing queue is at its depth limit """
+
+
+class HashingTimeout(HashingQueueFull):
+    """ Raised when a sync caller has waited ``timeout`` seconds for its hash """
+
+
+def _timed(operation, fn, *args):
+    # Runs on the pool thread, so queueing time is not included
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        password_hash_seconds.observe(time.perf_counter() - start, operation)
+
+
+class HashingService:
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 8
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='userapp-hashing',
+                    )
+        return self._executor
+
+    def submit(self, fn, *args):
+        """ Queue ``fn(*args)`` on the pool and return its future """
+        if not self._slots.acquire(blocking=False):
+            raise HashingQueueFull(f'{self.max_pending} hashing jobs already pending')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _wait(self, future):
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            # Frees the slot if the job has not started yet
+            future.cancel()
+            raise HashingTimeout(f'Hashing did not finish within {self.timeout}s') from None
+
+    def make_password(self, raw_password):
+        """ Hash ``raw_password`` with the preferred hasher """
+        if raw_password is None:
+            # Unusable passwords are a random string, not a hash; no need to queue
+            return hashers.make_password(None)
+        return self._wait(self.submit(_timed, 'make', hashers.make_password, raw_password))
+
+    def verify_password(self, raw_password, encoded):
+        """ Return ``(is_correct, must_update)`` for ``raw_password`` against ``encoded`` """
+        return self._wait(self.submit(_timed, 'verify', hashers.verify_password, raw_password, encoded))
+
+    async def amake_password(self, raw_password):
+        """ Async version of make_password(); awaits the pool without blocking the event loop """
+        if raw_password is None:
+            return hashers.make_password(None)
+        return await asyncio.wrap_future(self.submit(_timed, 'make', hashers.make_password, raw_password))
+
+    async def averify_password(self, raw_password, encoded):
+        """ Async version of verify_password() """
+        return await asyncio.wrap_future(self.submit(_timed, 'verify', hashers.verify_password, raw_password, encoded))
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+hashing_service = HashingService(
+    max_workers=getattr(settings, 'USERAPP_HASHING_WORKERS', None),
+    max_pending=getattr(settings, 'USERAPP_HASHING_MAX_PENDING', None),
+    timeout=getattr(settings, 'USERAPP_HASHING_TIMEOUT', 10),
+)
+
+
+def make_password(raw_password):
+    return hashing_service.make_password(raw_password)
+
+
+def verify_password(raw_password, encoded):
+    return hashing_service.verify_password(raw_password, encoded)
+
+
+async def amake_password(raw_password):
+    return await hashing_service.amake_password(raw_password)
+
+
+async def averify_password(raw_password, encoded):
+    return await hashing_service.averify_password(raw_password, encoded)
@@ -0,0 +1,93 @@
+"""
+Time-ordered public identifiers for ``User.userId`` and ``Organisation.orgId``.
+
+IDs are ULIDs: a 48-bit millisecond timestamp followed by 80 random bits,
+written as 26 Crockford base32 characters. The text sorts like the number,
+so later IDs compare greater and new rows are appended at the right-hand
+edge of the unique index. Random UUIDs land on a random leaf page instead,
+splitting pages all over the tree and leaving them half full.
+
+Within a process IDs strictly increase: an ID minted in the same millisecond
+as the previous one, or after the clock stepped back, keeps that timestamp
+and adds one to the random part. Workers need no coordination. Each one
+draws fresh random bits every millisecond, and a forked child starts a new
+sequence instead of continuing its parent's.
+"""
+import os
+import threading
+import time
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+LENGTH = 26
+RANDOM_BITS = 80
+_RANDOM_MAX = (1 << RANDOM_BITS) - 1
+_DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+
+
+def encode(value):
+    """ The 26-character form of a 128-bit ``value`` """
+    chars = [''] * LENGTH
+    for i in range(LENGTH - 1, -1, -1):
+        chars[i] = ALPHABET[value & 31]
+        value >>= 5
+    return ''.join(chars)
+
+
+def decode(text):
+    """ Inverse of encode(); raises ValueError for anything that is not an ID """
+    if len(text) != LENGTH:
+        raise ValueError(f'IDs are {LENGTH} characters, got {len(text)}')
+    value = 0
+    try:
+        for char in text.upper():
+            value = value << 5 | _DIGITS[char]
+    except KeyError:
+        raise ValueError(f'{text!r} is not a valid ID') from None
+    if value >> 128:
+        raise ValueError(f'{text!r} is out of range')
+    return value
+
+
+def timestamp_ms(text):
+    """ Milliseconds since the epoch at which the ID was minted """
+    return decode(text) >> RANDOM_BITS
+
+
+class ULIDGenerator:
+
+    def __init__(self, clock=time.time_ns, randbits=None):
+        self.clock = clock
+        self.randbits = randbits or (lambda: int.from_bytes(os.urandom(RANDOM_BITS // 8), 'big'))
+        self.reset()
+
+    def reset(self):
+        # Also run in a forked child, where the parent's lock may have been held mid-call
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def __call__(self):
+        with self._lock:
+            ms = self.clock() // 1_000_000
+            if ms > self._last_ms:
+                self._last_ms = ms
+                self._last_random = self.randbits()
+            elif self._last_random < _RANDOM_MAX:
+                self._last_random += 1
+            else:
+                # The random part is used up for this millisecond: borrow the next one
+                self._last_ms += 1
+                self._last_random = self.randbits()
+            value = self._last_ms << RANDOM_BITS | self._last_random
+        return encode(value)
+
+
+generator = ULIDGenerator()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=generator.reset)
+
+
+def new_id():
+    """ A new ID; the model field default for userId / orgId """
+    return generator()
@@ -0,0 +1,180 @@
+"""
+Per-request SQL instrumentation.
+
+One execute wrapper is installed on every database connection. It does
+nothing unless a ``QueryRecorder`` is active in the current context, so the
+cost outside an instrumented request is a single context variable lookup.
+The active recorders live in a ``ContextVar``, which asgiref copies into
+``sync_to_async`` threads, so queries issued by native async views are
+attributed to the request that caused them.
+
+``QueryInstrumentationMiddleware`` (userapp.middleware) records every request,
+aggregates the results per view name in ``stats`` and logs each request to
+the ``userapp.queries`` logger. Tests declare query budgets with
+``max_queries``.
+"""
+import functools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_active = ContextVar('userapp_query_recorders', default=())
+
+
+class QueryRecorder:
+    """ Query count, total time, the slowest statement and repeats of one unit of work """
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+        self.repeats = Counter()
+        self.statements = [] if keep_statements else None
+        self._lock = threading.Lock()
+
+    def record(self, sql, duration):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.repeats[sql] += 1
+            if duration >= self.slowest_duration:
+                self.slowest_sql, self.slowest_duration = sql, duration
+            if self.statements is not None:
+                self.statements.append(sql)
+
+    def most_repeated(self):
+        """ ``(sql, times)`` for the statement executed most often, or ``(None, 0)`` """
+        with self._lock:
+            common = self.repeats.most_common(1)
+        return common[0] if common else (None, 0)
+
+    @contextmanager
+    def activate(self):
+        token = _active.set(_active.get() + (self,))
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    recorders = _active.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for recorder in recorders:
+            recorder.record(sql, duration)
+
+
+def _install(sender=None, connection=None, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def install():
+    """ Instrument this thread's open connections and every connection opened from now on """
+    connection_created.connect(_install, dispatch_uid='userapp.instrumentation')
+    for connection in connections.all(initialized_only=True):
+        _install(connection=connection)
+
+
+class QueryStats:
+    """ In-process query totals per view name """
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view, recorder):
+        with self._lock:
+            entry = self._views.setdefault(view, {
+                'requests': 0, 'queries': 0, 'maxQueries': 0, 'dbTimeMs': 0.0,
+                'slowestMs': 0.0, 'slowestSql': None,
+            })
+            entry['requests'] += 1
+            entry['queries'] += recorder.count
+            entry['maxQueries'] = max(entry['maxQueries'], recorder.count)
+            entry['dbTimeMs'] += recorder.duration * 1000
+            if recorder.slowest_sql is not None and recorder.slowest_duration * 1000 >= entry['slowestMs']:
+                entry['slowestMs'] = recorder.slowest_duration * 1000
+                entry['slowestSql'] = recorder.slowest_sql
+
+    def as_dict(self):
+        with self._lock:
+            views = {view: dict(entry) for view, entry in self._views.items()}
+        for entry in views.values():
+            entry['queriesPerRequest'] = round(entry['queries'] / entry['requests'], 2)
+            entry['dbTimeMs'] = round(entry['dbTimeMs'], 3)
+            entry['slowestMs'] = round(entry['slowestMs'], 3)
+        return views
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+stats = QueryStats()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """ Raised by ``max_queries`` when the wrapped code issued too many statements """
+
+
+class max_queries:
+    """
+    Fail when the wrapped code issues more than ``limit`` SQL statements.
+
+    Works as a context manager or as a decorator on sync and async test
+    methods, and counts queries from every thread the work reaches::
+
+        with max_queries(3):
+            self.client.get(url)
+
+        @max_queries(2)
+        def test_get_user_details(self): ...
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.recorder = None
+        self._activation = None
+
+    def __enter__(self):
+        install()
+        self.recorder = QueryRecorder(keep_statements=True)
+        self._activation = self.recorder.activate()
+        self._activation.__enter__()
+        return self.recorder
+
+    def __exit__(self, exc_type, exc, tb):
+        self._activation.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.recorder.count > self.limit:
+            statements = '\n'.join(f'{i}. {sql}' for i, sql in enumerate(self.recorder.statements, 1))
+            raise QueryBudgetExceeded(
+                f'{self.recorder.count} queries executed, budget is {self.limit}:\n{statements}'
+            )
+        return False
+
+    def __call__(self, func):
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with max_queries(self.limit):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with max_queries(self.limit):
+                return func(*args, **kwargs)
+        return wrapper
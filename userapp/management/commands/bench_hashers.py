@@ -0,0 +1,50 @@
+import time
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from userapp.hashing import HashingService
+
+HASHERS = [
+    ('PBKDF2', 'pbkdf2_sha256'),
+    ('Argon2', 'argon2'),
+    ('scrypt', 'scrypt'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Report password hashes per second for each supported hasher on this host.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help='Hashes per hasher (default: 20)')
+        parser.add_argument('--workers', type=int, default=None, help='Pool size (default: one per core)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        service = HashingService(max_workers=options['workers'], max_pending=count)
+        self.stdout.write(f'{count} hashes per hasher, {service.max_workers} worker(s)')
+        self.stdout.write(f'{"hasher":<8} {"inline/s":>10} {"pool/s":>10} {"ms/hash":>9}')
+        try:
+            for label, algorithm in HASHERS:
+                hasher = get_hasher(algorithm)
+                if hasher.library:
+                    try:
+                        hasher._load_library()
+                    except ValueError as e:
+                        self.stdout.write(f'{label:<8} skipped ({e})')
+                        continue
+
+                start = time.perf_counter()
+                for i in range(count):
+                    make_password(f'password-{i}', hasher=algorithm)
+                inline = time.perf_counter() - start
+
+                start = time.perf_counter()
+                futures = [service.submit(make_password, f'password-{i}', None, algorithm) for i in range(count)]
+                for future in futures:
+                    future.result()
+                pooled = time.perf_counter() - start
+
+                self.stdout.write(
+                    f'{label:<8} {count / inline:>10.1f} {count / pooled:>10.1f} {inline / count * 1000:>9.1f}'
+                )
+        finally:
+            service.shutdown()
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from userapp.ids import ULIDGenerator
+
+GENERATORS = [
+    ('uuid4', lambda: str(uuid.uuid4())),
+    ('uuid4-hex', lambda: uuid.uuid4().hex),
+    ('ulid', ULIDGenerator()),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare insert throughput and unique index size for random UUID and time-ordered '
+        'IDs in a table shaped like userapp_organisation.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Rows per generator (default: 1000000)')
+        parser.add_argument('--batch', type=int, default=10_000, help='Rows per transaction (default: 10000)')
+        parser.add_argument(
+            '--cache-mb', type=int, default=2,
+            help='SQLite page cache; smaller than the index, as on a large table (default: 2)',
+        )
+
+    def handle(self, *args, **options):
+        rows, batch = options['rows'], options['batch']
+        self.stdout.write(f'{rows} rows per generator, {batch} per transaction, {options["cache_mb"]} MB page cache')
+        self.stdout.write(
+            f'{"generator":<10} {"width":>5} {"gen us/id":>10} {"rows/s":>10} '
+            f'{"last batch/s":>12} {"index MB":>9} {"fill %":>7}'
+        )
+        for label, generate in GENERATORS:
+            start = time.perf_counter()
+            ids = [generate() for _ in range(rows)]
+            generation = (time.perf_counter() - start) / rows
+            with tempfile.TemporaryDirectory() as tmp:
+                self.report(label, ids, generation, os.path.join(tmp, 'bench.sqlite3'), batch, options['cache_mb'])
+
+    def report(self, label, ids, generation, path, batch, cache_mb):
+        db = sqlite3.connect(path, isolation_level=None)
+        try:
+            db.execute(f'PRAGMA cache_size = -{cache_mb * 1024}')
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            db.execute(
+                'CREATE TABLE org (id INTEGER PRIMARY KEY, "orgId" varchar(100) NOT NULL UNIQUE, name varchar(200))'
+            )
+            start = time.perf_counter()
+            last = 0
+            for offset in range(0, len(ids), batch):
+                chunk = ids[offset:offset + batch]
+                batch_start = time.perf_counter()
+                db.execute('BEGIN')
+                db.executemany('INSERT INTO org ("orgId", name) VALUES (?, ?)', [(i, 'Organisation') for i in chunk])
+                db.execute('COMMIT')
+                last = len(chunk) / (time.perf_counter() - batch_start)
+            throughput = len(ids) / (time.perf_counter() - start)
+            index = db.execute(
+                "SELECT name FROM sqlite_schema WHERE type = 'index' AND tbl_name = 'org'"
+            ).fetchone()[0]
+            pages, size, unused = db.execute(
+                'SELECT count(*), sum(pgsize), sum(unused) FROM dbstat WHERE name = ?', [index],
+            ).fetchone()
+        finally:
+            db.close()
+        self.stdout.write(
+            f'{label:<10} {len(ids[0]):>5} {generation * 1_000_000:>10.2f} {throughput:>10.0f} '
+            f'{last:>12.0f} {size / 1_048_576:>9.1f} {100 * (size - unused) / size:>7.1f}'
+        )
@@ -0,0 +1,91 @@
+import io
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from userapp.parsers import FastJSONParser
+from userapp.renderers import FastJSONRenderer, orjson
+
+TOKEN = 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.' + 'e' * 180 + '.' + 's' * 43
+
+
+def user_payload(i):
+    return {
+        'userId': f'{i:032x}', 'firstName': 'Ada', 'lastName': f'Lovelace {i}',
+        'email': f'ada{i}@example.com', 'phone': '+2348012345678',
+    }
+
+
+def auth_response(message):
+    return {'status': 'success', 'message': message, 'data': {'accessToken': TOKEN, 'user': user_payload(1)}}
+
+
+def organisations_response(count):
+    return {
+        'status': 'success',
+        'message': 'Organisations retrieved',
+        'data': {
+            'organisations': [
+                {'orgId': f'{i:032x}', 'name': f"Ada {i}'s Organisation", 'description': 'Analytical engines'}
+                for i in range(count)
+            ],
+            'next': 'http://testserver/api/organisations/?cursor=cD0xMDA%3D',
+            'previous': None,
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the stdlib JSON renderer/parser with the userapp ones on representative '
+        'register_user, login_user and get_organisations payloads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000, help='Runs per payload (default: 5000)')
+        parser.add_argument('--organisations', type=int, default=100, help='Organisations per listing page (default: 100)')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        responses = [
+            ('register_user', auth_response('Registration successful')),
+            ('login_user', auth_response('Login successful')),
+            ('get_organisations', organisations_response(options['organisations'])),
+        ]
+        requests = [
+            ('register_user', {**user_payload(1), 'password': 'correct horse battery staple'}),
+            ('login_user', {'email': 'ada1@example.com', 'password': 'correct horse battery staple'}),
+        ]
+        self.stdout.write(f'orjson {"available" if orjson else "not installed"}; {iterations} iterations per payload')
+        self.stdout.write(f'{"":<7} {"payload":<18} {"impl":<7} {"bytes":>7} {"MB/s":>9} {"p50 us":>8} {"p99 us":>8}')
+
+        for name, data in responses:
+            expected = JSONRenderer().render(data)
+            for label, renderer in (('stdlib', JSONRenderer()), ('fast', FastJSONRenderer())):
+                assert renderer.render(data) == expected
+                self.report('render', name, label, len(expected), self.time(lambda: renderer.render(data), iterations))
+
+        for name, data in requests:
+            body = JSONRenderer().render(data)
+            for label, parser in (('stdlib', JSONParser()), ('fast', FastJSONParser())):
+                self.report(
+                    'parse', name, label, len(body),
+                    self.time(lambda: parser.parse(io.BytesIO(body)), iterations),
+                )
+
+    def time(self, fn, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def report(self, operation, name, label, size, timings):
+        quantiles = statistics.quantiles(timings, n=100)
+        throughput = size * len(timings) / sum(timings) / 1_000_000
+        self.stdout.write(
+            f'{operation:<7} {name:<18} {label:<7} {size:>7} {throughput:>9.1f} '
+            f'{quantiles[49] * 1_000_000:>8.1f} {quantiles[98] * 1_000_000:>8.1f}'
+        )
@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from userapp.fast_serializers import organisation_serializer, user_serializer
+from userapp.models import Organisation, User
+from userapp.serializers import OrganisationSerializer, UserSerializer
+
+
+class Command(BaseCommand):
+    help = 'Report the per-object cost of the DRF serializers against their compiled read paths.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=1000, help='Objects per run (default: 1000)')
+        parser.add_argument('--rounds', type=int, default=20, help='Runs per implementation (default: 20)')
+
+    def handle(self, *args, **options):
+        count, rounds = options['objects'], options['rounds']
+        cases = [
+            ('User', UserSerializer, user_serializer, [
+                User(id=i, userId=f'{i:032x}', firstName='Ada', lastName=f'Lovelace {i}',
+                     email=f'ada{i}@example.com', phone='+2348012345678')
+                for i in range(count)
+            ]),
+            ('Organisation', OrganisationSerializer, organisation_serializer, [
+                Organisation(id=i, orgId=f'{i:032x}', name=f"Ada {i}'s Organisation", description='Engines')
+                for i in range(count)
+            ]),
+        ]
+        self.stdout.write(f'{count} objects x {rounds} rounds; best round, microseconds per object')
+        self.stdout.write(f'{"serializer":<14} {"drf many":>9} {"drf one":>9} {"compiled":>9} {"rows":>9}')
+        for label, serializer_class, compiled, instances in cases:
+            rows = [{'id': obj.pk, **compiled.to_representation(obj)} for obj in instances]
+            timings = [
+                self.time(lambda: serializer_class(instances, many=True).data, rounds),
+                self.time(lambda: [serializer_class(obj).data for obj in instances], rounds),
+                self.time(lambda: compiled.many(instances), rounds),
+                self.time(lambda: compiled.many(rows), rounds),
+            ]
+            self.stdout.write(f'{label:<14} ' + ' '.join(f'{t / count * 1_000_000:>9.2f}' for t in timings))
+
+    def time(self, fn, rounds):
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
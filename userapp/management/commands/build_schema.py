@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from userapp.schema import build_schema_files
+
+
+class Command(BaseCommand):
+    help = 'Render the OpenAPI schema once to static JSON and YAML files served by api/schema.<format>.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', help='Defaults to USERAPP_SCHEMA_DIR')
+
+    def handle(self, *args, **options):
+        for path in build_schema_files(options['output_dir']):
+            self.stdout.write(f'Wrote {path}')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from userapp.models import IdempotencyKey, IssuedRefreshToken, RevokedToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete revocation and refresh-token records whose tokens have expired, '
+        'and expired registration idempotency keys. '
+        'Run periodically (e.g. hourly from cron); running processes drop them from '
+        'their revocation filters at the next rebuild.'
+    )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        revoked, _ = RevokedToken.objects.filter(expires_at__lte=now).delete()
+        refresh, _ = IssuedRefreshToken.objects.filter(expires_at__lte=now).delete()
+        keys, _ = IdempotencyKey.objects.filter(expires_at__lte=now).delete()
+        self.stdout.write(
+            f'Deleted {revoked} revoked token(s), {refresh} refresh token record(s) and {keys} idempotency key(s)'
+        )
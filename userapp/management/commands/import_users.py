@@ -0,0 +1,41 @@
+import json
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from userapp import bulk_import
+
+
+class Command(BaseCommand):
+    help = 'Bulk import users (with default organisations) from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=bulk_import.FORMATS, help='Defaults to the file extension')
+        parser.add_argument(
+            '--chunk-size', type=int, default=getattr(settings, 'USERAPP_IMPORT_CHUNK_SIZE', 500),
+            help='Rows per transaction',
+        )
+        parser.add_argument('--report', help='Write per-row errors to this file as NDJSON')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if path.lower().endswith('.csv') else 'ndjson' if path != '-' else None
+        if fmt is None:
+            raise CommandError('--format is required when reading from stdin')
+
+        if path == '-':
+            report = bulk_import.import_users(bulk_import.iter_rows(sys.stdin, fmt), options['chunk_size'])
+        else:
+            with open(path, encoding='utf-8', newline='') as f:
+                report = bulk_import.import_users(bulk_import.iter_rows(f, fmt), options['chunk_size'])
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as f:
+                for error in report.errors:
+                    f.write(json.dumps(error) + '\n')
+        else:
+            for error in report.errors:
+                self.stderr.write(json.dumps(error))
+        self.stdout.write(f'Imported {report.created} user(s), {len(report.errors)} row(s) failed')
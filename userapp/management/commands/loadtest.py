@@ -0,0 +1,352 @@
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from userapp.models import Membership, Organisation, User
+from userapp.utils import create_access_token
+from userapp.write_queue import write_queue
+
+PASSWORD = 'loadtest-password'
+ENDPOINTS = [
+    'register', 'login', 'user', 'organisations', 'organisation', 'members', 'search_users', 'search_organisations',
+]
+
+
+class QueryCounter:
+    """ Counts SQL statements on every connection it is installed on, across threads """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class Dataset:
+    """ Primary keys of the seeded rows plus, for a sample of users, the organisations they joined """
+
+    def __init__(self):
+        self.user_pks = array('q')
+        self.org_pks = array('q')
+        self.joined = {}
+        self.sample = []
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database at the given scale, drive the userapp endpoints '
+        'concurrently in-process through the WSGI and/or ASGI handlers, and report req/s, '
+        'p50/p95/p99 latency and SQL queries per request. Use --output to write JSON that '
+        'can be compared between versions with --compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument(
+            '--endpoint', nargs='+', choices=ENDPOINTS + ['all'], default=['organisations'],
+            help='Endpoints to drive, one run each (default: organisations)',
+        )
+        parser.add_argument('--users', type=int, default=100, help='Users to seed (default: 100)')
+        parser.add_argument(
+            '--orgs-per-user', type=int, default=1,
+            help="Organisations each seeded user belongs to, including their own (default: 1)",
+        )
+        parser.add_argument('--requests', type=int, default=1000, help='Measured requests per run (default: 1000)')
+        parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests before each run (default: 50)')
+        parser.add_argument('--concurrency', type=int, default=32, help='In-flight requests (default: 32)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset and request mix (default: 0)')
+        parser.add_argument(
+            '--throttle', action='store_true',
+            help='Keep the login/registration throttles enabled (they are disabled by default)',
+        )
+        parser.add_argument(
+            '--fast-hasher', action='store_true',
+            help='Hash passwords with MD5 so the database rather than the hasher bounds register/login',
+        )
+        parser.add_argument(
+            '--database-file',
+            help=(
+                'Put the SQLite test database in this new file, which is deleted afterwards (default: a '
+                'temporary file). Shared-cache in-memory databases fail concurrent writes with table '
+                'locks, so they are never used'
+            ),
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Print the change against a previous --output file')
+
+    def handle(self, *args, **options):
+        if options['orgs_per_user'] < 1 or options['users'] < 1:
+            raise CommandError('--users and --orgs-per-user must be at least 1')
+        if options['database_file'] and os.path.exists(options['database_file']):
+            # The benchmark database is created from scratch and destroyed afterwards
+            raise CommandError(f'{options["database_file"]} already exists; --database-file must be a new path')
+        endpoints = ENDPOINTS if 'all' in options['endpoint'] else options['endpoint']
+        servers = ['wsgi', 'asgi'] if options['server'] == 'both' else [options['server']]
+        overrides = {} if options['throttle'] else {'USERAPP_THROTTLE_RATES': dict.fromkeys(
+            ['login_ip', 'login_email', 'register_ip', 'register_email'])}
+        # Only the primary is seeded
+        overrides['USERAPP_READ_REPLICAS'] = []
+        if options['fast_hasher']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        temporary = None
+        if connection.vendor == 'sqlite':
+            if not options['database_file']:
+                temporary = tempfile.mkdtemp(prefix='loadtest-')
+            test_settings['NAME'] = options['database_file'] or os.path.join(temporary, 'db.sqlite3')
+
+        counter = QueryCounter()
+        try:
+            setup_test_environment(debug=False)
+            own_environment = True
+        except RuntimeError:
+            # Already set up, e.g. when run by the test suite
+            own_environment = False
+        # A fresh connection object: SQLite never closes an in-memory database, so one already
+        # open on the test suite's own would otherwise be reused instead of the new file
+        saved_connection = connections[DEFAULT_DB_ALIAS]
+        connections[DEFAULT_DB_ALIAS] = connections.create_connection(DEFAULT_DB_ALIAS)
+        # A writer thread that is already running keeps its connection to the old database
+        write_queue.stop()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+        connection_created.connect(counter.install)
+        try:
+            with override_settings(**overrides):
+                counter.install(connection=connection)
+                rng = random.Random(options['seed'])
+                started = time.perf_counter()
+                dataset = self.seed(options['users'], options['orgs_per_user'], options['requests'], rng)
+                self.stderr.write(f'Seeded {options["users"]} users in {time.perf_counter() - started:.1f}s')
+
+                results = []
+                for server in servers:
+                    run = self.run_wsgi if server == 'wsgi' else self.run_asgi
+                    for endpoint in endpoints:
+                        warmup = [self.build_request(endpoint, dataset, rng, f'{server}-warmup-{i}')
+                                  for i in range(options['warmup'])]
+                        requests = [self.build_request(endpoint, dataset, rng, f'{server}-{i}')
+                                    for i in range(options['requests'])]
+                        if warmup:
+                            run(warmup, options['concurrency'])
+                        queries_before = counter.count
+                        elapsed, latencies, statuses = run(requests, options['concurrency'])
+                        result = self.summarise(server, endpoint, elapsed, latencies, statuses,
+                                                counter.count - queries_before)
+                        results.append(result)
+                        self.report(result)
+                        failed = sum(count for code, count in statuses.items() if code >= 500)
+                        if failed:
+                            # Errors come back fast; counting them would inflate req/s
+                            raise CommandError(
+                                f'{server} {endpoint}: {failed} of {len(latencies)} requests failed with a '
+                                f'server error {result["statuses"]}; these numbers are not meaningful'
+                            )
+        finally:
+            connection_created.disconnect(counter.install)
+            # The writer thread's connection points at the database about to be destroyed
+            write_queue.stop()
+            teardown_databases(old_config, verbosity=0)
+            connections[DEFAULT_DB_ALIAS] = saved_connection
+            if own_environment:
+                teardown_test_environment()
+            test_settings['NAME'] = old_test_name
+            if temporary:
+                shutil.rmtree(temporary, ignore_errors=True)
+
+        document = {'meta': self.meta(options, endpoints, servers), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(document, f, indent=2)
+                f.write('\n')
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def seed(self, users, orgs_per_user, requests, rng, batch_size=10000):
+        # One hash shared by every seeded user keeps seeding fast
+        encoded = make_password(PASSWORD)
+        dataset = Dataset()
+        # Only the users that requests will be issued for need their memberships remembered
+        sample = set(rng.sample(range(users), min(users, max(requests, 1000))))
+        others = {}
+        for start in range(0, users, batch_size):
+            stop = min(start + batch_size, users)
+            created = User.objects.bulk_create(
+                User(userId=f'load-{i}', firstName='Load', lastName=str(i), email=f'load{i}@example.com',
+                     password=encoded)
+                for i in range(start, stop)
+            )
+            dataset.user_pks.extend(user.pk for user in created)
+            organisations = Organisation.objects.bulk_create(
+                Organisation(orgId=f'load-org-{i}', name=f"Load {i}'s Organisation") for i in range(start, stop)
+            )
+            dataset.org_pks.extend(org.pk for org in organisations)
+            for i in range(start, stop):
+                # Extra organisations are picked among those created so far, so every one exists
+                extra = rng.sample(range(stop), min(orgs_per_user - 1, stop - 1)) if orgs_per_user > 1 else []
+                others[i] = [j for j in extra if j != i]
+            Membership.objects.bulk_create(
+                (Membership(user_id=dataset.user_pks[i], organisation_id=dataset.org_pks[j])
+                 for i in range(start, stop) for j in [i, *others[i]]),
+                batch_size=batch_size,
+            )
+            for i in range(start, stop):
+                extra = others.pop(i)
+                if i in sample:
+                    dataset.joined[i] = [i, *extra]
+        dataset.sample = sorted(dataset.joined)
+        return dataset
+
+    def build_request(self, endpoint, dataset, rng, label):
+        if endpoint == 'register':
+            return ('post', reverse('register_user'), {
+                'firstName': 'Bench', 'lastName': label, 'email': f'bench-{label}@example.com', 'password': PASSWORD,
+            }, None)
+        i = rng.choice(dataset.sample)
+        if endpoint == 'login':
+            return ('post', reverse('login_user'), {'email': f'load{i}@example.com', 'password': PASSWORD}, None)
+        token = create_access_token(User(id=dataset.user_pks[i]))
+        org = rng.choice(dataset.joined[i])
+        if endpoint == 'user':
+            # The owner of one of this user's organisations, so the permission check passes
+            return ('get', reverse('get_user_details', args=[dataset.user_pks[org]]), None, token)
+        if endpoint == 'organisation':
+            return ('get', reverse('get_organisation', args=[dataset.org_pks[org]]), None, token)
+        if endpoint == 'members':
+            return ('get', reverse('get_organisation_members', args=[dataset.org_pks[org]]), None, token)
+        if endpoint in ('search_users', 'search_organisations'):
+            # A word every seeded row has plus a prefix of the owner's number, as typed into a search box
+            return ('get', reverse(endpoint), {'q': f'load {str(org)[:3]}'}, token)
+        return ('get', reverse('get_organisations'), None, token)
+
+    def run_wsgi(self, requests, concurrency):
+        def send(request):
+            method, url, data, token = request
+            client = Client(raise_request_exception=False)
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, content_type='application/json', headers=headers)
+            return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(send, requests))
+        elapsed = time.perf_counter() - start
+        return elapsed, [latency for latency, _ in outcomes], Counter(code for _, code in outcomes)
+
+    def run_asgi(self, requests, concurrency):
+        async def main():
+            client = AsyncClient(raise_request_exception=False)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def send(request):
+                method, url, data, token = request
+                headers = {'Authorization': f'Bearer {token}'} if token else {}
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await getattr(client, method)(url, data, content_type='application/json', headers=headers)
+                    return time.perf_counter() - start, response.status_code
+
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(send(request) for request in requests))
+            elapsed = time.perf_counter() - start
+            return elapsed, [latency for latency, _ in outcomes], Counter(code for _, code in outcomes)
+
+        return asyncio.run(main())
+
+    def summarise(self, server, endpoint, elapsed, latencies, statuses, queries):
+        latencies = sorted(latencies)
+        if len(latencies) > 1:
+            quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+            p50, p95, p99 = quantiles[49], quantiles[94], quantiles[98]
+        else:
+            p50 = p95 = p99 = latencies[0] if latencies else 0
+        return {
+            'server': server,
+            'endpoint': endpoint,
+            'requests': len(latencies),
+            'errors': sum(count for code, count in statuses.items() if code >= 400),
+            'statuses': {str(code): statuses[code] for code in sorted(statuses)},
+            'elapsed_s': round(elapsed, 4),
+            'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+            'p50_ms': round(p50 * 1000, 3),
+            'p95_ms': round(p95 * 1000, 3),
+            'p99_ms': round(p99 * 1000, 3),
+            'queries_per_request': round(queries / len(latencies), 2) if latencies else 0,
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            f'{result["server"].upper():<5} {result["endpoint"]:<20} {result["rps"]:>9.1f} req/s  '
+            f'p50 {result["p50_ms"]:>8.2f} ms  p95 {result["p95_ms"]:>8.2f} ms  p99 {result["p99_ms"]:>8.2f} ms  '
+            f'{result["queries_per_request"]:>6.2f} q/req  {result["errors"]} errors'
+            + (f' {result["statuses"]}' if result['errors'] else '')
+        )
+
+    def meta(self, options, endpoints, servers):
+        try:
+            revision = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            revision = None
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': revision,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'engine': connection.settings_dict['ENGINE'],
+            'servers': servers,
+            'endpoints': endpoints,
+            **{key: options[key] for key in (
+                'users', 'orgs_per_user', 'requests', 'warmup', 'concurrency', 'seed', 'throttle', 'fast_hasher',
+                'database_file')},
+        }
+
+    def compare(self, path, results):
+        with open(path) as f:
+            baseline = {(r['server'], r['endpoint']): r for r in json.load(f)['results']}
+        self.stdout.write(f'\nChange against {path}:')
+        for result in results:
+            old = baseline.get((result['server'], result['endpoint']))
+            if old is None:
+                continue
+            changes = '  '.join(
+                f'{key} {self.delta(old[key], result[key])}'
+                for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+            )
+            self.stdout.write(f'{result["server"].upper():<5} {result["endpoint"]:<20} {changes}')
+
+    def delta(self, old, new):
+        if not old:
+            return f'{old} -> {new}'
+        return f'{(new - old) / old * 100:+.1f}%'
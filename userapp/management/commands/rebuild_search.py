@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from userapp import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Recreate the search triggers and re-index every user and organisation. '
+        'Only needed if the index was changed by hand or its triggers were dropped outside migrate.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (default: default)')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not search.is_supported(connection):
+            raise CommandError(f'Search indexes need SQLite FTS5, not {connection.vendor}')
+        start = time.perf_counter()
+        with transaction.atomic(using=options['database']):
+            search.install(connection, rebuild=True)
+        self.stdout.write(f'Rebuilt the search indexes in {time.perf_counter() - start:.1f}s')
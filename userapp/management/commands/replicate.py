@@ -0,0 +1,28 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from userapp.replication import copy_database
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into each read replica (USERAPP_READ_REPLICAS), once or repeatedly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('replicas', nargs='*', help='Replica aliases (default: USERAPP_READ_REPLICAS)')
+        parser.add_argument('--every', type=float, help='Keep copying, waiting this many seconds between copies')
+
+    def handle(self, *args, **options):
+        replicas = options['replicas'] or list(getattr(settings, 'USERAPP_READ_REPLICAS', ()))
+        if not replicas:
+            raise CommandError('No replicas given and USERAPP_READ_REPLICAS is empty')
+        while True:
+            start = time.perf_counter()
+            for alias in replicas:
+                try:
+                    copy_database(alias)
+                except ValueError as e:
+                    raise CommandError(str(e))
+            self.stdout.write(f'Copied to {", ".join(replicas)} in {(time.perf_counter() - start) * 1000:.1f} ms')
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
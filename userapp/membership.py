@@ -0,0 +1,64 @@
+from django.db.models import Exists, OuterRef
+from .models import Membership, User
+from .permissions import invalidate_org_ids
+from .response_cache import invalidate_user_organisations
+
+
+def membership_changed(*user_ids):
+    """ Drop everything cached about these users' organisation sets """
+    invalidate_org_ids(*user_ids)
+    invalidate_user_organisations(*user_ids)
+
+
+def add_members(organisation, user_ids):
+    """
+    Add the given users to ``organisation`` in one round of queries.
+
+    Returns ``(added, already_members, unknown)`` lists of user ids, each in
+    request order.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    # One query resolves which ids exist and which of those are already members
+    rows = dict(
+        User.objects.filter(id__in=user_ids).annotate(
+            is_member=Exists(Membership.objects.filter(organisation=organisation, user_id=OuterRef('pk')))
+        ).values_list('id', 'is_member')
+    )
+    added = [user_id for user_id in user_ids if user_id in rows and not rows[user_id]]
+    already_members = [user_id for user_id in user_ids if rows.get(user_id)]
+    unknown = [user_id for user_id in user_ids if user_id not in rows]
+
+    if added:
+        # ignore_conflicts covers a concurrent add of the same membership
+        Membership.objects.bulk_create(
+            [Membership(user_id=user_id, organisation=organisation) for user_id in added],
+            ignore_conflicts=True,
+        )
+        # bulk_create sends no post_save, so invalidate here
+        membership_changed(*added)
+    return added, already_members, unknown
+
+
+def parse_user_ids(data, limit):
+    """
+    Read ``userIds`` (a list) or the legacy single ``userId`` from a request body.
+
+    Returns ``(user_ids, is_batch)``; raises ValueError with a client-facing
+    message when the input is malformed.
+    """
+    is_batch = 'userIds' in data
+    raw = data.get('userIds') if is_batch else [data.get('userId')]
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('userIds must be a non-empty list of user ids')
+    if len(raw) > limit:
+        raise ValueError(f'At most {limit} user ids can be added per request')
+    if not all(_is_user_id(user_id) for user_id in raw):
+        raise ValueError('User ids must be integers')
+    return [int(user_id) for user_id in raw], is_batch
+
+
+def _is_user_id(value):
+    # int() alone would take JSON true as 1 and truncate 1.9 to 1
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, str) and value.isascii() and value.isdigit())
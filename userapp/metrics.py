@@ -0,0 +1,223 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters and histograms keep one set of values per thread. A thread only
+ever writes its own values, so recording takes no lock: it is a
+thread-local lookup, a ``bisect`` and a few integer adds. Collecting sums
+the values of every thread that has recorded something.
+
+Under gunicorn each worker has its own registry, and a scrape reaches one
+worker at random. With ``USERAPP_METRICS_DIR`` set, every process writes a
+snapshot there at most every ``USERAPP_METRICS_FLUSH_INTERVAL`` seconds.
+The snapshot file is named after the process id, and ``metrics/`` adds up
+all the snapshots in the directory. Snapshots of exited workers are kept,
+so counters never go backwards. Clear the directory when the server
+restarts.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+
+# Seconds; covers cache hits (sub-millisecond) up to slow password hashes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _values(self, labels, size):
+        data = self.registry._thread_data()
+        key = (self.name, labels)
+        values = data.get(key)
+        if values is None:
+            values = data[key] = [0] * size
+        return values
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self._values(labels, 1)[0] += amount
+
+    def samples(self, labels, values):
+        yield self.name, labels, values[0]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # One count per bucket, then the sum and the total count
+        values = self._values(labels, len(self.buckets) + 3)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self, labels, values):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), values):
+            cumulative += count
+            yield f'{self.name}_bucket', (*labels, _format_bound(bound)), cumulative
+        yield f'{self.name}_sum', labels, values[-2]
+        yield f'{self.name}_count', labels, values[-1]
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self.metrics = {}
+        self._local = threading.local()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._next_flush = 0
+
+    def _thread_data(self):
+        try:
+            return self._local.data
+        except AttributeError:
+            data = self._local.data = {}
+            with self._lock:
+                self._threads.append(data)
+            return data
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def snapshot(self):
+        """ ``{(name, labels): values}`` summed over every thread of this process """
+        with self._lock:
+            threads = list(self._threads)
+        totals = {}
+        for data in threads:
+            # dict() copies in one step under the GIL, even while the owner adds keys
+            for key, values in dict(data).items():
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        total[i] += value
+        return totals
+
+    def reset(self):
+        with self._lock:
+            for data in self._threads:
+                data.clear()
+
+    def maybe_flush(self):
+        """ Write this process's snapshot if the flush interval has passed; cheap otherwise """
+        if self.directory is not None and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        self._next_flush = time.monotonic() + self.flush_interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+        rows = [[name, list(labels), values] for (name, labels), values in self.snapshot().items()]
+        # Write then rename, so a scrape never reads a half-written file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(rows, f)
+        os.replace(tmp, self.directory / f'metrics-{os.getpid()}.json')
+
+    def collect(self):
+        """ Totals of every process when a metrics directory is set, otherwise of this one """
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        totals = {}
+        for path in self.directory.glob('metrics-*.json'):
+            try:
+                rows = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, values in rows:
+                key = (name, tuple(labels))
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = values
+                else:
+                    for i, value in enumerate(values):
+                        total[i] += value
+        return totals
+
+    def exposition(self):
+        """ Prometheus text format (version 0.0.4) """
+        by_metric = {}
+        for (name, labels), values in self.collect().items():
+            by_metric.setdefault(name, []).append((labels, values))
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            labelnames = metric.labelnames + (('le',) if metric.type == 'histogram' else ())
+            for labels, values in sorted(by_metric.get(name, ())):
+                for sample, sample_labels, value in metric.samples(labels, values):
+                    pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(labelnames, sample_labels))
+                    lines.append(f'{sample}{{{pairs}}} {value}' if pairs else f'{sample} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(
+    directory=getattr(settings, 'USERAPP_METRICS_DIR', None),
+    flush_interval=getattr(settings, 'USERAPP_METRICS_FLUSH_INTERVAL', 5),
+)
+
+requests_total = registry.counter(
+    'userapp_requests_total', 'Requests served, by view, method and status code', ('view', 'method', 'status'),
+)
+request_seconds = registry.histogram(
+    'userapp_request_duration_seconds', 'Time to serve a request, by view', ('view',),
+)
+password_hash_seconds = registry.histogram(
+    'userapp_password_hash_seconds', 'Time spent hashing or verifying one password in the hashing pool',
+    ('operation',),
+)
+token_seconds = registry.histogram(
+    'userapp_token_seconds', 'Time to mint a refresh token (issue) or sign an access/refresh pair (encode)',
+    ('stage',),
+)
+serializer_seconds = registry.histogram(
+    'userapp_serializer_seconds', 'Time spent serialising response data, by serializer', ('serializer',),
+)
@@ -0,0 +1,251 @@
+import logging
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIRequest
+from . import instrumentation, metrics, profiling, routers
+
+logger = logging.getLogger('userapp.queries')
+
+
+class ASGIURLConfMiddleware:
+    """
+    Route requests served over ASGI to ``settings.ASGI_ROOT_URLCONF``, so they
+    hit the native async views instead of sync views run in a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.urlconf = getattr(settings, 'ASGI_ROOT_URLCONF', None)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = self.urlconf
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.urlconf:
+            request.urlconf = self.urlconf
+        return await self.get_response(request)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record the SQL each request issues and aggregate it per view name.
+
+    Every request is logged to ``userapp.queries`` at DEBUG with its query
+    count, database time and slowest statement, and at WARNING when it runs
+    more than ``USERAPP_QUERY_WARN_COUNT`` statements or repeats one statement
+    more than ``USERAPP_QUERY_REPEAT_LIMIT`` times (the signature of an N+1).
+    With ``USERAPP_QUERY_HEADERS`` on, responses carry ``X-DB-Queries`` and
+    ``X-DB-Time`` (milliseconds).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'USERAPP_QUERY_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.headers = getattr(settings, 'USERAPP_QUERY_HEADERS', False)
+        self.warn_count = getattr(settings, 'USERAPP_QUERY_WARN_COUNT', 20)
+        self.repeat_limit = getattr(settings, 'USERAPP_QUERY_REPEAT_LIMIT', 5)
+        instrumentation.install()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = instrumentation.QueryRecorder()
+        with recorder.activate():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = instrumentation.QueryRecorder()
+        with recorder.activate():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else None
+        if view:
+            instrumentation.stats.record(view, recorder)
+        if self.headers:
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Time'] = f'{recorder.duration * 1000:.3f}'
+        if recorder.count:
+            self.log(request, view, recorder)
+        return response
+
+    def log(self, request, view, recorder):
+        sql, times = recorder.most_repeated()
+        if times > self.repeat_limit:
+            logger.warning(
+                'Possible N+1 in %s %s (%s): one statement ran %d times: %s',
+                request.method, request.path, view, times, sql,
+            )
+        level = logging.WARNING if recorder.count > self.warn_count else logging.DEBUG
+        if logger.isEnabledFor(level):
+            logger.log(
+                level, '%s %s (%s): %d queries in %.2f ms, slowest %.2f ms: %s',
+                request.method, request.path, view, recorder.count, recorder.duration * 1000,
+                recorder.slowest_duration * 1000, recorder.slowest_sql,
+            )
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests and aggregate the profiles per view name
+    (see userapp.profiling). Unused unless a sample rate, a path prefix or a
+    header token is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.rate = getattr(settings, 'USERAPP_PROFILE_SAMPLE_RATE', 0)
+        self.paths = tuple(getattr(settings, 'USERAPP_PROFILE_PATHS', ()))
+        self.token = getattr(settings, 'USERAPP_PROFILE_TOKEN', None)
+        if not (self.rate or self.paths or self.token):
+            raise MiddlewareNotUsed
+        self.mode = getattr(settings, 'USERAPP_PROFILE_MODE', 'cprofile')
+        self.interval = getattr(settings, 'USERAPP_PROFILE_INTERVAL', 0.005)
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def should_profile(self, request):
+        if self.rate and random.random() < self.rate:
+            return True
+        if self.paths and request.path.startswith(self.paths):
+            return True
+        return bool(self.token) and request.headers.get('X-Profile') == self.token
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+        profile = profiling.RequestProfile(self.mode, self.interval)
+        if not profile.start():
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        self.record(request, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not self.should_profile(request):
+            return await self.get_response(request)
+        profile = profiling.RequestProfile(self.mode, self.interval)
+        if not profile.start():
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+        self.record(request, profile)
+        return response
+
+    def record(self, request, profile):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        path = profiling.store.record(view, profile)
+        if path is not None:
+            logger.info('Wrote profile of %s to %s', view, path)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin clients to the primary database shortly after they write (see
+    userapp.routers). Unused unless ``USERAPP_READ_REPLICAS`` is set.
+    """
+    sync_capable = True
+    async_capable = True
+    unsafe_methods = frozenset(['POST', 'PUT', 'PATCH', 'DELETE'])
+
+    def __init__(self, get_response):
+        if not routers.replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        # Writes and the reads that validate them go to the primary as well
+        return routers.RequestRouting(
+            [f"ip:{request.META.get('REMOTE_ADDR')}"], primary=request.method in self.unsafe_methods,
+        )
+
+    def finish(self, request, response, state):
+        if request.method in self.unsafe_methods and response.status_code < 400:
+            routers.pin(state.keys)
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with routers.routing(self.start(request)) as state:
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        with routers.routing(self.start(request)) as state:
+            response = await self.get_response(request)
+        return self.finish(request, response, state)
+
+
+class MetricsMiddleware:
+    """
+    Count requests by view, method and status code and time them per view
+    (see userapp.metrics).
+    """
+    sync_capable = True
+    async_capable = True
+    methods = frozenset(['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'])
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        return self.finish(request, response, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, start)
+
+    def finish(self, request, response, start):
+        duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        # Bounded label values: arbitrary methods would each make a new series
+        method = request.method if request.method in self.methods else 'other'
+        metrics.requests_total.inc(view, method, str(response.status_code))
+        metrics.request_seconds.observe(duration, view)
+        metrics.registry.maybe_flush()
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0003_user_password_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IssuedRefreshToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=64, unique=True)),
+                ('family', models.CharField(db_index=True, max_length=64)),
+                ('expires_at', models.DateTimeField()),
+                ('rotated_at', models.DateTimeField(blank=True, null=True)),
+                ('revoked', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refresh_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:31
+
+import userapp.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0005_token_revocation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='organisation',
+            name='orgId',
+            field=models.CharField(default=userapp.ids.new_id, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='userId',
+            field=models.CharField(default=userapp.ids.new_id, max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+from userapp import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection, rebuild=True)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0007_user_normalized_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -1,5 +1,22 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
+from django.utils import timezone
+from . import hashing
+from .ids import new_id
+
+
+def normalize_email_key(email):
+    """ Case-insensitive lookup key for an email address ('' for anything that is not a string) """
+    return email.strip().lower() if isinstance(email, str) else ''
+
+
+class NormalizedEmailField(models.CharField):
+    """ Holds ``normalize_email_key(instance.email)``, recomputed on every save and bulk_create """
+
+    def pre_save(self, model_instance, add):
+        value = normalize_email_key(model_instance.email)
+        setattr(model_instance, self.attname, value)
+        return value
 
 
 class CustomUserManager(BaseUserManager):
@@ -18,26 +35,18 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 class User(AbstractBaseUser):
-    email = models.EmailField(unique=True)
-    first_name = models.CharField(max_length=30)
-    last_name = models.CharField(max_length=30)
-    # other fields...
-
-    objects = CustomUserManager()
-
-    USERNAME_FIELD = 'email'
-    REQUIRED_FIELDS = ['first_name', 'last_name']
-
-
-class User(AbstractBaseUser):
-    userId = models.CharField(max_length=100, unique=True)  # Assuming userId is unique
+    userId = models.CharField(max_length=100, unique=True, default=new_id)  # Time-ordered, see ids.py
     firstName = models.CharField(max_length=100)
     lastName = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
-    password = models.CharField(max_length=100)
+    # Login looks users up here, so any capitalisation of the address finds them (see backends.py)
+    normalized_email = NormalizedEmailField(max_length=254, db_index=True, editable=False)
+    # password comes from AbstractBaseUser (max_length=128, enough for scrypt and Argon2 hashes)
     phone = models.CharField(max_length=20, blank=True, null=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Tokens issued before this moment are rejected (see revocation.py)
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['userId', 'firstName', 'lastName']
@@ -47,12 +56,108 @@ class User(AbstractBaseUser):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        if self._password is not None and self.pk is not None:
+            # A password change signs out every existing session
+            self.tokens_valid_after = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'tokens_valid_after'}
+        if 'email' in (kwargs.get('update_fields') or ()):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'normalized_email'}
+        super().save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        # Hash in the bounded pool rather than on the request thread
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, must_update = hashing.verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            # Transparently rehash with the preferred hasher (see PASSWORD_HASHERS)
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+        return is_correct
+
+    async def acheck_password(self, raw_password):
+        is_correct, must_update = await hashing.averify_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.password = await hashing.amake_password(raw_password)
+            self._password = None
+            await self.asave(update_fields=['password'])
+        return is_correct
+
 
 
 class Organisation(models.Model):
-    orgId = models.CharField(max_length=100, unique=True)
+    orgId = models.CharField(max_length=100, unique=True, default=new_id)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True)
+    members = models.ManyToManyField(User, through='Membership', related_name='organisations')
 
     def __str__(self):
         return self.name
+
+
+class Membership(models.Model):
+    # The composite indexes below serve both lookup directions, so the
+    # single-column foreign key indexes would only be redundant.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='memberships', db_index=False)
+    organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, related_name='memberships', db_index=False)
+    date_joined = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # user -> organisations
+            models.UniqueConstraint(fields=['user', 'organisation'], name='membership_user_org_uniq'),
+        ]
+        indexes = [
+            # organisation -> users
+            models.Index(fields=['organisation', 'user'], name='membership_org_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} in {self.organisation}'
+
+
+
+class IssuedRefreshToken(models.Model):
+    # One row per refresh token handed out. Rotating a token stamps rotated_at
+    # and issues its successor in the same family; presenting a token that
+    # was already rotated revokes the whole family (see tokens.py).
+    jti = models.CharField(max_length=64, unique=True)
+    family = models.CharField(max_length=64, db_index=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens')
+    expires_at = models.DateTimeField()
+    rotated_at = models.DateTimeField(null=True, blank=True)
+    revoked = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.jti} ({self.user})'
+
+
+class IdempotencyKey(models.Model):
+    # The response to a registration sent with an Idempotency-Key header,
+    # less its tokens, committed with the account and replayed with new ones
+    # when the client retries (see registration.py). Rows are only needed until expires_at (see
+    # compact_revocations).
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    response = models.TextField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class RevokedToken(models.Model):
+    # Authoritative denylist of individual tokens by jti. Rows are only needed
+    # until the token would have expired anyway (see compact_revocations).
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
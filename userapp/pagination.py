@@ -0,0 +1,26 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the primary key.
+
+    Each page is a ``WHERE id > <cursor> ORDER BY id LIMIT n`` range scan, so
+    it costs the same however deep the client goes. The cursor is DRF's opaque
+    base64 token and stays valid while rows are inserted or deleted.
+    """
+    ordering = 'id'
+    page_size_query_param = 'pageSize'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'USERAPP_PAGE_SIZE', 100)
+        self.max_page_size = getattr(settings, 'USERAPP_MAX_PAGE_SIZE', 1000)
+
+    def get_page_data(self, results_key, data):
+        """ The ``data`` part of the response envelope for one page """
+        return {
+            results_key: data,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
@@ -0,0 +1,32 @@
+import io
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from .renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser backed by orjson when it is installed.
+
+    orjson only reads UTF-8, so other declared encodings (and installs without
+    orjson) use the stdlib parser. Like DRF's strict mode, NaN and Infinity
+    are rejected.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        return parse_json(stream.read())
+
+
+def parse_json(content):
+    """ Parse a UTF-8 JSON body, raising ParseError like the API parsers do """
+    if orjson is None:
+        return JSONParser().parse(io.BytesIO(content))
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError as exc:
+        raise ParseError('JSON parse error - %s' % str(exc))
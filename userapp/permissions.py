@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.cache import caches
+from .cache import LRUCache, bump_versions, get_versions
+from .models import Membership
+from .routers import use_primary
+
+# Short-lived memo of each user's organisation ids, so "can A see B" is a set
+# intersection. Like the user cache (see utils.py), each entry is stored under
+# a version kept in the shared USERAPP_AUTH_VERSION_CACHE, read before the
+# fill's query; the Membership signals (see signals.py) replace it.
+org_ids_cache = LRUCache(
+    maxsize=getattr(settings, 'USERAPP_ORG_IDS_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'USERAPP_ORG_IDS_CACHE_TTL', 30),
+)
+
+def _pk(user):
+    return getattr(user, 'pk', user)
+
+def _version_cache():
+    return caches[getattr(settings, 'USERAPP_AUTH_VERSION_CACHE', 'default')]
+
+def org_ids_version_key(user_id):
+    return f'userapp:org-ids-version:{user_id}'
+
+def _cached_org_ids(user_id):
+    """ ``(org ids or None, version to fill under)`` """
+    key = org_ids_version_key(user_id)
+    version = get_versions(_version_cache(), [key])[key]
+    cached = org_ids_cache.get(user_id)
+    if cached is None or cached[0] != version:
+        return None, version
+    return cached[1], version
+
+def get_org_ids(user):
+    """ Return the frozenset of organisation ids the given user (or user id) belongs to """
+    user_id = _pk(user)
+    org_ids, version = _cached_org_ids(user_id)
+    if org_ids is None:
+        # Cache fills read the primary so a lagging replica can't undo an invalidation
+        with use_primary():
+            org_ids = frozenset(
+                Membership.objects.filter(user_id=user_id).values_list('organisation_id', flat=True)
+            )
+        org_ids_cache.set(user_id, (version, org_ids))
+    return org_ids
+
+async def aget_org_ids(user):
+    """ Async version of get_org_ids() """
+    user_id = _pk(user)
+    org_ids, version = _cached_org_ids(user_id)
+    if org_ids is None:
+        with use_primary():
+            org_ids = frozenset([
+                org_id async for org_id in
+                Membership.objects.filter(user_id=user_id).values_list('organisation_id', flat=True)
+            ])
+        org_ids_cache.set(user_id, (version, org_ids))
+    return org_ids
+
+def invalidate_org_ids(*users):
+    for user in users:
+        org_ids_cache.delete(_pk(user))
+    if users:
+        bump_versions(_version_cache(), [org_ids_version_key(_pk(user)) for user in users])
+
+def shares_organisation(user, other):
+    """ True if both users are the same person or belong to at least one common organisation """
+    if _pk(user) == _pk(other):
+        return True
+    return not get_org_ids(user).isdisjoint(get_org_ids(other))
+
+async def ashares_organisation(user, other):
+    """ Async version of shares_organisation() """
+    if _pk(user) == _pk(other):
+        return True
+    return not (await aget_org_ids(user)).isdisjoint(await aget_org_ids(other))
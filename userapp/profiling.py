@@ -0,0 +1,167 @@
+"""
+Profiles of sampled production requests.
+
+``ProfilingMiddleware`` (userapp.middleware) picks requests to profile: a
+random ``USERAPP_PROFILE_SAMPLE_RATE`` fraction, any path starting with one of
+``USERAPP_PROFILE_PATHS``, and any request whose ``X-Profile`` header matches
+``USERAPP_PROFILE_TOKEN``. The decision is a random draw, a prefix check and a
+header lookup, so unsampled requests pay next to nothing.
+
+Two modes are available:
+
+* ``'cprofile'`` runs cProfile around the request. Profiles are merged per
+  view and written as ``.pstats`` files (``python -m pstats``, snakeviz).
+* ``'sample'`` runs a thread that snapshots the request's stack every
+  ``USERAPP_PROFILE_INTERVAL`` seconds. Stacks are counted per view and
+  written in collapsed-stack format (``flamegraph.pl``, speedscope).
+
+Under ASGI the request shares its event loop thread with other requests, so
+its profile also contains whatever else ran on the loop meanwhile. In
+``'cprofile'`` mode a thread holds one profile at a time, so a request that
+starts while another is being profiled on its thread is not profiled.
+
+A view's profile is written once it has ``USERAPP_PROFILE_FLUSH_EVERY``
+samples. Only the newest ``USERAPP_PROFILE_MAX_FILES`` files are kept in
+``USERAPP_PROFILE_DIR``.
+"""
+import cProfile
+import itertools
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+
+EXTENSIONS = {'cprofile': '.pstats', 'sample': '.collapsed'}
+
+
+class StackSampler:
+    """ Counts the stacks of one thread, sampled from a background thread """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='userapp-profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+def collapse(frame):
+    """ ``'module:function;module:function'`` from the outermost frame to ``frame`` """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class RequestProfile:
+    """ Profile of a single request in either mode """
+
+    def __init__(self, mode, interval):
+        self.mode = mode
+        self.interval = interval
+        self.profiler = None
+        self.sampler = None
+
+    def start(self):
+        """ Return False when the profile could not start (another profiler owns this thread) """
+        if self.mode == 'sample':
+            self.sampler = StackSampler(threading.get_ident(), self.interval)
+            self.sampler.start()
+            return True
+        # A thread has one profile hook: enabling a second cProfile silently replaces the
+        # first, and the first one's disable() then also ends the second. Under ASGI every
+        # request runs on the loop thread, so an overlapping request goes unprofiled instead.
+        if sys.getprofile() is not None:
+            return False
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        return True
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+        else:
+            self.profiler.disable()
+
+
+class ProfileStore:
+    """ Per-view profiles waiting to be written, and the rotating directory they go to """
+
+    def __init__(self, directory, flush_every=20, max_files=200):
+        self.directory = Path(directory)
+        self.flush_every = flush_every
+        self.max_files = max_files
+        self._pending = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def record(self, view, profile):
+        """ Merge a finished request profile into its view; write the view out when it is due """
+        with self._lock:
+            samples, data = self._pending.get(view, (0, None))
+            if profile.sampler is not None:
+                data = (data or Counter()) + profile.sampler.stacks
+            elif data is None:
+                data = pstats.Stats(profile.profiler)
+            else:
+                data.add(profile.profiler)
+            samples += 1
+            if samples < self.flush_every:
+                self._pending[view] = (samples, data)
+                return None
+            self._pending.pop(view, None)
+        return self.write(view, samples, data)
+
+    def flush(self):
+        """ Write every view that has pending samples; return the paths written """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return [self.write(view, samples, data) for view, (samples, data) in pending.items()]
+
+    def write(self, view, samples, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = re.sub(r'[^\w.-]', '_', view)
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        extension = EXTENSIONS['sample' if isinstance(data, Counter) else 'cprofile']
+        path = self.directory / f'{name}-{stamp}-{os.getpid()}-{next(self._sequence)}{extension}'
+        if isinstance(data, Counter):
+            path.write_text(''.join(f'{stack} {count}\n' for stack, count in data.most_common()))
+        else:
+            data.dump_stats(path)
+        self.rotate()
+        return path
+
+    def rotate(self):
+        files = [path for path in self.directory.iterdir() if path.suffix in EXTENSIONS.values()]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: path.stat().st_mtime)
+        for path in files[:len(files) - self.max_files]:
+            path.unlink(missing_ok=True)
+
+
+store = ProfileStore(
+    getattr(settings, 'USERAPP_PROFILE_DIR', settings.BASE_DIR / 'profiles'),
+    flush_every=getattr(settings, 'USERAPP_PROFILE_FLUSH_EVERY', 20),
+    max_files=getattr(settings, 'USERAPP_PROFILE_MAX_FILES', 200),
+)
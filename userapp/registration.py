@@ -0,0 +1,114 @@
+"""
+The database half of ``register_user``.
+
+The password is hashed before the job is queued, so the writer thread only
+ever does inserts. The user, their default organisation, the membership and
+the first refresh token are committed together. Ids are generated up front
+and the primary keys come back from the inserts, so nothing is read back.
+
+A client may send an ``Idempotency-Key`` header. The response body, less
+its tokens, is then committed with the account, and a retry with the same
+key and body replays it with a freshly issued token pair (and refresh
+cookie) before any validation or hashing. Retrying with the same key but a
+different body is refused. Concurrent retries race
+on the key's unique index: the loser's inserts roll back and it replays the
+winner's response. Keys expire after ``USERAPP_IDEMPOTENCY_TTL`` seconds.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from .models import IdempotencyKey, Membership, Organisation, User
+from .parsers import parse_json
+from .renderers import render_json
+from .routers import use_primary
+from .serializers import UserSerializer
+from . import tokens
+from .utils import generate_id
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# The request fields a replayed key must match
+_FINGERPRINT_FIELDS = ('firstName', 'lastName', 'email', 'password', 'phone')
+
+
+class IdempotencyKeyReused(Exception):
+    """ The Idempotency-Key was already used for a registration with a different body """
+
+
+def idempotency(key, data):
+    """
+    ``(key, fingerprint)`` for a request with this ``Idempotency-Key`` and
+    body, or None without a key. Raises ValueError for an unusable key.
+    """
+    if key is None:
+        return None
+    if not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise ValueError(f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters')
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    fields = {name: data.get(name) for name in _FINGERPRINT_FIELDS}
+    # Keyed, as the body includes the password
+    return key, salted_hmac('userapp.registration', render_json(fields)).hexdigest()
+
+
+def replay(idempotency):
+    """
+    The stored response for ``idempotency`` with a new token pair, or None
+    if there is none; raises IdempotencyKeyReused
+    """
+    if idempotency is None:
+        return None
+    key, fingerprint = idempotency
+    # A retry can arrive before the replicas have the first attempt
+    with use_primary():
+        stored = IdempotencyKey.objects.filter(key=key).select_related('user').only(
+            'fingerprint', 'response', 'expires_at', 'user',
+        ).first()
+    if stored is None:
+        return None
+    if stored.expires_at <= timezone.now():
+        # Free the key for reuse; compact_revocations removes the ones nobody reuses
+        stored.delete()
+        return None
+    if stored.fingerprint != fingerprint:
+        raise IdempotencyKeyReused(f'{IDEMPOTENCY_HEADER} was already used for a different request')
+    body = parse_json(stored.response.encode())
+    body['data'] = {**tokens.encode_pair(tokens.issue_refresh_token(stored.user)), 'user': body['data']['user']}
+    return body
+
+
+def create_account(data, encoded_password):
+    """ Create the user described by validated serializer ``data``; returns ``(user, refresh token)`` """
+    data = dict(data)
+    data.pop('password', None)
+    user = User.objects.create(
+        userId=generate_id(), email=User.objects.normalize_email(data.pop('email')), password=encoded_password, **data,
+    )
+    organisation = Organisation.objects.create(orgId=generate_id(), name=f"{user.firstName}'s Organisation")
+    Membership.objects.create(user=user, organisation=organisation)
+    return user, tokens.issue_refresh_token(user)
+
+
+def register(data, encoded_password, idempotency=None):
+    """ Write job: create the account and return the response body, stored under ``idempotency`` if given """
+    user, refresh = create_account(data, encoded_password)
+    body = {
+        'status': 'success',
+        'message': 'Registration successful',
+        'data': {
+            **tokens.encode_pair(refresh),
+            'user': UserSerializer(user).data
+        }
+    }
+    if idempotency is not None:
+        key, fingerprint = idempotency
+        ttl = getattr(settings, 'USERAPP_IDEMPOTENCY_TTL', 86400)
+        # Not the tokens: a replay is issued its own (see replay())
+        stored = {**body, 'data': {'user': body['data']['user']}}
+        IdempotencyKey.objects.create(
+            key=key, fingerprint=fingerprint, response=render_json(stored).decode(), user=user,
+            expires_at=timezone.now() + timedelta(seconds=ttl),
+        )
+    return body
@@ -0,0 +1,20 @@
+"""
+Replication stand-in for local SQLite replicas.
+
+Real replicas are kept up to date by the database server. With SQLite,
+``copy_database`` plays that part by copying the primary into a replica
+through SQLite's online backup API. It copies consistent snapshots while
+both databases stay in use. ``manage.py replicate`` runs it once or on an
+interval, and the interval acts as the replication lag.
+"""
+from django.db import connections
+from .routers import PRIMARY
+
+
+def copy_database(target, source=PRIMARY):
+    """ Overwrite the ``target`` alias with a snapshot of ``source`` (both SQLite) """
+    for alias in (source, target):
+        if connections[alias].vendor != 'sqlite':
+            raise ValueError(f'{alias!r} is not a SQLite database')
+        connections[alias].ensure_connection()
+    connections[source].connection.backup(connections[target].connection)
@@ -0,0 +1,174 @@
+"""
+Read-through cache for organisation payloads.
+
+Two kinds of entries live in the configured Django cache
+(``USERAPP_RESPONSE_CACHE``, local memory by default):
+
+* ``org:<pk>:<version>`` holds one serialised organisation.
+* ``user-orgs:<user pk>:<version>:<url>`` holds one page of a user's
+  organisation listing as a list of organisation ids plus pagination links.
+
+An organisation edit bumps that organisation's version, and a membership
+change bumps the user's. Old entries are orphaned rather than deleted, so a
+membership change drops every cached page of the user's listing without
+needing to know which pages exist. Invalidation runs immediately and again
+once the surrounding transaction commits.
+
+A fill stores what it read under the version it saw *before* querying. If
+an edit lands while the query runs, the fill goes to a version that has
+already been replaced, so a stale read is never served. A listing only
+learns which organisations it holds from its query, so it checks a global
+organisation generation, read before and after the query, instead. If
+anything changed in between, it skips storing those payloads. Entries are
+always filled from the primary database (see routers.py), never from a
+replica that may not have seen the write yet.
+"""
+import hashlib
+import threading
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from .cache import bump_versions, get_versions, now_and_on_commit
+from .models import Organisation
+from .pagination import KeysetPagination
+from .routers import use_primary
+from .fast_serializers import organisation_serializer
+from .metrics import serializer_seconds
+
+
+class CacheStats:
+    """ In-process hit/miss counters per entry kind """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, hit, count=1):
+        with self._lock:
+            self._counts[(kind, 'hits' if hit else 'misses')] += count
+
+    def as_dict(self):
+        with self._lock:
+            counts = dict(self._counts)
+        stats = {}
+        for (kind, outcome), value in counts.items():
+            stats.setdefault(kind, {'hits': 0, 'misses': 0})[outcome] = value
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, 'USERAPP_RESPONSE_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'USERAPP_RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def org_key(org_id, version):
+    return f'userapp:org:{org_id}:{version}'
+
+
+def org_version_key(org_id):
+    return f'userapp:org-version:{org_id}'
+
+
+# Bumped by every organisation edit, before its version
+ORG_GENERATION_KEY = 'userapp:org-generation'
+
+
+def user_version_key(user_id):
+    return f'userapp:user-orgs-version:{user_id}'
+
+
+def _values(queryset):
+    return queryset.values('id', *organisation_serializer.value_fields)
+
+
+def _serialise(rows):
+    with serializer_seconds.time(organisation_serializer.label):
+        return {row['id']: organisation_serializer.from_row(row) for row in rows}
+
+
+def _org_keys(cache, org_ids):
+    """ ``{org id: payload key}`` at each organisation's current version """
+    versions = get_versions(cache, [org_version_key(pk) for pk in org_ids])
+    return {pk: org_key(pk, versions[org_version_key(pk)]) for pk in org_ids}
+
+
+def get_organisation_payload(org_id):
+    """ The serialised organisation, or None if it does not exist """
+    cache = get_cache()
+    key = _org_keys(cache, [org_id])[org_id]
+    payload = cache.get(key)
+    stats.record('organisation', hit=payload is not None)
+    if payload is None:
+        with use_primary():
+            payloads = _serialise(_values(Organisation.objects.filter(pk=org_id)))
+        if not payloads:
+            return None
+        payload = payloads[org_id]
+        cache.set(key, payload, _timeout())
+    return payload
+
+
+def get_organisations_page(request, user):
+    """ The ``data`` part of the get_organisations response for this request """
+    cache = get_cache()
+    version = get_versions(cache, [user_version_key(user.pk)])[user_version_key(user.pk)]
+    url_hash = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    page_key = f'userapp:user-orgs:{user.pk}:{version}:{url_hash}'
+
+    page = cache.get(page_key)
+    stats.record('organisations_page', hit=page is not None)
+    if page is None:
+        paginator = KeysetPagination()
+        generation = get_versions(cache, [ORG_GENERATION_KEY])[ORG_GENERATION_KEY]
+        with use_primary():
+            payloads = _serialise(paginator.paginate_queryset(_values(user.organisations.all()), request))
+        keys = _org_keys(cache, list(payloads))
+        # These versions were read after the query. If an edit landed meanwhile, the
+        # generation has moved on too (it is bumped first), so store nothing
+        if cache.get(ORG_GENERATION_KEY) == generation:
+            cache.set_many({keys[pk]: payload for pk, payload in payloads.items()}, _timeout())
+        page = {'ids': list(payloads), 'next': paginator.get_next_link(), 'previous': paginator.get_previous_link()}
+        cache.set(page_key, page, _timeout())
+        return {'organisations': list(payloads.values()), 'next': page['next'], 'previous': page['previous']}
+
+    keys = _org_keys(cache, page['ids'])
+    cached = cache.get_many(list(keys.values()))
+    payloads = {pk: cached[keys[pk]] for pk in page['ids'] if keys[pk] in cached}
+    missing = [pk for pk in page['ids'] if pk not in payloads]
+    stats.record('organisation', hit=True, count=len(payloads))
+    if missing:
+        stats.record('organisation', hit=False, count=len(missing))
+        # One query refills every evicted payload; deleted organisations simply drop out
+        with use_primary():
+            refilled = _serialise(_values(Organisation.objects.filter(pk__in=missing)))
+        cache.set_many({keys[pk]: payload for pk, payload in refilled.items()}, _timeout())
+        payloads.update(refilled)
+    return {
+        'organisations': [payloads[pk] for pk in page['ids'] if pk in payloads],
+        'next': page['next'],
+        'previous': page['previous'],
+    }
+
+
+def invalidate_organisation(org_id):
+    def bump():
+        # The generation first: a listing fill that sees the new version also sees the new generation
+        get_cache().set(ORG_GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        get_cache().set(org_version_key(org_id), uuid.uuid4().hex, timeout=None)
+    now_and_on_commit(bump)
+
+
+def invalidate_user_organisations(*user_ids):
+    if user_ids:
+        bump_versions(get_cache(), [user_version_key(user_id) for user_id in user_ids])
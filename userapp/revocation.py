@@ -0,0 +1,153 @@
+"""
+Access-token revocation without a query per request.
+
+Two mechanisms:
+
+* Per user: ``User.tokens_valid_after``. Tokens whose ``iat`` is earlier
+  are rejected. The user record is already loaded (from the user cache) to
+  authenticate every request, so this check is free. Password changes and
+  "log out everywhere" move the cutoff.
+* Per token: ``RevokedToken`` rows keyed by ``jti`` (logout). A Bloom
+  filter of revoked jtis sits in front of the table. A jti the filter has
+  never seen, which is almost every token, is accepted with no query; only
+  filter hits are confirmed against the table.
+
+The filter is topped up from the table every ``USERAPP_REVOCATION_REFRESH``
+seconds and rebuilt from unexpired rows only every
+``USERAPP_REVOCATION_REBUILD`` seconds, which drops expired revocations.
+Revocations made in this process take effect immediately; those made by
+other processes are picked up at the next top-up. ``manage.py
+compact_revocations`` deletes rows whose tokens have expired anyway.
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .bloom import BloomFilter
+from .models import IssuedRefreshToken, RevokedToken
+
+
+class RevocationList:
+
+    def __init__(self, capacity=100000, error_rate=0.001, refresh_interval=30, rebuild_interval=3600,
+                 clock=time.monotonic):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.clock = clock
+        self._filter = BloomFilter(capacity, error_rate)
+        self._last_id = 0
+        self._refreshed_at = None
+        self._rebuilt_at = None
+        self._recent = []
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+
+    def is_stale(self):
+        return self._refreshed_at is None or self.clock() - self._refreshed_at >= self.refresh_interval
+
+    def refresh(self, full=False):
+        """ Load revocations added since the last refresh, or rebuild the filter from scratch """
+        # Only one thread refreshes; the others keep answering from the current filter
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            now = self.clock()
+            with self._lock:
+                self._recent = []
+            live = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+            full = full or self._rebuilt_at is None or now - self._rebuilt_at >= self.rebuild_interval
+            if not full:
+                rows = list(live.filter(id__gt=self._last_id).values_list('id', 'jti'))
+                full = self._filter.count + len(rows) > self._filter.capacity
+            if full:
+                rows = list(live.values_list('id', 'jti'))
+                # Size for what is live now, with headroom for what arrives before the next rebuild
+                bloom = BloomFilter(max(self.capacity, len(rows) * 2), self.error_rate)
+            with self._lock:
+                if full:
+                    # Keep revocations made here while the rows were being read
+                    for jti in self._recent:
+                        bloom.add(jti)
+                    self._filter, self._rebuilt_at, self._last_id = bloom, now, 0
+                for pk, jti in rows:
+                    self._filter.add(jti)
+                    self._last_id = max(self._last_id, pk)
+                self._refreshed_at = now
+        finally:
+            self._refreshing.release()
+
+    def add(self, jti):
+        with self._lock:
+            self._filter.add(jti)
+            self._recent.append(jti)
+
+    def might_be_revoked(self, jti):
+        return self._filter.might_contain(jti)
+
+    def is_revoked(self, jti):
+        if self.is_stale():
+            self.refresh()
+        if not self.might_be_revoked(jti):
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    async def ais_revoked(self, jti):
+        """ Async version of is_revoked() """
+        if self.is_stale():
+            await sync_to_async(self.refresh)()
+        if not self.might_be_revoked(jti):
+            return False
+        return await RevokedToken.objects.filter(jti=jti).aexists()
+
+
+revocations = RevocationList(
+    capacity=getattr(settings, 'USERAPP_REVOCATION_FILTER_CAPACITY', 100000),
+    error_rate=getattr(settings, 'USERAPP_REVOCATION_FILTER_ERROR_RATE', 0.001),
+    refresh_interval=getattr(settings, 'USERAPP_REVOCATION_REFRESH', 30),
+    rebuild_interval=getattr(settings, 'USERAPP_REVOCATION_REBUILD', 3600),
+)
+
+
+def _expiry(claims):
+    return datetime.fromtimestamp(claims['exp'], tz=dt_timezone.utc)
+
+
+def revoke_token(claims):
+    """ Revoke the single token with these (already verified) claims """
+    jti = claims.get('jti')
+    if not jti:
+        return
+    RevokedToken.objects.bulk_create([RevokedToken(jti=jti, expires_at=_expiry(claims))], ignore_conflicts=True)
+    revocations.add(jti)
+
+
+def revoke_user_tokens(user):
+    """ Revoke every access and refresh token issued to ``user`` so far """
+    user.tokens_valid_after = timezone.now()
+    user.save(update_fields=['tokens_valid_after'])
+    IssuedRefreshToken.objects.filter(user=user, revoked=False).update(revoked=True)
+
+
+def issued_before_cutoff(claims, user):
+    cutoff = user.tokens_valid_after
+    # iat has one-second resolution; a token from the same second as the cutoff is kept
+    return cutoff is not None and claims.get('iat', 0) < int(cutoff.timestamp())
+
+
+def is_revoked(claims, user):
+    if issued_before_cutoff(claims, user):
+        return True
+    jti = claims.get('jti')
+    return bool(jti) and revocations.is_revoked(jti)
+
+
+async def ais_revoked(claims, user):
+    """ Async version of is_revoked() """
+    if issued_before_cutoff(claims, user):
+        return True
+    jti = claims.get('jti')
+    return bool(jti) and await revocations.ais_revoked(jti)
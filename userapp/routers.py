@@ -0,0 +1,122 @@
+"""
+Primary/replica routing with read-your-writes.
+
+``PrimaryReplicaRouter`` sends every ``userapp`` write to the primary
+(``default``). Reads go to a random alias in ``USERAPP_READ_REPLICAS``, or to
+the primary when no replicas are configured. Reads still go to the primary:
+
+* inside a transaction on the primary, which must see its own changes;
+* inside ``use_primary()``, which the in-process and response caches use
+  when they fill. A stale replica row would otherwise stay cached after the
+  write that invalidated it;
+* for the rest of a request from a pinned client.
+
+A client is pinned for ``USERAPP_REPLICA_PIN_SECONDS`` after any successful
+POST/PUT/PATCH/DELETE (see ``ReadYourWritesMiddleware``). Clients are keyed by
+IP address and, once JWT authentication has identified them, by user id.
+Pins are kept in the ``USERAPP_REPLICA_PIN_CACHE`` cache, so they reach every
+worker when that cache is shared.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+PRIMARY = 'default'
+
+_use_primary = ContextVar('userapp_use_primary', default=False)
+_request = ContextVar('userapp_routing_request', default=None)
+
+
+def replicas():
+    return getattr(settings, 'USERAPP_READ_REPLICAS', ())
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'userapp':
+            return None
+        aliases = replicas()
+        if not aliases or _use_primary.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        state = _request.get()
+        if state is not None and state.primary:
+            return PRIMARY
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != 'userapp':
+            return None
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema along with their data
+        return False if db in replicas() else None
+
+
+@contextmanager
+def use_primary():
+    """ Read from the primary inside this block """
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def _pin_cache():
+    return caches[getattr(settings, 'USERAPP_REPLICA_PIN_CACHE', 'default')]
+
+
+def _pin_key(key):
+    return f'userapp:primary-pin:{key}'
+
+
+class RequestRouting:
+    """ Routing state of one request: which client it is and whether it reads from the primary """
+
+    def __init__(self, keys, primary=False):
+        self.keys = list(keys)
+        self.primary = primary or is_pinned(self.keys)
+
+    def identify(self, key):
+        """ Add a client key learned during the request, e.g. the authenticated user """
+        self.keys.append(key)
+        if not self.primary:
+            self.primary = is_pinned([key])
+
+
+def is_pinned(keys):
+    return bool(keys) and bool(_pin_cache().get_many([_pin_key(key) for key in keys]))
+
+
+def pin(keys):
+    """ Route reads from these clients to the primary for USERAPP_REPLICA_PIN_SECONDS """
+    timeout = getattr(settings, 'USERAPP_REPLICA_PIN_SECONDS', 5)
+    _pin_cache().set_many({_pin_key(key): True for key in keys}, timeout)
+
+
+@contextmanager
+def routing(state):
+    """ Make ``state`` the routing state of the code inside this block """
+    token = _request.set(state)
+    try:
+        yield state
+    finally:
+        _request.reset(token)
+
+
+def identify_user(user_id):
+    """ Called once authentication knows who the client is """
+    state = _request.get()
+    if state is not None:
+        state.identify(f'user:{user_id}')
@@ -0,0 +1,80 @@
+"""
+Pre-rendered OpenAPI schema.
+
+``manage.py build_schema`` renders the schema once into
+``USERAPP_SCHEMA_DIR``; ``get_schema_document()`` serves those bytes (with a
+content hash for the ETag) and only falls back to rendering in-process, once
+per process, when no artifact has been built.
+"""
+import hashlib
+import threading
+from pathlib import Path
+from django.conf import settings
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+api_info = openapi.Info(
+    title="User API Title",
+    default_version='v1',
+    description="Your API description",
+    terms_of_service="https://www.example.com/policies/terms/",
+    contact=openapi.Contact(email="contact@example.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+FORMATS = {
+    'json': ('application/json', lambda: OpenAPICodecJson(validators=[])),
+    'yaml': ('application/yaml', lambda: OpenAPICodecYaml(validators=[])),
+}
+
+_documents = {}
+_lock = threading.Lock()
+
+
+class SchemaDocument:
+
+    def __init__(self, content, content_type):
+        self.content = content
+        self.content_type = content_type
+        self.etag = hashlib.sha256(content).hexdigest()[:32]
+
+
+def schema_path(fmt, directory=None):
+    directory = Path(directory or getattr(settings, 'USERAPP_SCHEMA_DIR', settings.BASE_DIR / 'schema'))
+    return directory / f'openapi.{fmt}'
+
+
+def render_schema(fmt):
+    """ Introspect the API and encode the schema; this is the expensive part """
+    generator = OpenAPISchemaGenerator(api_info, urlconf=settings.ROOT_URLCONF)
+    schema = generator.get_schema(request=None, public=True)
+    return FORMATS[fmt][1]().encode(schema)
+
+
+def build_schema_files(directory=None):
+    """ Write every format to the schema directory and return the paths written """
+    paths = []
+    for fmt in FORMATS:
+        path = schema_path(fmt, directory)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(render_schema(fmt))
+        paths.append(path)
+    clear_cache()
+    return paths
+
+
+def get_schema_document(fmt):
+    document = _documents.get(fmt)
+    if document is None:
+        with _lock:
+            document = _documents.get(fmt)
+            if document is None:
+                path = schema_path(fmt)
+                content = path.read_bytes() if path.exists() else render_schema(fmt)
+                document = _documents[fmt] = SchemaDocument(content, FORMATS[fmt][0])
+    return document
+
+
+def clear_cache():
+    _documents.clear()
@@ -0,0 +1,177 @@
+"""
+Prefix search over users and organisations (SQLite FTS5).
+
+``userapp_user_fts`` indexes each user's names and email and
+``userapp_organisation_fts`` each organisation's name and description. Both
+also have an ``orgs`` column with a token per organisation that can see the
+row: every organisation the user belongs to, or the organisation itself. A
+search adds ``orgs : (o1 OR o2 ...)`` for the caller's organisations, so
+FTS5 applies the permission filter while it walks its index. Joining the
+full-text matches against the membership table instead costs a scan of all
+matches, which is far slower on common words.
+
+Triggers on the user, organisation and membership tables keep the index
+current. That covers ``bulk_create()`` and queryset ``update()`` and
+``delete()`` too, which send no signals. Prefix indexes on 2 to 4
+characters keep short search-as-you-type queries from merging every term
+that starts with them.
+
+Every word in a query must match the start of a word in one of the text
+columns, so ``jo doe`` finds "John Doe" and ``john.doe@ex`` finds
+john.doe@example.com. Results are in id order, so search pages use the same
+keyset pagination as the listings.
+
+On SQLite, Django rebuilds a table when a migration alters it, and the
+table's triggers are dropped with it. ``install()`` therefore runs after
+every ``migrate`` to recreate them. ``manage.py rebuild_search`` re-indexes
+from scratch.
+"""
+import re
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Membership, Organisation, User
+
+MAX_WORDS = 8
+
+_WORD = re.compile(r'\w+')
+
+# The ``orgs`` value of a user / organisation, given SQL for its id
+_USER_ORGS = (
+    "coalesce((SELECT group_concat('o' || organisation_id, ' ') FROM userapp_membership "
+    "WHERE user_id = {id}), '')"
+)
+_ORGANISATION_ORGS = "'o' || {id}"
+
+# FTS table -> (content table, text columns, SQL for the orgs column)
+INDEXES = {
+    'userapp_user_fts': ('userapp_user', ('firstName', 'lastName', 'email'), _USER_ORGS),
+    'userapp_organisation_fts': ('userapp_organisation', ('name', 'description'), _ORGANISATION_ORGS),
+}
+
+
+def is_supported(connection):
+    return connection.vendor == 'sqlite'
+
+
+def _columns(columns, prefix=''):
+    return ', '.join(f'{prefix}"{column}"' for column in columns)
+
+
+def _triggers():
+    """ ``{name: definition}`` of every trigger that maintains the indexes """
+    triggers = {}
+    for fts, (table, columns, orgs) in INDEXES.items():
+        assignments = ', '.join(f'"{column}" = new."{column}"' for column in columns)
+        triggers[f'{fts}_ai'] = (
+            f'AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"(rowid, {_columns(columns)}, orgs) '
+            f'VALUES (new.id, {_columns(columns, "new.")}, {orgs.format(id="new.id")}); END'
+        )
+        # Only edits to indexed columns; password or last_login updates leave the index alone
+        triggers[f'{fts}_au'] = (
+            f'AFTER UPDATE OF {_columns(columns)} ON "{table}" BEGIN '
+            f'UPDATE "{fts}" SET {assignments} WHERE rowid = new.id; END'
+        )
+        triggers[f'{fts}_ad'] = f'AFTER DELETE ON "{table}" BEGIN DELETE FROM "{fts}" WHERE rowid = old.id; END'
+
+    def refresh(user_id):
+        return f'UPDATE userapp_user_fts SET orgs = {_USER_ORGS.format(id=user_id)} WHERE rowid = {user_id};'
+
+    triggers['userapp_user_fts_membership_ai'] = (
+        f'AFTER INSERT ON userapp_membership BEGIN {refresh("new.user_id")} END'
+    )
+    triggers['userapp_user_fts_membership_ad'] = (
+        f'AFTER DELETE ON userapp_membership BEGIN {refresh("old.user_id")} END'
+    )
+    triggers['userapp_user_fts_membership_au'] = (
+        f'AFTER UPDATE OF user_id, organisation_id ON userapp_membership BEGIN '
+        f'{refresh("old.user_id")} {refresh("new.user_id")} END'
+    )
+    return triggers
+
+
+def install(connection, rebuild=False):
+    """ Create the FTS tables if missing and (re)create their triggers; ``rebuild`` re-indexes every row """
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        if not {'userapp_user', 'userapp_organisation', 'userapp_membership'} <= tables:
+            # e.g. a replica, which gets its schema by copying the primary
+            return
+        for fts, (table, columns, orgs) in INDEXES.items():
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5({_columns(columns)}, orgs, '
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+            )
+        for name, definition in _triggers().items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+            cursor.execute(f'CREATE TRIGGER "{name}" {definition}')
+        if rebuild:
+            for fts, (table, columns, orgs) in INDEXES.items():
+                cursor.execute(f'DELETE FROM "{fts}"')
+                cursor.execute(
+                    f'INSERT INTO "{fts}"(rowid, {_columns(columns)}, orgs) '
+                    f'SELECT id, {_columns(columns)}, {orgs.format(id=f"{table}.id")} FROM "{table}"'
+                )
+                # Merge the segments written by the bulk insert
+                cursor.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'optimize\')')
+
+
+def uninstall(connection):
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for name in _triggers():
+            cursor.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+        for fts in INDEXES:
+            cursor.execute(f'DROP TABLE IF EXISTS "{fts}"')
+
+
+def reinstall_triggers(sender, using, **kwargs):
+    """ post_migrate handler; see the module docstring """
+    install(connections[using])
+
+
+def parse_query(text):
+    """ The words to search for: at least USERAPP_SEARCH_MIN_LENGTH characters each, at most MAX_WORDS """
+    min_length = getattr(settings, 'USERAPP_SEARCH_MIN_LENGTH', 2)
+    return [word for word in _WORD.findall(text or '') if len(word) >= min_length][:MAX_WORDS]
+
+
+def _matching(model, org_ids, words):
+    fts = f'{model._meta.db_table}_fts'
+    _, columns, _ = INDEXES[fts]
+    # Words are quoted, so FTS5 query syntax typed by the caller is searched for as text
+    text = ' '.join(f'"{word}"*' for word in words)
+    scope = ' OR '.join(f'o{int(org_id)}' for org_id in sorted(org_ids))
+    expression = f'{{{" ".join(columns)}}} : ({text}) AND orgs : ({scope})'
+    return RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [expression])
+
+
+def _contains_all(columns, words):
+    # Fallback for databases without FTS5; substring rather than prefix matches
+    return Q(*(Q.create([(f'{column}__icontains', word) for column in columns], connector=Q.OR) for word in words))
+
+
+def organisations(org_ids, words):
+    """ The organisations among ``org_ids`` whose name or description matches every word """
+    if not org_ids:
+        return Organisation.objects.none()
+    if is_supported(connections[Organisation.objects.db]):
+        return Organisation.objects.filter(id__in=_matching(Organisation, org_ids, words))
+    return Organisation.objects.filter(_contains_all(('name', 'description'), words), id__in=org_ids)
+
+
+def users(org_ids, words):
+    """ The members of the organisations in ``org_ids`` whose names or email match every word """
+    if not org_ids:
+        return User.objects.none()
+    if is_supported(connections[User.objects.db]):
+        return User.objects.filter(id__in=_matching(User, org_ids, words))
+    return User.objects.filter(
+        _contains_all(('firstName', 'lastName', 'email'), words),
+        id__in=Membership.objects.filter(organisation_id__in=org_ids).values('user_id'),
+    )
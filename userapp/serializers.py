@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import User, Organisation
+from .models import User, Organisation, normalize_email_key
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,8 +8,16 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'password': {'write_only': True},
             'userId': {'read_only': True},  # Assuming userId is generated automatically
+            # validate_email() covers exact matches too
+            'email': {'validators': []},
         }
 
+    def validate_email(self, value):
+        # Login matches any capitalisation, so A@X.COM and a@x.com must not be two accounts
+        if User.objects.filter(normalized_email=normalize_email_key(value)).exists():
+            raise serializers.ValidationError('user with this email already exists.')
+        return value
+
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data)
         return user
@@ -0,0 +1,41 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .membership import membership_changed
+from .models import Membership, Organisation, User
+from .response_cache import invalidate_organisation
+from .utils import invalidate_cached_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    # Any save (including deactivation) or delete makes the cached record stale
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Organisation)
+@receiver(post_delete, sender=Organisation)
+def drop_cached_organisation(sender, instance, **kwargs):
+    invalidate_organisation(instance.pk)
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def drop_cached_memberships(sender, instance, **kwargs):
+    membership_changed(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Membership)
+def drop_cached_memberships_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # user.organisations.add(...) / .remove(...) / .clear()
+        if action.startswith('post_'):
+            membership_changed(instance.pk)
+    elif action == 'pre_clear':
+        # organisation.members.clear() does not report which users it removes
+        instance._cleared_member_ids = list(instance.members.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        membership_changed(*instance.__dict__.pop('_cleared_member_ids', []))
+    elif action.startswith('post_'):
+        # organisation.members.add(...) / .remove(...)
+        membership_changed(*pk_set)
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from userapp.models import Organisation, User
+from userapp.utils import create_access_token
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncViewsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = AsyncClient()
+        self.john = User.objects.create_user(
+            email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+        )
+        self.jane = User.objects.create_user(
+            email='jane@example.com', password='password456', userId='u2', firstName='Jane', lastName='Smith',
+        )
+        self.org = Organisation.objects.create(orgId='o1', name="John's Organisation")
+        self.org.members.add(self.john)
+        self.auth = {'Authorization': f'Bearer {create_access_token(self.john)}'}
+
+    def assertServedAsync(self, response):
+        self.assertEqual(response.asgi_request.resolver_match.func.__module__, 'userapp.async_views')
+
+    async def test_register(self):
+        response = await self.client.post(reverse('register_user'), {
+            'firstName': 'Bob', 'lastName': 'Brown', 'email': 'Bob@EXAMPLE.com', 'password': 'secret',
+        }, content_type='application/json')
+        self.assertServedAsync(response)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        body = response.json()
+        self.assertIn('accessToken', body['data'])
+        self.assertEqual(body['data']['user']['email'], 'Bob@example.com')
+        user = await User.objects.aget(email='Bob@example.com')
+        self.assertTrue(await user.acheck_password('secret'))
+        self.assertEqual(await user.organisations.acount(), 1)
+
+    async def test_register_invalid(self):
+        response = await self.client.post(reverse('register_user'), {
+            'firstName': 'Bob', 'email': 'john@example.com', 'password': 'secret',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertCountEqual(response.json()['errors'], ['lastName', 'email'])
+
+    async def test_login(self):
+        response = await self.client.post(
+            reverse('login_user'), {'email': 'john@example.com', 'password': 'password123'},
+            content_type='application/json',
+        )
+        self.assertServedAsync(response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['data']['user']['userId'], 'u1')
+
+        for email, password in [('john@example.com', 'wrong'), ('nobody@example.com', 'password123')]:
+            response = await self.client.post(
+                reverse('login_user'), {'email': email, 'password': password}, content_type='application/json',
+            )
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_requires_authentication(self):
+        response = await self.client.get(reverse('get_organisations'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+    async def test_organisation_flow(self):
+        response = await self.client.get(reverse('get_organisations'), headers=self.auth)
+        self.assertServedAsync(response)
+        self.assertEqual(response.json()['data'], {
+            'organisations': [{'orgId': 'o1', 'name': "John's Organisation", 'description': None}],
+            'next': None,
+            'previous': None,
+        })
+
+        response = await self.client.post(
+            reverse('create_organisation'), {'name': 'Second'}, content_type='application/json', headers=self.auth,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(await self.john.organisations.acount(), 2)
+
+        response = await self.client.get(reverse('get_organisation', args=[self.org.id]), headers=self.auth)
+        self.assertEqual(response.json()['data']['name'], "John's Organisation")
+
+        url = reverse('get_user_details', args=[self.jane.id])
+        response = await self.client.get(url, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = await self.client.post(
+            reverse('add_user_to_organisation', args=[self.org.id]), {'userId': self.jane.id},
+            content_type='application/json', headers=self.auth,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = await self.client.get(url, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['data']['email'], 'jane@example.com')
@@ -0,0 +1,105 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from userapp.authentication import JWTAuthentication
+from userapp.models import User
+from userapp.revocation import revocations
+from userapp.utils import create_access_token, invalidate_cached_user, user_cache, user_version_key
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class JWTAuthenticationTest(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        # Start with a fresh revocation filter so it needs no refresh query during the test
+        revocations.refresh(full=True)
+        self.factory = APIRequestFactory()
+        self.auth = JWTAuthentication()
+        self.user = User.objects.create_user(
+            email='john@example.com',
+            password='password123',
+            userId='user-1',
+            firstName='John',
+            lastName='Doe',
+        )
+
+    def authenticate(self, token):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.auth.authenticate(request)
+
+    def test_warm_cache_needs_no_query(self):
+        token = create_access_token(self.user)
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(token)
+        with self.assertNumQueries(0):
+            cached, claims = self.authenticate(token)
+        self.assertEqual(user, cached)
+        self.assertIsNot(user, cached)
+        self.assertEqual(cached.email, 'john@example.com')
+        self.assertEqual(claims['user_id'], str(self.user.id))
+
+    def test_simplejwt_access_token_accepted(self):
+        token = RefreshToken.for_user(self.user).access_token
+        user, _ = self.authenticate(str(token))
+        self.assertEqual(user, self.user)
+
+    def test_refresh_token_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(str(token))
+
+    def test_invalid_token_rejected(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('not-a-token')
+
+    def test_missing_header_is_anonymous(self):
+        self.assertIsNone(self.auth.authenticate(self.factory.get('/')))
+
+    def test_save_drops_cached_record(self):
+        token = create_access_token(self.user)
+        self.authenticate(token)
+        self.user.firstName = 'Johnny'
+        self.user.save()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(token)
+        self.assertEqual(user.firstName, 'Johnny')
+
+    def test_deactivated_user_rejected(self):
+        token = create_access_token(self.user)
+        self.authenticate(token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_save_in_another_worker_drops_cached_record(self):
+        token = create_access_token(self.user)
+        self.authenticate(token)
+        # Another process deactivates the user: the shared version moves, this process's cache is untouched
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.set(user_version_key(self.user.pk), 'another-worker')
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_fill_racing_a_save_is_not_kept(self):
+        token = create_access_token(self.user)
+        get = User.objects.get
+
+        def read_then_deactivate(**kwargs):
+            user = get(**kwargs)
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.filter(pk=self.user.pk).update(is_active=False)
+                invalidate_cached_user(self.user.pk)
+            return user
+
+        with mock.patch.object(User.objects, 'get', read_then_deactivate):
+            # This request read the user before the save...
+            user, _ = self.authenticate(token)
+        self.assertTrue(user.is_active)
+        # ...but did not keep it for the next one
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
@@ -0,0 +1,120 @@
+from django.contrib.auth import aauthenticate, authenticate
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp import metrics, throttling
+from userapp.backends import EmailBackend
+from userapp.instrumentation import QueryRecorder
+from userapp.models import User, normalize_email_key
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EmailBackendTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='John.Doe@Example.com', password='password123', firstName='John', lastName='Doe',
+        )
+
+    def test_normalized_email_is_kept_in_step(self):
+        self.assertEqual(self.user.normalized_email, 'john.doe@example.com')
+        self.user.email = 'JD@example.com'
+        self.user.save(update_fields=['email'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).normalized_email, 'jd@example.com')
+        [bulk] = User.objects.bulk_create([User(email='Ada@Example.com', firstName='Ada', lastName='L')])
+        self.assertEqual(User.objects.get(pk=bulk.pk).normalized_email, 'ada@example.com')
+
+    def test_any_capitalisation_logs_in_with_one_query(self):
+        for email in ('john.doe@example.com', 'JOHN.DOE@EXAMPLE.COM', ' John.Doe@example.com '):
+            recorder = QueryRecorder()
+            with recorder.activate():
+                user = authenticate(email=email, password='password123')
+            self.assertEqual(user, self.user, email)
+            self.assertEqual(recorder.count, 1)
+        self.assertIsNone(authenticate(email='john.doe@example.com', password='wrong'))
+
+    def test_lookup_uses_the_index(self):
+        sql, params = EmailBackend().candidates('john.doe@example.com').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX', plan)
+        self.assertIn('normalized_email', plan)
+
+    def test_loads_only_login_columns(self):
+        [user] = EmailBackend().candidates('john.doe@example.com')
+        self.assertEqual(user.get_deferred_fields(), {'is_staff', 'tokens_valid_after', 'last_login', 'normalized_email'})
+
+    def test_unknown_email_is_hashed_in_the_pool(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.assertIsNone(authenticate(email='nobody@example.com', password='password123'))
+        # Only hashes run by the pool workers are timed
+        self.assertEqual(metrics.registry.snapshot()[('userapp_password_hash_seconds', ('make',))][-1], 1)
+
+    def test_inactive_users_are_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authenticate(email='john.doe@example.com', password='password123'))
+
+    def test_case_variants_from_before_normalisation_need_an_exact_match(self):
+        User.objects.create_user(email='john.doe@example.com', password='other', firstName='J', lastName='D')
+        self.assertEqual(authenticate(email='John.Doe@Example.com', password='password123'), self.user)
+        self.assertIsNone(authenticate(email='JOHN.DOE@EXAMPLE.COM', password='password123'))
+
+    def test_registration_rejects_case_variants(self):
+        throttling.buckets.clear()
+        response = APIClient().post(reverse('register_user'), {
+            'firstName': 'J', 'lastName': 'D', 'email': 'JOHN.DOE@example.com', 'password': 'other',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data['errors'])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_login_endpoint_is_case_insensitive(self):
+        response = APIClient().post(
+            reverse('login_user'), {'email': 'JOHN.doe@example.COM', 'password': 'password123'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['user']['email'], 'John.Doe@example.com')
+
+    async def test_async(self):
+        self.assertEqual(await aauthenticate(email='JOHN.DOE@example.com', password='password123'), self.user)
+        self.assertIsNone(await aauthenticate(email='nobody@example.com', password='password123'))
+
+    def test_non_string_emails_are_rejected(self):
+        throttling.buckets.clear()
+        self.assertEqual(normalize_email_key(123), '')
+        for email in (123, ['john.doe@example.com'], {'email': 'john.doe@example.com'}, True):
+            self.assertIsNone(authenticate(email=email, password='password123'), email)
+            response = APIClient().post(reverse('login_user'), {'email': email, 'password': 'password123'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, email)
+
+    def test_non_string_passwords_are_rejected(self):
+        throttling.buckets.clear()
+        for email in ('john.doe@example.com', 'nobody@example.com'):
+            for password in (123, ['password123'], True):
+                self.assertIsNone(authenticate(email=email, password=password), (email, password))
+                response = APIClient().post(reverse('login_user'), {'email': email, 'password': password}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, (email, password))
+
+    async def test_async_non_string_emails_are_rejected(self):
+        throttling.buckets.clear()
+        self.assertIsNone(await aauthenticate(email=123, password='password123'))
+        for email in (123, ['john.doe@example.com']):
+            response = await AsyncClient().post(
+                reverse('login_user'), {'email': email, 'password': 'password123'}, content_type='application/json',
+            )
+            self.assertEqual(response.asgi_request.resolver_match.func.__module__, 'userapp.async_views')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, email)
+
+    async def test_async_non_string_passwords_are_rejected(self):
+        throttling.buckets.clear()
+        for email in ('john.doe@example.com', 'nobody@example.com'):
+            self.assertIsNone(await aauthenticate(email=email, password=123))
+            response = await AsyncClient().post(
+                reverse('login_user'), {'email': email, 'password': 123}, content_type='application/json',
+            )
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, email)
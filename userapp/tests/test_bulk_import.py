@@ -0,0 +1,98 @@
+import io
+import json
+import os
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp.bulk_import import import_users, iter_rows
+from userapp.models import Membership, User
+from userapp.utils import create_access_token
+
+CSV = (
+    'firstName,lastName,email,password,phone\n'
+    'Ada,Lovelace,ada@example.com,secret1,\n'
+    'Alan,Turing,not-an-email,secret2,\n'
+    'Grace,Hopper,grace@example.com,secret3,555\n'
+    'Dup,Licate,ada@EXAMPLE.com,secret4,\n'
+)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkImportTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='password', userId='admin', firstName='Admin', lastName='User',
+            is_staff=True,
+        )
+
+    def test_import_with_row_errors(self):
+        report = import_users(iter_rows(io.StringIO(CSV), 'csv'), chunk_size=2)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([e['line'] for e in report.errors], [3, 5])
+        self.assertIn('email', report.errors[0]['errors'])
+
+        grace = User.objects.get(email='grace@example.com')
+        self.assertTrue(grace.check_password('secret3'))
+        self.assertEqual(grace.phone, '555')
+        self.assertEqual(grace.organisations.get().name, "Grace's Organisation")
+        self.assertEqual(Membership.objects.filter(user__email='ada@example.com').count(), 1)
+
+    def test_existing_email_reported(self):
+        rows = [json.dumps({'firstName': 'A', 'lastName': 'B', 'email': email, 'password': 'x'})
+                for email in ('admin@example.com', 'ADMIN@example.com', 'new@example.com', 'NEW@example.com')]
+        report = import_users(iter_rows([*rows, 'oops'], 'ndjson'))
+        self.assertEqual(report.created, 1)
+        self.assertEqual(sorted(e['line'] for e in report.errors), [1, 2, 4, 5])
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        rows = ''.join(
+            json.dumps({'firstName': 'U', 'lastName': str(i), 'email': f'u{i}@example.com', 'password': 'pw'}) + '\n'
+            for i in range(50)
+        )
+        # existence check + savepoint + three bulk inserts + release
+        with self.assertNumQueries(6):
+            report = import_users(iter_rows(io.StringIO(rows), 'ndjson'), chunk_size=50)
+        self.assertEqual(report.created, 50)
+
+    def test_api_endpoint(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(self.admin)}')
+        response = client.post(reverse('import_users'), CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['created'], 2)
+        self.assertEqual(response.data['data']['failed'], 2)
+
+        upload = SimpleUploadedFile('users.ndjson', json.dumps(
+            {'firstName': 'Bob', 'lastName': 'Brown', 'email': 'bob@example.com', 'password': 'pw'}
+        ).encode())
+        response = client.post(reverse('import_users'), {'file': upload}, format='multipart')
+        self.assertEqual(response.data['data']['created'], 1)
+
+        response = client.post(reverse('import_users'), 'x', content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_api_requires_staff(self):
+        user = User.objects.create_user(
+            email='user@example.com', password='password', userId='user', firstName='Plain', lastName='User',
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(user)}')
+        response = client.post(reverse('import_users'), CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.csv')
+            report_path = os.path.join(tmp, 'report.ndjson')
+            with open(path, 'w') as f:
+                f.write(CSV)
+            out = io.StringIO()
+            call_command('import_users', path, report=report_path, stdout=out)
+            self.assertIn('Imported 2 user(s), 2 row(s) failed', out.getvalue())
+            with open(report_path) as f:
+                self.assertEqual(len(f.readlines()), 2)
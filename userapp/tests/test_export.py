@@ -0,0 +1,97 @@
+import csv
+import gzip
+import io
+import json
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp import export
+from userapp.models import Organisation, User
+from userapp.permissions import org_ids_cache
+from userapp.utils import create_access_token
+
+
+@override_settings(USERAPP_EXPORT_CHUNK_SIZE=2)
+class ExportTest(TestCase):
+
+    def setUp(self):
+        org_ids_cache.clear()
+        self.john = User.objects.create(email='john@example.com', firstName='John', lastName='Doe')
+        members = [
+            User.objects.create(email=f'member{i}@example.com', firstName='Member', lastName=str(i)) for i in range(4)
+        ]
+        self.first = Organisation.objects.create(name='First')
+        self.first.members.add(self.john, *members[:3])
+        self.second = Organisation.objects.create(name='Second, Inc.')
+        self.second.members.add(self.john, members[3])
+        Organisation.objects.create(name='Elsewhere').members.add(members[0])
+        self.auth = {'Authorization': f'Bearer {create_access_token(self.john)}'}
+
+    def get(self, **params):
+        response = APIClient().get(reverse('export_memberships'), params, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        chunks = list(response.streaming_content)
+        return response, chunks, b''.join(chunks)
+
+    def records(self, **params):
+        _, _, body = self.get(**params)
+        return [json.loads(line) for line in body.decode().splitlines()]
+
+    def test_ndjson_streams_in_chunks(self):
+        response, chunks, body = self.get()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="memberships.ndjson"')
+        # Six rows at two per chunk, plus the (empty) start and end
+        self.assertEqual(len([chunk for chunk in chunks if chunk]), 3)
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(
+            [(r['organisationName'], r['email']) for r in records],
+            [('First', 'john@example.com'), ('First', 'member0@example.com'), ('First', 'member1@example.com'),
+             ('First', 'member2@example.com'), ('Second, Inc.', 'john@example.com'),
+             ('Second, Inc.', 'member3@example.com')],
+        )
+        self.assertEqual(set(records[0]), set(export.COLUMNS))
+        self.assertEqual(records[0]['orgId'], self.first.orgId)
+        self.assertTrue(records[0]['dateJoined'].endswith('Z'))
+
+    def test_resume_from_any_row(self):
+        records = self.records()
+        for i, record in enumerate(records):
+            self.assertEqual(self.records(cursor=record['cursor']), records[i + 1:])
+
+    def test_csv_and_gzip(self):
+        response, _, body = self.get(fmt='csv', compress='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="memberships.csv.gz"')
+        rows = list(csv.reader(io.StringIO(gzip.decompress(body).decode())))
+        self.assertEqual(tuple(rows[0]), export.COLUMNS)
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[-1][2], 'Second, Inc.')
+        self.assertEqual(rows[-1][7], '')  # phone: None
+
+    def test_bad_parameters(self):
+        client = APIClient()
+        for params in (
+            {'fmt': 'xml'}, {'compress': 'brotli'}, {'cursor': 'abc'},
+            {'cursor': '1.99999999999999999999999'}, {'cursor': f'{2 ** 63}.1'},
+        ):
+            response = client.get(reverse('export_memberships'), params, headers=self.auth)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+        self.assertEqual(client.get(reverse('export_memberships')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_reads_the_index_in_order(self):
+        for queryset in export.memberships({self.first.id, self.second.id}, (self.first.id, self.john.id)):
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn('membership_org_user_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    async def test_async(self):
+        response = await AsyncClient().get(reverse('export_memberships'), {'fmt': 'csv'}, headers=self.auth)
+        self.assertEqual(response.asgi_request.resolver_match.func.__module__, 'userapp.async_views')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.decode().splitlines()), 7)
@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from userapp.fast_serializers import CompiledSerializer, organisation_serializer, user_serializer
+from userapp.models import Organisation, User
+from userapp.serializers import OrganisationSerializer, UserSerializer
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class CompiledSerializerTest(TestCase):
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+                phone='+2348012345678',
+            ),
+            User.objects.create_user(
+                email='zoe@example.com', password='password456', userId='u2', firstName='Zoë', lastName='',
+            ),
+        ]
+        self.organisations = [
+            Organisation.objects.create(orgId='o1', name="John's Organisation", description='Engines'),
+            Organisation.objects.create(orgId='o2', name="Zoë's Organisation"),
+        ]
+
+    def test_instances_match_drf(self):
+        for user in self.users:
+            self.assertEqual(render(user_serializer.to_representation(user)), render(UserSerializer(user).data))
+        for org in self.organisations:
+            self.assertEqual(
+                render(organisation_serializer.to_representation(org)), render(OrganisationSerializer(org).data)
+            )
+
+    def test_values_rows_match_drf(self):
+        rows = User.objects.order_by('id').values('id', *user_serializer.value_fields)
+        self.assertEqual(render(user_serializer.many(rows)), render(UserSerializer(self.users, many=True).data))
+        rows = Organisation.objects.order_by('id').values(*organisation_serializer.value_fields)
+        self.assertEqual(
+            render(organisation_serializer.many(rows)),
+            render(OrganisationSerializer(self.organisations, many=True).data),
+        )
+
+    def test_write_only_fields_are_skipped(self):
+        self.assertNotIn('password', user_serializer.names)
+
+    def test_non_passthrough_fields_use_drf_representation(self):
+        class LastLoginSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = User
+                fields = ('userId', 'last_login', 'is_active')
+
+        self.users[0].last_login = timezone.now()
+        compiled = CompiledSerializer(LastLoginSerializer)
+        for user in self.users:
+            self.assertEqual(render(compiled.to_representation(user)), render(LastLoginSerializer(user).data))
+        self.assertEqual(compiled.converters[0], None)
+        self.assertIsNotNone(compiled.converters[1])
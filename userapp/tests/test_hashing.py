@@ -0,0 +1,92 @@
+import concurrent.futures
+import threading
+from unittest import mock
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp.hashing import HashingQueueFull, HashingService, HashingTimeout, hashing_service
+from userapp.models import User
+
+
+class FastPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = 1
+
+
+class HashingServiceTest(TestCase):
+
+    def test_queue_depth_limit(self):
+        service = HashingService(max_workers=1, max_pending=1)
+        release = threading.Event()
+        try:
+            blocked = service.submit(release.wait)
+            with self.assertRaises(HashingQueueFull):
+                service.submit(lambda: None)
+            release.set()
+            blocked.result()
+            # The slot is released once the job finishes
+            self.assertIsNone(service.submit(lambda: None).result())
+        finally:
+            release.set()
+            service.shutdown()
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_sync_callers_time_out(self):
+        service = HashingService(max_workers=1, max_pending=2, timeout=0.01)
+        release = threading.Event()
+        try:
+            service.submit(release.wait)
+            with self.assertRaises(HashingTimeout):
+                service.make_password('secret')
+            # The queued hash was cancelled, so its slot is free again
+            service.submit(lambda: None)
+        finally:
+            release.set()
+            service.shutdown()
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_make_and_verify(self):
+        encoded = hashing_service.make_password('secret')
+        self.assertEqual(hashing_service.verify_password('secret', encoded), (True, False))
+        self.assertEqual(hashing_service.verify_password('wrong', encoded), (False, False))
+
+
+class PasswordRehashTest(TestCase):
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+        )
+
+    @override_settings(PASSWORD_HASHERS=[
+        'userapp.tests.test_hashing.FastPBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_login_upgrades_hash_to_preferred_hasher(self):
+        self.assertTrue(self.user.password.startswith('md5$'))
+        response = APIClient().post(
+            reverse('login_user'), {'email': 'john@example.com', 'password': 'password123'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('password123'))
+
+    def test_login_rejected_when_hashing_times_out(self):
+        # A hash that never finishes
+        with mock.patch.object(hashing_service, 'submit', return_value=concurrent.futures.Future()):
+            with mock.patch.object(hashing_service, 'timeout', 0.01):
+                response = APIClient().post(
+                    reverse('login_user'), {'email': 'john@example.com', 'password': 'password123'}, format='json',
+                )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_login_rejected_when_pool_is_saturated(self):
+        with mock.patch.object(hashing_service, 'submit', side_effect=HashingQueueFull):
+            response = APIClient().post(
+                reverse('login_user'), {'email': 'john@example.com', 'password': 'password123'}, format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
@@ -0,0 +1,151 @@
+from datetime import timedelta
+from unittest import mock
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp import hashing, registration, throttling, tokens
+from userapp.models import IdempotencyKey, Membership, Organisation, User
+from userapp.utils import decode_access_token
+from userapp.write_queue import write_queue
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegistrationIdempotencyTest(TestCase):
+    body = {'firstName': 'Ada', 'lastName': 'Lovelace', 'email': 'ada@example.com', 'password': 'secret'}
+
+    def setUp(self):
+        throttling.buckets.clear()
+
+    def register(self, key='retry-1', client=None, **changes):
+        headers = {registration.IDEMPOTENCY_HEADER: key} if key is not None else {}
+        return (client or APIClient()).post(
+            reverse('register_user'), {**self.body, **changes}, format='json', headers=headers,
+        )
+
+    def test_retry_replays_the_original_response(self):
+        first = self.register()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', first)
+        with mock.patch.object(hashing, 'make_password', wraps=hashing.make_password) as make_password:
+            # The stored response with its user, then the new refresh token
+            with self.assertNumQueries(2):
+                retry = self.register()
+        make_password.assert_not_called()
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['data']['user'], first.json()['data']['user'])
+        # A token pair of its own, which works like the first
+        pair = retry.json()['data']
+        self.assertNotEqual(pair['refreshToken'], first.json()['data']['refreshToken'])
+        self.assertEqual(retry.cookies['refresh_token'].value, pair['refreshToken'])
+        self.assertEqual(decode_access_token(pair['accessToken']), User.objects.get())
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(Organisation.objects.count(), 1)
+
+    def test_tokens_are_not_stored(self):
+        body = self.register().json()['data']
+        stored = IdempotencyKey.objects.get().response
+        self.assertNotIn(body['accessToken'], stored)
+        self.assertNotIn(body['refreshToken'], stored)
+
+    def test_body_must_be_an_object(self):
+        response = self.client.post(
+            reverse('register_user'), [self.body], content_type='application/json',
+            headers={registration.IDEMPOTENCY_HEADER: 'list-body'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.exists())
+
+    def test_key_reused_for_a_different_request(self):
+        self.register()
+        response = self.register(password='other')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = self.register(email='someone.else@example.com')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_bad_key(self):
+        for key in ('', 'k' * 256):
+            self.assertEqual(self.register(key=key).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.exists())
+
+    def test_without_a_key_nothing_is_stored(self):
+        self.assertEqual(self.register(key=None).status_code, status.HTTP_201_CREATED)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.register(key=None).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_key_is_forgotten(self):
+        self.register()
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        # Registers afresh, so the (taken) email is now an error
+        self.assertEqual(self.register().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_concurrent_retries(self):
+        first = self.register()
+        replay = registration.replay
+        calls = []
+
+        def late_replay(idempotency):
+            # As if the first attempt committed just after the retry first looked for it
+            calls.append(idempotency)
+            return None if len(calls) == 1 else replay(idempotency)
+
+        with mock.patch.object(registration, 'replay', late_replay):
+            retry = self.register()
+        # Its email was taken, so the retry looked again and found the response
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['data']['user'], first.json()['data']['user'])
+
+        calls.clear()
+        with mock.patch.object(registration, 'replay', late_replay):
+            response = self.register(email='other@example.com')
+        # This one got as far as the inserts, where the key was taken
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(User.objects.filter(email='other@example.com').exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegistrationTransactionTest(TestCase):
+    data = {'firstName': 'Ada', 'lastName': 'Lovelace', 'email': 'ada@example.com', 'password': 'secret'}
+
+    def setUp(self):
+        throttling.buckets.clear()
+
+    def test_one_insert_per_row_and_no_reads(self):
+        idempotency = registration.idempotency('key', self.data)
+        with CaptureQueriesContext(connection) as queries:
+            registration.register(self.data, 'encoded', idempotency)
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        self.assertEqual(statements, ['INSERT'] * 5)
+
+    def test_failure_rolls_back_the_whole_account(self):
+        with mock.patch.object(tokens, 'issue_refresh_token', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                write_queue.run(registration.register, self.data, 'encoded', None)
+        for model in (User, Organisation, Membership, IdempotencyKey):
+            self.assertFalse(model.objects.exists(), model)
+
+    async def test_async_replay(self):
+        client = AsyncClient()
+        headers = {registration.IDEMPOTENCY_HEADER: 'async-key'}
+        first = await client.post(reverse('register_user'), self.data, content_type='application/json', headers=headers)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        retry = await client.post(reverse('register_user'), self.data, content_type='application/json', headers=headers)
+        self.assertEqual(retry.asgi_request.resolver_match.func.__module__, 'userapp.async_views')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['data']['user'], first.json()['data']['user'])
+        retry = await client.post(
+            reverse('register_user'), [self.data], content_type='application/json', headers=headers,
+        )
+        self.assertEqual(retry.status_code, status.HTTP_400_BAD_REQUEST)
+        retry = await client.post(
+            reverse('register_user'), {**self.data, 'password': 'other'}, content_type='application/json',
+            headers=headers,
+        )
+        self.assertEqual(retry.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
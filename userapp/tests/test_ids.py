@@ -0,0 +1,95 @@
+import os
+import threading
+from django.test import SimpleTestCase, TestCase
+from userapp.ids import LENGTH, ULIDGenerator, decode, encode, new_id, timestamp_ms
+from userapp.models import Organisation, User
+
+
+class FakeClock:
+
+    def __init__(self, ms):
+        self.ms = ms
+
+    def __call__(self):
+        return self.ms * 1_000_000
+
+
+class ULIDTest(SimpleTestCase):
+
+    def test_encoding_round_trips_and_sorts(self):
+        values = [0, 1, 31, 32, 1 << 80, (1 << 128) - 1]
+        encoded = [encode(value) for value in values]
+        self.assertEqual([decode(text) for text in encoded], values)
+        self.assertEqual(encoded, sorted(encoded))
+        self.assertTrue(all(len(text) == LENGTH for text in encoded))
+        self.assertEqual(decode(encoded[-1].lower()), values[-1])
+        for bad in ('short', 'U' * LENGTH, '8' + '0' * (LENGTH - 1)):
+            with self.assertRaises(ValueError):
+                decode(bad)
+
+    def test_monotonic_within_and_across_milliseconds(self):
+        clock = FakeClock(1_700_000_000_000)
+        generate = ULIDGenerator(clock)
+        ids = [generate() for _ in range(1000)]
+        clock.ms += 1
+        ids += [generate() for _ in range(10)]
+        # The clock stepping back does not break the order
+        clock.ms -= 5
+        ids += [generate() for _ in range(10)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(timestamp_ms(ids[0]), 1_700_000_000_000)
+        self.assertEqual(timestamp_ms(ids[-1]), 1_700_000_000_001)
+
+    def test_random_part_overflow_borrows_next_millisecond(self):
+        generate = ULIDGenerator(FakeClock(5), randbits=lambda: (1 << 80) - 2)
+        ids = [generate() for _ in range(3)]
+        self.assertEqual([timestamp_ms(i) for i in ids], [5, 5, 6])
+        self.assertEqual(ids, sorted(ids))
+
+    def test_threads_get_distinct_ids(self):
+        generate = ULIDGenerator()
+        results = [[] for _ in range(8)]
+
+        def work(out):
+            out.extend(generate() for _ in range(2000))
+
+        threads = [threading.Thread(target=work, args=(out,)) for out in results]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = [i for out in results for i in out]
+        self.assertEqual(len(set(ids)), len(ids))
+        for out in results:
+            self.assertEqual(out, sorted(out))
+
+    def test_forked_child_starts_a_new_sequence(self):
+        if not hasattr(os, 'fork'):
+            self.skipTest('needs os.fork')
+        last = new_id()
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write, new_id().encode())
+            os._exit(0)
+        os.close(write)
+        child = os.read(read, LENGTH).decode()
+        os.close(read)
+        os.waitpid(pid, 0)
+        parent = new_id()
+        self.assertNotEqual(child, parent)
+        # Same millisecond as the parent would otherwise mean the parent's next value
+        if timestamp_ms(child) == timestamp_ms(last) == timestamp_ms(parent):
+            self.assertNotEqual(decode(child), decode(last) + 1)
+
+
+class DefaultIdTest(TestCase):
+
+    def test_models_get_time_ordered_ids(self):
+        first = Organisation.objects.create(name='First')
+        second = Organisation.objects.create(name='Second')
+        self.assertEqual(len(first.orgId), LENGTH)
+        self.assertLess(first.orgId, second.orgId)
+        user = User.objects.create_user(email='ada@example.com', password='pw', firstName='Ada', lastName='L')
+        self.assertEqual(len(user.userId), LENGTH)
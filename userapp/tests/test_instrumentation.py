@@ -0,0 +1,127 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp import instrumentation
+from userapp.instrumentation import QueryBudgetExceeded, max_queries
+from userapp.middleware import QueryInstrumentationMiddleware
+from userapp.models import Organisation, User
+from userapp.permissions import org_ids_cache
+from userapp.revocation import revocations
+from userapp.utils import create_access_token, user_cache
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTest(TestCase):
+    """ Declared query budgets for the hot endpoints, with every cache cold """
+
+    def setUp(self):
+        cache.clear()
+        org_ids_cache.clear()
+        user_cache.clear()
+        # The revocation filter loads once per process; keep that query out of the budgets
+        revocations.refresh(full=True)
+        self.john = User.objects.create_user(
+            email='john@example.com', password='pw', userId='u1', firstName='John', lastName='Doe',
+        )
+        self.jane = User.objects.create_user(
+            email='jane@example.com', password='pw', userId='u2', firstName='Jane', lastName='Smith',
+        )
+        self.org = Organisation.objects.create(orgId='o1', name="John's Organisation")
+        self.org.members.add(self.john, self.jane)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(self.john)}')
+
+    @max_queries(4)
+    def test_get_user_details(self):
+        response = self.client.get(reverse('get_user_details', args=[self.jane.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @max_queries(2)
+    def test_get_organisations(self):
+        response = self.client.get(reverse('get_organisations'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @max_queries(3)
+    def test_get_organisation(self):
+        response = self.client.get(reverse('get_organisation', args=[self.org.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_organisation_members_does_not_grow_with_members(self):
+        url = reverse('get_organisation_members', args=[self.org.id])
+        with max_queries(3) as recorder:
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        for i in range(10):
+            self.org.members.add(User.objects.create_user(
+                email=f'member{i}@example.com', password='pw', userId=f'm{i}', firstName='M', lastName=str(i),
+            ))
+        user_cache.clear()
+        org_ids_cache.clear()
+        with max_queries(recorder.count):
+            self.assertEqual(len(self.client.get(url).data['data']['users']), 12)
+
+    @max_queries(4)
+    async def test_async_get_user_details(self):
+        response = await AsyncClient().get(
+            reverse('get_user_details', args=[self.jane.id]),
+            headers={'Authorization': f'Bearer {create_access_token(self.john)}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_budget_exceeded_lists_statements(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries executed, budget is 1'):
+            with max_queries(1):
+                User.objects.count()
+                Organisation.objects.count()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryInstrumentationMiddlewareTest(TestCase):
+
+    def setUp(self):
+        instrumentation.stats.reset()
+        self.john = User.objects.create_user(
+            email='john@example.com', password='pw', userId='u1', firstName='John', lastName='Doe', is_staff=True,
+        )
+        self.org = Organisation.objects.create(orgId='o1', name="John's Organisation")
+        self.org.members.add(self.john)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(self.john)}')
+
+    def test_headers_are_opt_in(self):
+        response = self.client.get(reverse('get_organisations'))
+        self.assertNotIn('X-DB-Queries', response)
+
+    @override_settings(USERAPP_QUERY_HEADERS=True)
+    def test_headers(self):
+        user_cache.clear()
+        with max_queries(10) as recorder:
+            response = self.client.get(reverse('get_user_details', args=[self.john.id]))
+        self.assertEqual(int(response['X-DB-Queries']), recorder.count)
+        self.assertGreater(float(response['X-DB-Time']), 0)
+
+    def test_stats_per_view(self):
+        self.client.get(reverse('get_organisation', args=[self.org.id]))
+        self.client.get(reverse('get_organisation', args=[self.org.id]))
+        response = self.client.get(reverse('get_query_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        entry = response.data['data']['get_organisation']
+        self.assertEqual(entry['requests'], 2)
+        self.assertGreaterEqual(entry['maxQueries'], 1)
+        self.assertIn('SELECT', entry['slowestSql'])
+
+    @override_settings(USERAPP_QUERY_REPEAT_LIMIT=2)
+    def test_repeated_statement_is_logged(self):
+        def n_plus_one(request):
+            for org in Organisation.objects.all():
+                list(org.members.all())
+            return HttpResponse()
+
+        for i in range(3):
+            Organisation.objects.create(orgId=f'x{i}', name=f'Org {i}')
+        middleware = QueryInstrumentationMiddleware(n_plus_one)
+        with self.assertLogs('userapp.queries', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('one statement ran 4 times', logs.output[0])
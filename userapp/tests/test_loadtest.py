@@ -0,0 +1,70 @@
+import json
+import tempfile
+from collections import Counter
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from userapp.management.commands.loadtest import Command
+from userapp.models import User
+
+
+class LoadtestCommandTest(SimpleTestCase):
+    # The command creates and destroys its own database
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def loadtest(self, *args):
+        out = StringIO()
+        call_command(
+            'loadtest', '--users', '20', '--requests', '5', '--warmup', '0', '--concurrency', '2', '--fast-hasher',
+            *args, stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_json_output_and_compare(self):
+        first = self.dir / 'first.json'
+        self.loadtest('--endpoint', 'register', 'organisations', '--output', str(first))
+        document = json.loads(first.read_text())
+        self.assertEqual(document['meta']['users'], 20)
+        self.assertEqual(
+            [(r['server'], r['endpoint']) for r in document['results']],
+            [('wsgi', 'register'), ('wsgi', 'organisations'), ('asgi', 'register'), ('asgi', 'organisations')],
+        )
+        for result in document['results']:
+            self.assertEqual(result['requests'], 5)
+            self.assertEqual(result['errors'], 0, result['statuses'])
+            self.assertGreater(result['rps'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        out = self.loadtest('--endpoint', 'register', '--server', 'wsgi', '--compare', str(first))
+        self.assertIn(f'Change against {first}', out)
+        self.assertRegex(out, r'WSGI\s+register\s+rps [+-]\d')
+
+    def test_uses_a_file_database_and_removes_it(self):
+        database = self.dir / 'load.sqlite3'
+        self.loadtest('--endpoint', 'register', '--server', 'wsgi', '--database-file', str(database))
+        self.assertFalse(database.exists())
+        # The suite's own database is untouched
+        self.assertFalse(User.objects.filter(email__startswith='bench-').exists())
+
+    def test_refuses_an_existing_database_file(self):
+        database = self.dir / 'keep.sqlite3'
+        database.write_bytes(b'precious')
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            self.loadtest('--endpoint', 'register', '--database-file', str(database))
+        self.assertEqual(database.read_bytes(), b'precious')
+
+    def test_server_errors_fail_the_run(self):
+        def failing(command, requests, concurrency):
+            return 0.01, [0.001] * len(requests), Counter({500: 2, 200: len(requests) - 2})
+
+        with mock.patch.object(Command, 'run_wsgi', failing):
+            with self.assertRaisesMessage(CommandError, '2 of 5 requests failed with a server error'):
+                self.loadtest('--endpoint', 'user', '--server', 'wsgi')
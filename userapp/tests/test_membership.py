@@ -0,0 +1,152 @@
+from contextlib import contextmanager
+from unittest import mock
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp.models import Membership, Organisation, User
+from userapp import permissions
+from userapp.permissions import get_org_ids, org_ids_cache, org_ids_version_key, shares_organisation
+from userapp.revocation import revocations
+from userapp.routers import use_primary
+from userapp.utils import create_access_token
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class MembershipTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        org_ids_cache.clear()
+        self.john = User.objects.create_user(
+            email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+        )
+        self.jane = User.objects.create_user(
+            email='jane@example.com', password='password456', userId='u2', firstName='Jane', lastName='Smith',
+        )
+        self.bob = User.objects.create_user(
+            email='bob@example.com', password='password789', userId='u3', firstName='Bob', lastName='Brown',
+        )
+        self.org = Organisation.objects.create(orgId='o1', name="John's Organisation")
+        self.org.members.add(self.john, self.jane)
+
+    def test_composite_indexes_exist(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Membership._meta.db_table)
+        indexed = {tuple(c['columns']) for c in constraints.values() if c['index'] or c['unique']}
+        self.assertIn(('user_id', 'organisation_id'), indexed)
+        self.assertIn(('organisation_id', 'user_id'), indexed)
+
+    def test_relations_in_both_directions(self):
+        self.assertEqual(list(self.john.organisations.all()), [self.org])
+        self.assertCountEqual(self.org.members.all(), [self.john, self.jane])
+
+    def test_shares_organisation_is_memoised(self):
+        with self.assertNumQueries(2):
+            self.assertTrue(shares_organisation(self.john, self.jane))
+        with self.assertNumQueries(0):
+            self.assertTrue(shares_organisation(self.john, self.jane))
+            self.assertTrue(shares_organisation(self.john, self.john))
+
+    def test_membership_changes_invalidate_memo(self):
+        self.assertFalse(shares_organisation(self.john, self.bob))
+        self.org.members.add(self.bob)
+        self.assertTrue(shares_organisation(self.john, self.bob))
+        self.bob.organisations.remove(self.org)
+        self.assertFalse(shares_organisation(self.john, self.bob))
+        Membership.objects.create(user=self.bob, organisation=self.org)
+        self.assertEqual(get_org_ids(self.bob), {self.org.id})
+
+    def test_change_in_another_worker_invalidates_memo(self):
+        self.assertEqual(get_org_ids(self.bob), frozenset())
+        # Another process added Bob: only the shared version moves
+        Membership.objects.bulk_create([Membership(user=self.bob, organisation=self.org)])
+        cache.set(org_ids_version_key(self.bob.pk), 'another-worker')
+        self.assertEqual(get_org_ids(self.bob), {self.org.id})
+
+    def test_fill_racing_a_membership_change_is_not_kept(self):
+        @contextmanager
+        def read_then_join():
+            with use_primary():
+                yield
+            with self.captureOnCommitCallbacks(execute=True):
+                self.org.members.add(self.bob)
+
+        with mock.patch.object(permissions, 'use_primary', read_then_join):
+            # What the fill read, from before Bob joined...
+            self.assertEqual(get_org_ids(self.bob), frozenset())
+        # ...is not what the next check sees
+        self.assertEqual(get_org_ids(self.bob), {self.org.id})
+
+    def test_get_user_details_access(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(self.john)}')
+
+        response = client.get(reverse('get_user_details', kwargs={'id': self.jane.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['email'], 'jane@example.com')
+
+        response = client.get(reverse('get_user_details', kwargs={'id': self.bob.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BatchMembershipAddTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        org_ids_cache.clear()
+        # Start with a fresh revocation filter so it needs no refresh query during the test
+        revocations.refresh(full=True)
+        self.owner = User.objects.create_user(
+            email='owner@example.com', password='pw', userId='owner', firstName='Owner', lastName='One',
+        )
+        self.users = User.objects.bulk_create(
+            User(email=f'user{i}@example.com', userId=f'user{i}', firstName='User', lastName=str(i)) for i in range(20)
+        )
+        self.org = Organisation.objects.create(orgId='o1', name="Owner's Organisation")
+        self.org.members.add(self.owner, self.users[0])
+        self.url = reverse('add_user_to_organisation', kwargs={'orgId': self.org.id})
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(self.owner)}')
+
+    def test_batch_add(self):
+        ids = [user.id for user in self.users]
+        get_org_ids(self.users[5])
+        # auth + org lookup + resolve ids + one bulk insert, independent of batch size
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, {'userIds': ids + [999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], {'added': ids[1:], 'alreadyMembers': [ids[0]], 'unknown': [999999]})
+        self.assertEqual(self.org.members.count(), 21)
+        self.assertEqual(get_org_ids(self.users[5]), {self.org.id})
+
+    def test_single_user_id(self):
+        response = self.client.post(self.url, {'userId': self.users[1].id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], 'User added to organisation successfully')
+
+        response = self.client.post(self.url, {'userId': 999999}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_input(self):
+        bodies = [
+            {'userIds': []}, {'userIds': ['abc']}, {'userIds': 'nope'}, {},
+            # Would otherwise be read as user 1
+            {'userIds': [True]}, {'userIds': [1.5]}, {'userIds': ['1.5']}, {'userId': True},
+        ]
+        for body in bodies:
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        self.assertEqual(self.org.members.count(), 2)
+
+    def test_numeric_strings(self):
+        response = self.client.post(self.url, {'userIds': [str(self.users[1].id)]}, format='json')
+        self.assertEqual(response.data['data']['added'], [self.users[1].id])
+
+    @override_settings(USERAPP_MEMBERSHIP_BATCH_LIMIT=5)
+    def test_batch_limit(self):
+        response = self.client.post(self.url, {'userIds': [user.id for user in self.users]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
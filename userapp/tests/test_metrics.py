@@ -0,0 +1,149 @@
+import json
+import tempfile
+import threading
+from pathlib import Path
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp import metrics
+from userapp.metrics import Registry
+from userapp.fast_serializers import user_serializer
+from userapp.models import User
+
+
+def parse(text):
+    """ ``{'name{labels}': value}`` for every sample line of an exposition """
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            sample, value = line.rsplit(' ', 1)
+            samples[sample] = float(value)
+    return samples
+
+
+class RegistryTest(TestCase):
+
+    def test_counter_and_histogram(self):
+        registry = Registry()
+        hits = registry.counter('hits_total', 'Hits', ('view',))
+        latency = registry.histogram('latency_seconds', 'Latency', ('view',), buckets=(0.1, 1))
+        hits.inc('a')
+        hits.inc('a', amount=2)
+        for value in (0.05, 0.1, 0.5, 3):
+            latency.observe(value, 'a')
+
+        samples = parse(registry.exposition())
+        self.assertEqual(samples['hits_total{view="a"}'], 3)
+        # Buckets are cumulative and inclusive of their upper bound
+        self.assertEqual(samples['latency_seconds_bucket{view="a",le="0.1"}'], 2)
+        self.assertEqual(samples['latency_seconds_bucket{view="a",le="1.0"}'], 3)
+        self.assertEqual(samples['latency_seconds_bucket{view="a",le="+Inf"}'], 4)
+        self.assertEqual(samples['latency_seconds_count{view="a"}'], 4)
+        self.assertAlmostEqual(samples['latency_seconds_sum{view="a"}'], 3.65)
+
+    def test_exposition_format(self):
+        registry = Registry()
+        registry.counter('hits_total', 'Hits', ('view',)).inc('say "hi"\n')
+        registry.histogram('idle_seconds', 'Never observed')
+        self.assertEqual(registry.exposition().splitlines(), [
+            '# HELP hits_total Hits',
+            '# TYPE hits_total counter',
+            'hits_total{view="say \\"hi\\"\\n"} 1',
+            '# HELP idle_seconds Never observed',
+            '# TYPE idle_seconds histogram',
+        ])
+
+    def test_threads_record_without_losing_updates(self):
+        registry = Registry()
+        hits = registry.counter('hits_total', 'Hits')
+
+        def work():
+            for _ in range(10000):
+                hits.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registry.snapshot()[('hits_total', ())], [80000])
+        registry.reset()
+        self.assertEqual(registry.snapshot(), {})
+
+    def test_processes_are_merged_through_the_directory(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        directory = Path(tmp.name)
+        registry = Registry(directory)
+        registry.counter('hits_total', 'Hits', ('view',)).inc('a')
+        registry.histogram('latency_seconds', 'Latency', buckets=(1,)).observe(0.5)
+        # Snapshot left by another worker
+        (directory / 'metrics-1.json').write_text(json.dumps([
+            ['hits_total', ['a'], [4]],
+            ['hits_total', ['b'], [1]],
+            ['latency_seconds', [], [0, 1, 2.0, 1]],
+        ]))
+        (directory / 'metrics-2.json').write_text('{truncated')
+
+        samples = parse(registry.exposition())
+        self.assertEqual(samples['hits_total{view="a"}'], 5)
+        self.assertEqual(samples['hits_total{view="b"}'], 1)
+        self.assertEqual(samples['latency_seconds_bucket{le="1.0"}'], 1)
+        self.assertEqual(samples['latency_seconds_bucket{le="+Inf"}'], 2)
+        self.assertEqual(samples['latency_seconds_sum'], 2.5)
+        self.assertTrue(list(directory.glob('metrics-*.json')))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class MetricsEndpointTest(TestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_requests_are_counted_and_timed(self):
+        self.client.get(reverse('health'))
+        self.client.post(reverse('health'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        samples = parse(response.content.decode())
+        self.assertEqual(samples['userapp_requests_total{view="health",method="GET",status="200"}'], 1)
+        self.assertEqual(samples['userapp_requests_total{view="health",method="POST",status="200"}'], 1)
+        self.assertEqual(samples['userapp_request_duration_seconds_count{view="health"}'], 2)
+
+    def test_unknown_methods_and_paths_have_bounded_labels(self):
+        self.client.generic('BREW', reverse('health'))
+        self.client.get('/no-such-page/')
+        samples = parse(metrics.registry.exposition())
+        self.assertIn('userapp_requests_total{view="health",method="other",status="200"}', samples)
+        self.assertIn('userapp_requests_total{view="unresolved",method="GET",status="404"}', samples)
+
+    @override_settings(USERAPP_METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_login_records_hot_path_timings(self):
+        User.objects.create_user(
+            email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+        )
+        response = APIClient().post(
+            reverse('login_user'), {'email': 'john@example.com', 'password': 'password123'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        samples = parse(metrics.registry.exposition())
+        self.assertEqual(samples['userapp_password_hash_seconds_count{operation="verify"}'], 1)
+        self.assertEqual(samples['userapp_token_seconds_count{stage="issue"}'], 1)
+        self.assertEqual(samples['userapp_token_seconds_count{stage="encode"}'], 1)
+        self.assertEqual(samples['userapp_serializer_seconds_count{serializer="UserSerializer"}'], 1)
+
+    def test_serializers_are_timed_per_response_not_per_object(self):
+        users = [User(email=f'u{i}@example.com', userId=f'u{i}', firstName='U', lastName=str(i)) for i in range(50)]
+        user_serializer.many(users)
+        for user in users:
+            user_serializer.to_representation(user)
+        samples = parse(metrics.registry.exposition())
+        self.assertEqual(samples['userapp_serializer_seconds_count{serializer="UserSerializer"}'], 1)
@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp.models import Membership, Organisation, User
+from userapp.utils import create_access_token, get_cached_user
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class KeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='svc@example.com', password='pw', userId='svc', firstName='Service', lastName='Account',
+        )
+        self.organisations = Organisation.objects.bulk_create(
+            Organisation(orgId=f'o{i}', name=f'Org {i}') for i in range(7)
+        )
+        Membership.objects.bulk_create(Membership(user=self.user, organisation=o) for o in self.organisations)
+        members = User.objects.bulk_create(
+            User(email=f'm{i}@example.com', userId=f'm{i}', firstName='Member', lastName=str(i)) for i in range(4)
+        )
+        Membership.objects.bulk_create(Membership(user=m, organisation=self.organisations[0]) for m in members)
+        self.token = create_access_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def collect(self, url, key, page_size):
+        names, pages = [], 0
+        url = f'{url}?pageSize={page_size}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            names += [item.get('name') or item.get('email') for item in response.data['data'][key]]
+            url = response.data['data']['next']
+            pages += 1
+        return names, pages
+
+    def test_walks_all_organisations(self):
+        names, pages = self.collect(reverse('get_organisations'), 'organisations', 3)
+        self.assertEqual(names, [f'Org {i}' for i in range(7)])
+        self.assertEqual(pages, 3)
+
+    def test_deep_page_has_constant_query_count(self):
+        response = self.client.get(reverse('get_organisations'), {'pageSize': 1})
+        first_next = response.data['data']['next']
+        for _ in range(5):
+            response = self.client.get(response.data['data']['next'])
+        deep_next = response.data['data']['next']
+        # Bypass the response cache to measure the database work
+        cache.clear()
+        # That also retired the cached user record (see utils.py); warm it again
+        get_cached_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.client.get(first_next)
+        with self.assertNumQueries(1):
+            self.client.get(deep_next)
+
+    def test_previous_link(self):
+        response = self.client.get(reverse('get_organisations'), {'pageSize': 3})
+        response = self.client.get(response.data['data']['next'])
+        self.assertEqual(response.data['data']['organisations'][0]['name'], 'Org 3')
+        response = self.client.get(response.data['data']['previous'])
+        self.assertEqual([o['name'] for o in response.data['data']['organisations']], ['Org 0', 'Org 1', 'Org 2'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('get_organisations'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(USERAPP_MAX_PAGE_SIZE=2)
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse('get_organisations'), {'pageSize': 50})
+        self.assertEqual(len(response.data['data']['organisations']), 2)
+
+    def test_members_listing(self):
+        url = reverse('get_organisation_members', args=[self.organisations[0].id])
+        emails, pages = self.collect(url, 'users', 2)
+        self.assertEqual(emails, ['svc@example.com'] + [f'm{i}@example.com' for i in range(4)])
+        self.assertEqual(pages, 3)
+
+        outsider = User.objects.create_user(
+            email='out@example.com', password='pw', userId='out', firstName='Out', lastName='Sider',
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(outsider)}')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_members_of_a_non_numeric_id(self):
+        url = reverse('get_organisation_members', args=['abc'])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_members_of_a_non_numeric_id(self):
+        url = reverse('get_organisation_members', args=['abc'])
+        response = await AsyncClient().get(url, headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(response.asgi_request.resolver_match.func.__module__, 'userapp.async_views')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_views_paginate_the_same_way(self):
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {self.token}'}
+        response = await client.get(reverse('get_organisations'), {'pageSize': 4}, headers=headers)
+        data = response.json()['data']
+        self.assertEqual(len(data['organisations']), 4)
+        response = await client.get(data['next'], headers=headers)
+        self.assertEqual([o['name'] for o in response.json()['data']['organisations']], ['Org 4', 'Org 5', 'Org 6'])
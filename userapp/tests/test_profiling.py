@@ -0,0 +1,119 @@
+import asyncio
+import pstats
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from userapp import profiling
+from userapp.middleware import ProfilingMiddleware
+from userapp.profiling import ProfileStore, RequestProfile
+
+
+class ProfilingTestMixin:
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.store = ProfileStore(self.dir, flush_every=2)
+        patcher = mock.patch.object(profiling, 'store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def files(self, suffix):
+        return sorted(self.dir.glob(f'*{suffix}'))
+
+
+@override_settings(USERAPP_PROFILE_PATHS=['/health/'])
+class ProfilingMiddlewareTest(ProfilingTestMixin, TestCase):
+
+    def test_unused_unless_configured(self):
+        with override_settings(USERAPP_PROFILE_PATHS=[]):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_matching_path_is_profiled_per_view(self):
+        self.client.get(reverse('health'))
+        self.assertEqual(self.files('.pstats'), [])
+        self.client.get(reverse('health'))
+        [path] = self.files('.pstats')
+        self.assertTrue(path.name.startswith('health-'))
+        functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+        self.assertIn('health', functions)
+
+    def test_other_paths_are_not_profiled(self):
+        for _ in range(2):
+            self.client.get(reverse('get_organisations'))
+        self.assertEqual(self.store.flush(), [])
+
+    @override_settings(USERAPP_PROFILE_PATHS=[], USERAPP_PROFILE_TOKEN='secret')
+    def test_header_token(self):
+        self.client.get(reverse('health'), headers={'X-Profile': 'wrong'})
+        self.assertEqual(self.store.flush(), [])
+        self.client.get(reverse('health'), headers={'X-Profile': 'secret'})
+        self.assertEqual(len(self.store.flush()), 1)
+
+    @override_settings(USERAPP_PROFILE_MODE='sample', USERAPP_PROFILE_INTERVAL=0.001)
+    def test_sample_mode_writes_collapsed_stacks(self):
+        def slow(request):
+            end = time.perf_counter() + 0.05
+            while time.perf_counter() < end:
+                pass
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(slow)
+        for _ in range(2):
+            middleware(RequestFactory().get('/health/'))
+        [path] = self.files('.collapsed')
+        stack, count = path.read_text().splitlines()[0].rsplit(' ', 1)
+        self.assertIn('test_profiling:slow', stack)
+        self.assertGreater(int(count), 0)
+
+    async def test_async_requests_are_profiled(self):
+        await AsyncClient().get(reverse('health'))
+        self.assertEqual(len(self.store.flush()), 1)
+
+    async def test_overlapping_async_requests_share_no_profiler(self):
+        release = asyncio.Event()
+
+        async def view(request):
+            await release.wait()
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(view)
+        # Both start on the event loop thread before either finishes
+        requests = [asyncio.ensure_future(middleware(RequestFactory().get('/health/'))) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*requests)
+        self.assertIsNone(sys.getprofile())
+        # Only the first was profiled (flush_every=2 would have written both)
+        self.assertEqual(self.files('.pstats'), [])
+        self.assertEqual(len(self.store.flush()), 1)
+
+
+class ProfileStoreTest(ProfilingTestMixin, TestCase):
+
+    def test_directory_rotates(self):
+        self.store.max_files = 3
+        for i in range(5):
+            profile = RequestProfile('cprofile', None)
+            profile.start()
+            profile.stop()
+            self.store.record(f'view{i}', profile)
+        self.assertEqual(len(self.store.flush()), 5)
+        self.assertEqual(len(self.files('.pstats')), 3)
+
+    def test_one_cprofile_per_thread(self):
+        first, second = RequestProfile('cprofile', None), RequestProfile('cprofile', None)
+        self.assertTrue(first.start())
+        self.assertFalse(second.start())
+        first.stop()
+        self.assertIsNone(sys.getprofile())
+        self.assertTrue(second.start())
+        second.stop()
@@ -0,0 +1,87 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from userapp import throttling
+from userapp.models import IssuedRefreshToken, User
+from userapp.utils import decode_access_token_claims
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RefreshTokenTest(TestCase):
+
+    def setUp(self):
+        throttling.buckets.clear()
+        self.user = User.objects.create_user(
+            email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+        )
+
+    def login(self):
+        response = self.client.post(reverse('login_user'), {
+            'email': 'john@example.com', 'password': 'password123',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def refresh(self, token=None):
+        data = {'refreshToken': token} if token else {}
+        return self.client.post(reverse('refresh_token'), data, content_type='application/json')
+
+    def test_login_issues_refresh_token(self):
+        response = self.login()
+        data = response.json()['data']
+        self.assertIn('refreshToken', data)
+        cookie = response.cookies['refresh_token']
+        self.assertEqual(cookie.value, data['refreshToken'])
+        self.assertTrue(cookie['httponly'])
+        self.assertEqual(cookie['path'], reverse('refresh_token'))
+        self.assertEqual(IssuedRefreshToken.objects.filter(user=self.user).count(), 1)
+
+    def test_refresh_rotates(self):
+        first = self.login().json()['data']['refreshToken']
+        with mock.patch('userapp.hashing.hashing_service.submit') as submit:
+            response = self.refresh(first)
+        submit.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()['data']
+        self.assertNotEqual(data['refreshToken'], first)
+        self.assertEqual(decode_access_token_claims(data['accessToken'])['user_id'], str(self.user.pk))
+        self.assertEqual(self.refresh(data['refreshToken']).status_code, status.HTTP_200_OK)
+
+    def test_refresh_from_cookie(self):
+        self.login()
+        response = self.refresh()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.cookies['refresh_token'].value, response.json()['data']['refreshToken'])
+
+    def test_reuse_revokes_family(self):
+        first = self.login().json()['data']['refreshToken']
+        second = self.refresh(first).json()['data']['refreshToken']
+        other_login = self.login().json()['data']['refreshToken']
+
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.cookies['refresh_token'].value, '')
+        # The legitimate successor is revoked too; other logins are unaffected
+        self.assertEqual(self.refresh(second).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.refresh(other_login).status_code, status.HTTP_200_OK)
+
+    def test_rejects_invalid_tokens(self):
+        access = self.login().json()['data']['accessToken']
+        self.client.cookies.clear()
+        for token in (None, 'not-a-token', access):
+            with self.subTest(token=token):
+                self.assertEqual(self.refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_cannot_refresh(self):
+        token = self.login().json()['data']['refreshToken']
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_bearer_header_is_ignored(self):
+        token = self.login().json()['data']['refreshToken']
+        response = self.client.post(
+            reverse('refresh_token'), {'refreshToken': token}, content_type='application/json',
+            headers={'Authorization': 'Bearer expired'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
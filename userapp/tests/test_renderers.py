@@ -0,0 +1,84 @@
+import datetime
+import decimal
+import io
+import uuid
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from userapp import parsers, renderers
+from userapp.parsers import FastJSONParser
+from userapp.renderers import FastJSONRenderer
+
+PAYLOAD = {
+    'status': 'success',
+    'message': 'Login successful',
+    'data': {
+        'user': {'userId': 'u1', 'firstName': 'Zoë', 'lastName': None, 'phone': ''},
+        'organisations': [{'orgId': 'o1', 'name': "Zoë's Organisation", 'description': 'line\u2028break'}],
+        'joined': datetime.datetime(2024, 7, 1, 12, 30, tzinfo=datetime.timezone.utc),
+        'balance': decimal.Decimal('1.50'),
+        'id': uuid.UUID(int=1),
+        'counts': {1: 2},
+        'next': None,
+    },
+}
+
+
+class FastJSONRendererTest(TestCase):
+
+    def test_matches_drf_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(PAYLOAD), JSONRenderer().render(PAYLOAD))
+
+    def test_indent_uses_drf_renderer(self):
+        rendered = FastJSONRenderer().render(PAYLOAD, 'application/json; indent=2')
+        self.assertEqual(rendered, JSONRenderer().render(PAYLOAD, 'application/json; indent=2'))
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(PAYLOAD), JSONRenderer().render(PAYLOAD))
+
+    def test_none_renders_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTest(TestCase):
+
+    def test_matches_drf_parser(self):
+        body = JSONRenderer().render({'email': 'zoë@example.com', 'userIds': [1, 2], 'phone': None})
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+    def test_invalid_json(self):
+        for body in (b'{"email": ', b'{"n": NaN}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch.object(parsers, 'orjson', None):
+            self.assertEqual(parsers.parse_json(b'{"a": [1]}'), {'a': [1]})
+            with self.assertRaises(ParseError):
+                parsers.parse_json(b'{')
+
+    def test_other_encodings_use_drf_parser(self):
+        body = '{"name": "Zoë"}'.encode('latin-1')
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body), parser_context={'encoding': 'latin-1'}), {'name': 'Zoë'})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class JSONViewsTest(TestCase):
+
+    def test_malformed_body_is_bad_request(self):
+        response = self.client.post(reverse('login_user'), b'{"email": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+    def test_responses_use_fast_renderer(self):
+        response = self.client.post(reverse('register_user'), {
+            'firstName': 'Zoë', 'lastName': 'Brown', 'email': 'zoe@example.com', 'password': 'secret',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
@@ -0,0 +1,130 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp import response_cache
+from userapp.models import Organisation, User
+from userapp.permissions import org_ids_cache
+from userapp.utils import create_access_token
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        org_ids_cache.clear()
+        response_cache.stats.reset()
+        self.john = User.objects.create_user(
+            email='john@example.com', password='pw', userId='u1', firstName='John', lastName='Doe', is_staff=True,
+        )
+        self.jane = User.objects.create_user(
+            email='jane@example.com', password='pw', userId='u2', firstName='Jane', lastName='Smith',
+        )
+        self.org = Organisation.objects.create(orgId='o1', name="John's Organisation")
+        self.org.members.add(self.john)
+        self.client = self.client_for(self.john)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(user)}')
+        return client
+
+    def names(self, client=None):
+        response = (client or self.client).get(reverse('get_organisations'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [o['name'] for o in response.data['data']['organisations']]
+
+    def test_listing_is_served_from_cache(self):
+        self.names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ["John's Organisation"])
+        stats = response_cache.stats.as_dict()
+        self.assertEqual(stats['organisations_page'], {'hits': 1, 'misses': 1})
+
+    def test_organisation_edit_invalidates_only_its_payload(self):
+        self.names()
+        self.org.name = 'Renamed'
+        self.org.save()
+        # The cached page of ids is still valid; only the edited payload is refetched
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names(), ['Renamed'])
+
+    def test_create_organisation_invalidates_listing(self):
+        self.names()
+        response = self.client.post(reverse('create_organisation'), {'name': 'Second'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.names(), ["John's Organisation", 'Second'])
+
+    def test_add_user_invalidates_added_users_listing(self):
+        jane_client = self.client_for(self.jane)
+        self.assertEqual(self.names(jane_client), [])
+        self.names()
+        self.client.post(
+            reverse('add_user_to_organisation', args=[self.org.id]), {'userIds': [self.jane.id]}, format='json',
+        )
+        self.assertEqual(self.names(jane_client), ["John's Organisation"])
+        # John's membership did not change, so his page is still cached
+        with self.assertNumQueries(0):
+            self.names()
+
+    def test_removal_and_clear_invalidate(self):
+        self.org.members.add(self.jane)
+        jane_client = self.client_for(self.jane)
+        self.assertEqual(self.names(jane_client), ["John's Organisation"])
+        self.org.members.clear()
+        self.assertEqual(self.names(jane_client), [])
+        self.assertEqual(self.names(), [])
+
+    def test_get_organisation_cached_and_access_checked(self):
+        url = reverse('get_organisation', args=[self.org.id])
+        self.assertEqual(self.client.get(url).data['data']['name'], "John's Organisation")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.org.description = 'Now with a description'
+        self.org.save()
+        self.assertEqual(self.client.get(url).data['data']['description'], 'Now with a description')
+
+        self.assertEqual(self.client_for(self.jane).get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('get_organisation', args=['abc'])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def edit_during_read(self, name):
+        """ Patch the cache fill so the organisation is renamed right after the reader's query """
+        serialise = response_cache._serialise
+
+        def read_then_edit(rows):
+            payloads = serialise(rows)
+            with self.captureOnCommitCallbacks(execute=True):
+                Organisation.objects.filter(pk=self.org.pk).update(name=name)
+                response_cache.invalidate_organisation(self.org.pk)
+            return payloads
+        return mock.patch.object(response_cache, '_serialise', read_then_edit)
+
+    def test_read_racing_an_edit_is_not_kept(self):
+        url = reverse('get_organisation', args=[self.org.id])
+        with self.edit_during_read('Renamed'):
+            # The reader still returns what it read...
+            self.assertEqual(self.client.get(url).data['data']['name'], "John's Organisation")
+        # ...but does not cache it
+        self.assertEqual(self.client.get(url).data['data']['name'], 'Renamed')
+
+    def test_listing_racing_an_edit_is_not_kept(self):
+        with self.edit_during_read('Renamed'):
+            self.assertEqual(self.names(), ["John's Organisation"])
+        self.assertEqual(self.names(), ['Renamed'])
+        self.assertEqual(self.client.get(reverse('get_organisation', args=[self.org.id])).data['data']['name'], 'Renamed')
+
+        # A cached page whose evicted payload is refilled while the edit lands
+        cache.delete(response_cache.org_key(self.org.pk, cache.get(response_cache.org_version_key(self.org.pk))))
+        with self.edit_during_read('Renamed again'):
+            self.assertEqual(self.names(), ['Renamed'])
+        self.assertEqual(self.names(), ['Renamed again'])
+
+    def test_stats_endpoint(self):
+        self.client.get(reverse('get_organisation', args=[self.org.id]))
+        self.client.get(reverse('get_organisation', args=[self.org.id]))
+        response = self.client.get(reverse('get_cache_stats'))
+        self.assertEqual(response.data['data']['organisation'], {'hits': 1, 'misses': 1})
+        self.assertEqual(self.client_for(self.jane).get(reverse('get_cache_stats')).status_code, status.HTTP_403_FORBIDDEN)
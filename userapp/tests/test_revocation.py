@@ -0,0 +1,164 @@
+import time
+from datetime import timedelta
+from io import StringIO
+import jwt
+from django.conf import settings
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from userapp import throttling
+from userapp.bloom import BloomFilter
+from userapp.models import IssuedRefreshToken, RevokedToken, User
+from userapp.revocation import RevocationList, revocations
+from userapp.utils import create_access_token, user_cache
+
+
+class BloomFilterTest(TestCase):
+
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertTrue(bloom.is_full())
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RevocationListTest(TestCase):
+
+    def revoke_elsewhere(self, jti, expires_in=timedelta(hours=1)):
+        # As if another process had revoked it: the row exists, this filter has not seen it
+        RevokedToken.objects.create(jti=jti, expires_at=timezone.now() + expires_in)
+
+    def test_unseen_jti_needs_no_query(self):
+        revocation_list = RevocationList()
+        revocation_list.refresh()
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation_list.is_revoked('never-revoked'))
+
+    def test_picks_up_other_processes_after_refresh_interval(self):
+        clock = Clock()
+        revocation_list = RevocationList(refresh_interval=30, clock=clock)
+        revocation_list.refresh()
+        self.revoke_elsewhere('abc')
+        self.assertFalse(revocation_list.is_revoked('abc'))
+        clock.now += 30
+        self.assertTrue(revocation_list.is_revoked('abc'))
+
+    def test_rebuild_drops_expired(self):
+        clock = Clock()
+        revocation_list = RevocationList(rebuild_interval=3600, clock=clock)
+        self.revoke_elsewhere('live')
+        self.revoke_elsewhere('expired', expires_in=-timedelta(seconds=1))
+        revocation_list.refresh()
+        self.assertTrue(revocation_list.might_be_revoked('live'))
+        self.assertFalse(revocation_list.might_be_revoked('expired'))
+
+    def test_grows_past_capacity(self):
+        revocation_list = RevocationList(capacity=2)
+        revocation_list.refresh()
+        for i in range(5):
+            self.revoke_elsewhere(f'jti-{i}')
+        revocation_list.refresh()
+        self.assertTrue(all(revocation_list.might_be_revoked(f'jti-{i}') for i in range(5)))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TokenRevocationTest(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        throttling.buckets.clear()
+        revocations.refresh(full=True)
+        self.user = User.objects.create_user(
+            email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+        )
+
+    def get_organisations(self, token):
+        return self.client.get(reverse('get_organisations'), headers={'Authorization': f'Bearer {token}'})
+
+    def login(self):
+        response = self.client.post(reverse('login_user'), {
+            'email': 'john@example.com', 'password': 'password123',
+        }, content_type='application/json')
+        return response.json()['data']
+
+    def old_token(self):
+        now = int(time.time())
+        return jwt.encode(
+            {'user_id': str(self.user.pk), 'iat': now - 60, 'exp': now + 3600, 'jti': 'old'},
+            settings.SECRET_KEY, algorithm='HS256',
+        )
+
+    def test_logout_revokes_access_and_refresh_token(self):
+        tokens = self.login()
+        other = create_access_token(self.user)
+        response = self.client.post(
+            reverse('logout_user'), {'refreshToken': tokens['refreshToken']},
+            content_type='application/json', headers={'Authorization': f'Bearer {tokens["accessToken"]}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_organisations(tokens['accessToken']).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_organisations(other).status_code, status.HTTP_200_OK)
+        response = self.client.post(
+            reverse('refresh_token'), {'refreshToken': tokens['refreshToken']}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_everywhere(self):
+        tokens = self.login()
+        old = self.old_token()
+        self.client.post(
+            reverse('logout_user'), {'everywhere': True},
+            content_type='application/json', headers={'Authorization': f'Bearer {old}'},
+        )
+        self.assertEqual(self.get_organisations(old).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(IssuedRefreshToken.objects.filter(user=self.user, revoked=False).exists())
+        response = self.client.post(
+            reverse('refresh_token'), {'refreshToken': tokens['refreshToken']}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_moves_cutoff(self):
+        old = self.old_token()
+        self.assertEqual(self.get_organisations(old).status_code, status.HTTP_200_OK)
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertEqual(self.get_organisations(old).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_organisations(create_access_token(self.user)).status_code, status.HTTP_200_OK)
+
+    def test_rehash_on_login_keeps_sessions(self):
+        with self.settings(PASSWORD_HASHERS=[
+            'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+        ]):
+            self.assertTrue(self.user.check_password('password123'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha1$'))
+        self.assertIsNone(self.user.tokens_valid_after)
+
+    async def test_async_views_reject_revoked_tokens(self):
+        token = self.old_token()
+        self.user.tokens_valid_after = timezone.now()
+        await self.user.asave(update_fields=['tokens_valid_after'])
+        response = await AsyncClient().get(reverse('get_organisations'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_compact_revocations(self):
+        RevokedToken.objects.create(jti='expired', expires_at=timezone.now() - timedelta(seconds=1))
+        RevokedToken.objects.create(jti='live', expires_at=timezone.now() + timedelta(hours=1))
+        out = StringIO()
+        call_command('compact_revocations', stdout=out)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertIn('Deleted 1 revoked token(s)', out.getvalue())
@@ -0,0 +1,93 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp.models import Organisation, User
+from userapp.permissions import org_ids_cache
+from userapp.replication import copy_database
+from userapp.routers import PRIMARY, PrimaryReplicaRouter, use_primary
+from userapp.utils import create_access_token, user_cache
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    USERAPP_READ_REPLICAS=['replica'],
+)
+class PrimaryReplicaRouterTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        org_ids_cache.clear()
+        self.john = User.objects.create_user(
+            email='john@example.com', password='pw', userId='u1', firstName='John', lastName='Doe',
+        )
+        self.org = Organisation.objects.create(orgId='o1', name="John's Organisation")
+        self.org.members.add(self.john)
+        copy_database('replica')
+
+    def client_for(self, user, ip='10.0.0.1'):
+        client = APIClient(REMOTE_ADDR=ip)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {create_access_token(user)}')
+        return client
+
+    def test_routing(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Organisation), 'replica')
+        self.assertEqual(router.db_for_write(Organisation), PRIMARY)
+        with use_primary():
+            self.assertEqual(router.db_for_read(Organisation), PRIMARY)
+        with override_settings(USERAPP_READ_REPLICAS=[]):
+            self.assertEqual(router.db_for_read(Organisation), PRIMARY)
+        self.assertFalse(router.allow_migrate('replica', 'userapp'))
+
+    def test_reads_lag_until_replicated(self):
+        Organisation.objects.create(orgId='o2', name='Second')
+        self.assertFalse(Organisation.objects.filter(orgId='o2').exists())
+        call_command('replicate', stdout=StringIO())
+        self.assertTrue(Organisation.objects.filter(orgId='o2').exists())
+
+    def test_writer_reads_its_writes(self):
+        client = self.client_for(self.john)
+        response = client.post(reverse('create_organisation'), {'name': 'Second'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        org = Organisation.objects.using(PRIMARY).get(name='Second')
+        listing = client.get(reverse('get_organisations')).data['data']['organisations']
+        self.assertEqual([o['name'] for o in listing], ["John's Organisation", 'Second'])
+
+        # The replica has not caught up, but this client is pinned to the primary
+        self.assertEqual(client.get(reverse('get_organisation_members', args=[org.id])).status_code, status.HTTP_200_OK)
+        # Pinned by user as well as by address
+        other_address = self.client_for(self.john, ip='10.0.0.2')
+        self.assertEqual(
+            other_address.get(reverse('get_organisation_members', args=[org.id])).status_code, status.HTTP_200_OK,
+        )
+
+    def test_other_clients_read_the_replica(self):
+        jane = User.objects.create_user(
+            email='jane@example.com', password='pw', userId='u2', firstName='Jane', lastName='Smith',
+        )
+        self.org.members.add(jane)
+        copy_database('replica')
+        self.client_for(self.john).post(reverse('create_organisation'), {'name': 'Second'}, format='json')
+        org = Organisation.objects.using(PRIMARY).get(name='Second')
+        org.members.add(jane)
+        org_ids_cache.clear()
+
+        jane_client = self.client_for(jane, ip='10.0.0.3')
+        url = reverse('get_organisation_members', args=[org.id])
+        self.assertEqual(jane_client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        copy_database('replica')
+        self.assertEqual(jane_client.get(url).status_code, status.HTTP_200_OK)
+
+    @override_settings(USERAPP_REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        client = self.client_for(self.john)
+        client.post(reverse('create_organisation'), {'name': 'Second'}, format='json')
+        org = Organisation.objects.using(PRIMARY).get(name='Second')
+        url = reverse('get_organisation_members', args=[org.id])
+        self.assertEqual(client.get(url).status_code, status.HTTP_404_NOT_FOUND)
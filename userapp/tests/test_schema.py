@@ -0,0 +1,65 @@
+import json
+import tempfile
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from drf_yasg.generators import OpenAPISchemaGenerator
+from userapp import schema
+
+
+class SchemaFileTest(TestCase):
+
+    def setUp(self):
+        schema.clear_cache()
+        self.addCleanup(schema.clear_cache)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.schema_dir = tmp.name
+
+    def test_serves_prebuilt_artifact_without_regenerating(self):
+        with override_settings(USERAPP_SCHEMA_DIR=self.schema_dir):
+            schema.build_schema_files()
+            with mock.patch.object(schema, 'render_schema') as render:
+                response = self.client.get(reverse('schema-json'))
+                render.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('/api/organisations/', json.loads(response.content)['paths'])
+
+    def test_etag_revalidation(self):
+        with override_settings(USERAPP_SCHEMA_DIR=self.schema_dir):
+            response = self.client.get(reverse('schema-yaml'))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'])
+            response = self.client.get(reverse('schema-yaml'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_renders_once_per_process_without_artifact(self):
+        with override_settings(USERAPP_SCHEMA_DIR=self.schema_dir):
+            with mock.patch.object(schema, 'render_schema', return_value=b'{}') as render:
+                self.client.get(reverse('schema-json'))
+                self.client.get(reverse('schema-json'))
+        self.assertEqual(render.call_count, 1)
+
+    def test_ui_pages_point_at_static_schema(self):
+        with mock.patch.object(OpenAPISchemaGenerator, 'get_schema') as get_schema:
+            for name in ('schema-swagger-ui', 'schema-redoc'):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                content = response.content.decode()
+                self.assertIn(reverse('schema-json'), content)
+                self.assertIn(f'<title>{schema.api_info.title}', content)
+        get_schema.assert_not_called()
+
+
+class HealthTest(TestCase):
+
+    def test_health_needs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('health'))
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    async def test_health_over_asgi(self):
+        response = await self.async_client.get(reverse('health'))
+        self.assertEqual(response.json(), {'status': 'ok'})
@@ -0,0 +1,158 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from userapp import search
+from userapp.models import Membership, Organisation, User
+from userapp.permissions import org_ids_cache
+from userapp.utils import create_access_token
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SearchIndexTest(TestCase):
+
+    def setUp(self):
+        self.john = User.objects.create_user(
+            email='john.doe@example.com', password='pw', firstName='John', lastName='Doe',
+        )
+        self.acme = Organisation.objects.create(name='Acme Rockets', description='Rocket skates')
+        self.acme.members.add(self.john)
+
+    def users(self, text, org_ids=None):
+        return set(search.users(org_ids or {self.acme.id}, search.parse_query(text)))
+
+    def organisations(self, text, org_ids=None):
+        return set(search.organisations(org_ids or {self.acme.id}, search.parse_query(text)))
+
+    def test_prefix_words_across_columns(self):
+        for text in ('jo', 'JOHN doe', 'john.doe@ex', 'doe example', 'Jöhn'):
+            self.assertEqual(self.users(text), {self.john}, text)
+        self.assertEqual(self.users('john smith'), set())
+        self.assertEqual(self.organisations('rocket sk'), {self.acme})
+        # Membership tokens are not searchable text
+        self.assertEqual(self.organisations(f'o{self.acme.id}'), set())
+
+    def test_query_syntax_is_searched_as_text(self):
+        # No syntax errors; operators are just more words to match
+        expected = {'"john': 1, 'NEAR(john': 0, 'john OR doe': 0, 'orgs : o1': 0, 'jo*n': 1, '(doe)': 1}
+        for text, count in expected.items():
+            self.assertEqual(search.users({self.acme.id}, search.parse_query(text)).count(), count, text)
+
+    def test_edits_deletes_and_bulk_writes_are_indexed(self):
+        User.objects.filter(pk=self.john.pk).update(firstName='Jonathan')
+        self.assertEqual(self.users('jonathan'), {self.john})
+        self.assertEqual(self.users('john doe'), {self.john})  # email still matches
+        self.assertEqual(self.users('jonathan jo'), {self.john})
+        self.acme.name = 'Wile Industries'
+        self.acme.save()
+        self.assertEqual(self.organisations('acme'), set())
+        self.assertEqual(self.organisations('wile'), {self.acme})
+
+        [ada] = User.objects.bulk_create([User(email='ada@example.com', firstName='Ada', lastName='Lovelace')])
+        Membership.objects.bulk_create([Membership(user=ada, organisation=self.acme)])
+        self.assertEqual(self.users('love'), {ada})
+        ada.delete()
+        self.assertEqual(self.users('love'), set())
+
+    def test_results_are_limited_to_the_callers_organisations(self):
+        other = Organisation.objects.create(name='Acme Anvils')
+        jane = User.objects.create_user(email='jane@example.com', password='pw', firstName='Jane', lastName='Doe')
+        other.members.add(jane)
+        self.assertEqual(self.users('doe'), {self.john})
+        self.assertEqual(self.users('doe', {self.acme.id, other.id}), {self.john, jane})
+        self.assertEqual(self.organisations('acme'), {self.acme})
+        self.assertEqual(search.users(set(), ['doe']).count(), 0)
+
+        # Memberships move the user in and out of scope
+        self.acme.members.add(jane)
+        self.assertEqual(self.users('jane'), {jane})
+        self.acme.members.remove(jane)
+        self.assertEqual(self.users('jane'), set())
+
+    def test_parse_query(self):
+        self.assertEqual(search.parse_query('a jo  doe!'), ['jo', 'doe'])
+        self.assertEqual(search.parse_query(None), [])
+        self.assertEqual(len(search.parse_query(' '.join(['word'] * 20))), search.MAX_WORDS)
+
+    def test_rebuild_and_trigger_reinstall(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM userapp_user_fts')
+            cursor.execute('DROP TRIGGER userapp_user_fts_au')
+        self.assertEqual(self.users('john'), set())
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(self.users('john'), {self.john})
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER userapp_user_fts_au')
+        # As after a migration that rebuilt the user table
+        search.reinstall_triggers(sender=None, using='default')
+        User.objects.filter(pk=self.john.pk).update(lastName='Roadrunner')
+        self.assertEqual(self.users('road'), {self.john})
+
+    def test_lookup_stays_in_the_index(self):
+        sql, params = search.users({self.acme.id}, ['jo']).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE', plan)
+        self.assertNotIn('userapp_membership', plan)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SearchEndpointTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        org_ids_cache.clear()
+        self.john = User.objects.create_user(
+            email='john@example.com', password='pw', firstName='John', lastName='Doe',
+        )
+        self.jane = User.objects.create_user(
+            email='jane@example.com', password='pw', firstName='Jane', lastName='Doe',
+        )
+        self.stranger = User.objects.create_user(
+            email='jim@example.com', password='pw', firstName='Jim', lastName='Doe',
+        )
+        for name in ('Acme Rockets', 'Acme Anvils', 'Acme Magnets'):
+            Organisation.objects.create(name=name).members.add(self.john, self.jane)
+        Organisation.objects.create(name='Acme Outsiders').members.add(self.stranger)
+        self.auth = {'Authorization': f'Bearer {create_access_token(self.john)}'}
+
+    def test_search_organisations(self):
+        client = APIClient()
+        response = client.get(reverse('search_organisations'), {'q': 'acme', 'pageSize': 2}, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual([o['name'] for o in data['organisations']], ['Acme Rockets', 'Acme Anvils'])
+        self.assertIn('q=acme', data['next'])
+        data = client.get(data['next'], headers=self.auth).data['data']
+        self.assertEqual([o['name'] for o in data['organisations']], ['Acme Magnets'])
+
+    def test_search_users(self):
+        response = APIClient().get(reverse('search_users'), {'q': 'doe'}, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [u['email'] for u in response.data['data']['users']], ['john@example.com', 'jane@example.com'],
+        )
+
+    def test_bad_requests(self):
+        client = APIClient()
+        self.assertEqual(
+            client.get(reverse('search_users'), {'q': 'j'}, headers=self.auth).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(client.get(reverse('search_users')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async(self):
+        client = AsyncClient()
+        response = await client.get(reverse('search_users'), {'q': 'ja'}, headers=self.auth)
+        self.assertEqual(response.asgi_request.resolver_match.func.__module__, 'userapp.async_views')
+        self.assertEqual([u['email'] for u in response.json()['data']['users']], ['jane@example.com'])
+        response = await client.get(reverse('search_organisations'), {'q': 'outsiders'}, headers=self.auth)
+        self.assertEqual(response.json()['data']['organisations'], [])
+        response = await client.get(reverse('search_organisations'), {'q': ''}, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
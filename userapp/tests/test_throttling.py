@@ -0,0 +1,109 @@
+from unittest import mock
+from django.core.cache import caches
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from userapp import throttling
+from userapp.models import User
+from userapp.throttling import TokenBucketStore
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketStoreTest(TestCase):
+
+    def test_capacity_then_refill(self):
+        clock = Clock()
+        store = TokenBucketStore(clock=clock)
+        self.assertEqual([store.consume('k', 3, 60) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(store.consume('k', 3, 60), 20)
+        clock.now += 20
+        self.assertEqual(store.consume('k', 3, 60), 0)
+        self.assertEqual(store.consume('other', 3, 60), 0)
+
+    def test_keys_per_shard_are_bounded(self):
+        store = TokenBucketStore(shards=1, max_keys=2)
+        for key in ('a', 'b', 'c'):
+            store.consume(key, 1, 60)
+        # 'a' was evicted and starts again with a full bucket
+        self.assertEqual(store.consume('a', 1, 60), 0)
+        self.assertGreater(store.consume('c', 1, 60), 0)
+
+    def test_cache_backing_is_shared(self):
+        cache = caches['default']
+        cache.clear()
+        first, second = TokenBucketStore(cache=cache), TokenBucketStore(cache=cache)
+        self.assertEqual(first.consume('k', 1, 60), 0)
+        self.assertGreater(second.consume('k', 1, 60), 0)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    USERAPP_THROTTLE_RATES={'login_ip': '5/min', 'login_email': '2/min', 'register_ip': '1/min'},
+)
+class LoginThrottleTest(TestCase):
+
+    def setUp(self):
+        throttling.buckets.clear()
+        throttling.stats.reset()
+        User.objects.create_user(
+            email='john@example.com', password='password123', userId='u1', firstName='John', lastName='Doe',
+        )
+
+    def login(self, email, ip='10.0.0.1'):
+        return self.client.post(
+            reverse('login_user'), {'email': email, 'password': 'wrong'},
+            content_type='application/json', REMOTE_ADDR=ip,
+        )
+
+    def test_rejects_before_authenticate(self):
+        for _ in range(2):
+            self.assertEqual(self.login('john@example.com').status_code, status.HTTP_401_UNAUTHORIZED)
+        with mock.patch('userapp.views.authenticate') as authenticate:
+            response = self.login('john@example.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        authenticate.assert_not_called()
+        self.assertEqual(throttling.stats.as_dict()['hashesAvoided'], 1)
+
+    def test_email_is_normalised_across_ips(self):
+        self.login('john@example.com', ip='10.0.0.1')
+        self.login(' John@EXAMPLE.com', ip='10.0.0.2')
+        self.assertEqual(self.login('JOHN@example.com', ip='10.0.0.3').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('jane@example.com', ip='10.0.0.3').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ip_limit(self):
+        for i in range(5):
+            self.login(f'user{i}@example.com')
+        self.assertEqual(self.login('user5@example.com').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('user5@example.com', ip='10.0.0.9').status_code, status.HTTP_401_UNAUTHORIZED)
+        stats = throttling.stats.as_dict()
+        self.assertEqual(stats['scopes']['login_ip'], {'allowed': 6, 'rejected': 1})
+
+    def test_register_throttled(self):
+        url = reverse('register_user')
+        data = {'firstName': 'Bob', 'lastName': 'Brown', 'password': 'secret'}
+        self.client.post(url, {**data, 'email': 'bob@example.com'}, content_type='application/json')
+        response = self.client.post(url, {**data, 'email': 'rob@example.com'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(User.objects.filter(email='rob@example.com').exists())
+
+    async def test_async_login_throttled(self):
+        client = AsyncClient()
+        url = reverse('login_user')
+        for _ in range(2):
+            await client.post(url, {'email': 'john@example.com', 'password': 'x'}, content_type='application/json')
+        with mock.patch('userapp.async_views.hashing.amake_password') as amake_password:
+            response = await client.post(
+                url, {'email': 'john@example.com', 'password': 'x'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        amake_password.assert_not_called()
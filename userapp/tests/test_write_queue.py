@@ -0,0 +1,101 @@
+import threading
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from userapp.models import Organisation, User
+from userapp.write_queue import WriteQueue, write_queue
+
+
+class WriteQueueTest(TransactionTestCase):
+
+    def setUp(self):
+        self.queue = WriteQueue()
+
+    def test_jobs_queued_during_a_commit_share_the_next_transaction(self):
+        started, release = threading.Event(), threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+
+        def outer_transaction():
+            return id(connection.atomic_blocks[0]), threading.get_ident()
+
+        first = self.queue.submit(blocker)
+        started.wait(5)
+        futures = [self.queue.submit(outer_transaction) for _ in range(3)]
+        release.set()
+        first.result(5)
+        results = [future.result(5) for future in futures]
+        self.assertEqual(len(set(results)), 1)
+        self.assertNotEqual(results[0][1], threading.get_ident())
+
+    def test_failed_job_rolls_back_only_itself(self):
+        def create(name, fail=False):
+            Organisation.objects.create(orgId=name, name=name)
+            if fail:
+                raise ValueError(name)
+            return name
+
+        started, release = threading.Event(), threading.Event()
+        self.queue.submit(lambda: (started.set(), release.wait(5)))
+        started.wait(5)
+        futures = [self.queue.submit(create, 'a'), self.queue.submit(create, 'b', True), self.queue.submit(create, 'c')]
+        release.set()
+        self.assertEqual(futures[0].result(5), 'a')
+        with self.assertRaisesMessage(ValueError, 'b'):
+            futures[1].result(5)
+        self.assertEqual(futures[2].result(5), 'c')
+        self.assertEqual(sorted(Organisation.objects.values_list('orgId', flat=True)), ['a', 'c'])
+
+    def test_stop_finishes_queued_jobs_and_ends_the_writer(self):
+        started, release = threading.Event(), threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+
+        self.queue.submit(blocker)
+        started.wait(5)
+        queued = self.queue.submit(threading.current_thread)
+        release.set()
+        self.queue.stop()
+        self.assertTrue(queued.done())
+        self.assertFalse(queued.result().is_alive())
+        # The next job starts a new writer thread
+        self.assertIsNot(self.queue.run(threading.current_thread), queued.result())
+
+    def test_runs_inline_inside_a_transaction(self):
+        with transaction.atomic():
+            self.assertEqual(self.queue.run(threading.get_ident), threading.get_ident())
+
+    def test_disabled_queue_runs_inline(self):
+        self.assertEqual(WriteQueue(enabled=False).run(threading.get_ident), threading.get_ident())
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_registration_through_the_writer(self):
+        # The global writer thread would otherwise stay connected to this test's database
+        self.addCleanup(write_queue.stop)
+        for i in range(3):
+            response = self.client.post(reverse('register_user'), {
+                'firstName': f'User{i}', 'lastName': 'Test', 'email': f'user{i}@example.com', 'password': 'secret',
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.count(), 3)
+        # Every account gets its own public ids and default organisation
+        self.assertEqual(len(set(User.objects.values_list('userId', flat=True))), 3)
+        self.assertEqual(Organisation.objects.filter(members__email='user2@example.com').get().name, "User2's Organisation")
+
+
+class SQLiteBackendTest(TestCase):
+
+    def test_pragmas(self):
+        if connection.vendor != 'sqlite' or not connection.settings_dict['OPTIONS']:
+            self.skipTest('SQLite tuning not in use')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
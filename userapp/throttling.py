@@ -0,0 +1,227 @@
+"""
+Token-bucket throttling for the password-hashing endpoints.
+
+Every ``login_user`` and ``register_user`` request costs a full password hash,
+so these throttles run before the view body (DRF checks throttles in
+``initial()``) and turn an over-limit request into a 429 with ``Retry-After``
+without touching the hashing pool.
+
+Buckets are kept per scope and per key (client IP or normalised email) in a
+sharded in-process store: each shard has its own lock, so concurrent requests
+for different keys rarely contend. Setting ``USERAPP_THROTTLE_CACHE`` to a
+cache alias keeps bucket state in that cache instead, so several worker
+processes share one budget. The read-modify-write on the shared cache is not
+atomic across processes; racing workers can each spend the same token, which
+lets a burst go slightly over the limit but never blocks a legitimate client.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+# Overridden per scope by USERAPP_THROTTLE_RATES
+DEFAULT_RATES = {
+    'login_ip': '30/min',
+    'login_email': '10/min',
+    'register_ip': '10/min',
+    'register_email': '5/min',
+}
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """ ``'10/min'`` -> ``(10, 60)``: bucket capacity and the seconds it takes to refill """
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    return int(count), DURATIONS[period[0]]
+
+
+class ThrottleStats:
+    """ In-process allowed/rejected counters per scope, plus password hashes skipped """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._hashes_avoided = 0
+        self._lock = threading.Lock()
+
+    def record(self, scope, allowed):
+        with self._lock:
+            self._counts[(scope, 'allowed' if allowed else 'rejected')] += 1
+
+    def record_hash_avoided(self):
+        with self._lock:
+            self._hashes_avoided += 1
+
+    def as_dict(self):
+        with self._lock:
+            counts = dict(self._counts)
+            hashes_avoided = self._hashes_avoided
+        scopes = {}
+        for (scope, outcome), value in counts.items():
+            scopes.setdefault(scope, {'allowed': 0, 'rejected': 0})[outcome] = value
+        return {'scopes': scopes, 'hashesAvoided': hashes_avoided}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._hashes_avoided = 0
+
+
+class _Shard:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+
+class TokenBucketStore:
+    """
+    Token buckets keyed by string, sharded across ``shards`` locks.
+
+    Each shard keeps at most ``max_keys`` buckets and drops the least
+    recently used one beyond that. When ``cache`` is given, bucket state
+    lives there and the shards only serialise access within this process.
+    """
+
+    def __init__(self, shards=16, max_keys=10000, cache=None, clock=time.time):
+        self._shards = [_Shard() for _ in range(shards)]
+        self.max_keys = max_keys
+        self.cache = cache
+        self.clock = clock
+
+    def _load(self, shard, key):
+        if self.cache is not None:
+            return self.cache.get(f'userapp:throttle:{key}')
+        state = shard.buckets.get(key)
+        if state is not None:
+            shard.buckets.move_to_end(key)
+        return state
+
+    def _store(self, shard, key, state, timeout):
+        if self.cache is not None:
+            self.cache.set(f'userapp:throttle:{key}', state, timeout)
+            return
+        shard.buckets[key] = state
+        shard.buckets.move_to_end(key)
+        while len(shard.buckets) > self.max_keys:
+            shard.buckets.popitem(last=False)
+
+    def consume(self, key, capacity, duration):
+        """
+        Take one token from ``key``'s bucket, which holds ``capacity`` tokens
+        and refills completely over ``duration`` seconds. Returns 0 if the
+        token was granted, otherwise the seconds until one is available.
+        """
+        refill_rate = capacity / duration
+        shard = self._shards[hash(key) % len(self._shards)]
+        with shard.lock:
+            now = self.clock()
+            state = self._load(shard, key)
+            if state is None:
+                tokens = capacity
+            else:
+                tokens, updated = state
+                tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / refill_rate
+            # A bucket that would be full again carries no information, so it can expire then
+            self._store(shard, key, (tokens, now), duration)
+        return wait
+
+    def clear(self):
+        """ Drop the in-process buckets (state in a shared cache expires on its own) """
+        for shard in self._shards:
+            with shard.lock:
+                shard.buckets.clear()
+
+
+def _build_store():
+    alias = getattr(settings, 'USERAPP_THROTTLE_CACHE', None)
+    return TokenBucketStore(
+        shards=getattr(settings, 'USERAPP_THROTTLE_SHARDS', 16),
+        max_keys=getattr(settings, 'USERAPP_THROTTLE_MAX_KEYS', 10000),
+        cache=caches[alias] if alias else None,
+    )
+
+
+buckets = _build_store()
+stats = ThrottleStats()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class: one bucket per ``(scope, get_key(request))``, with the rate
+    for ``scope`` taken from ``USERAPP_THROTTLE_RATES``, else ``DEFAULT_RATES``
+    (``None`` disables it).
+    """
+    scope = None
+
+    def get_rate(self):
+        rates = {**DEFAULT_RATES, **getattr(settings, 'USERAPP_THROTTLE_RATES', {})}
+        return parse_rate(rates.get(self.scope))
+
+    def get_key(self, request):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        self._wait = 0
+        rate = self.get_rate()
+        key = self.get_key(request)
+        if rate is None or key is None:
+            return True
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        self._wait = buckets.consume(f'{self.scope}:{digest}', *rate)
+        stats.record(self.scope, allowed=not self._wait)
+        if self._wait and not getattr(request, '_userapp_throttled', False):
+            # Several throttles may reject the same request; it saves one hash
+            request._userapp_throttled = True
+            stats.record_hash_avoided()
+        return not self._wait
+
+    def wait(self):
+        return self._wait or None
+
+
+class IPThrottle(TokenBucketThrottle):
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class EmailThrottle(TokenBucketThrottle):
+
+    def get_key(self, request):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        # Case variants of one address share a bucket
+        return email.strip().lower()
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginEmailThrottle(EmailThrottle):
+    scope = 'login_email'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class RegisterEmailThrottle(EmailThrottle):
+    scope = 'register_email'
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginEmailThrottle]
+REGISTER_THROTTLES = [RegisterIPThrottle, RegisterEmailThrottle]
@@ -0,0 +1,131 @@
+"""
+Refresh tokens with rotation and reuse detection.
+
+Every refresh token carries a ``family`` claim shared by all tokens descended
+from one login or registration, and is recorded in ``IssuedRefreshToken``.
+Exchanging a token at ``auth/refresh/`` marks it rotated and issues its
+successor, so each refresh token works exactly once. If a rotated token is
+presented again, either the client or an attacker holds a stolen copy; we
+cannot tell which, so the whole family is revoked and the user has to log in
+again. None of this touches the password hasher.
+"""
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .metrics import token_seconds
+from .models import IssuedRefreshToken
+from .revocation import issued_before_cutoff
+from .utils import get_cached_user
+
+
+class InvalidRefreshToken(Exception):
+    """ The refresh token is malformed, expired, unknown or revoked """
+
+
+class RefreshTokenReused(InvalidRefreshToken):
+    """ An already rotated refresh token was presented again; its family is now revoked """
+
+
+def issue_refresh_token(user, family=None):
+    """ Mint and record a refresh token for ``user``; ``.access_token`` gives its access token """
+    with token_seconds.time('issue'):
+        refresh = RefreshToken.for_user(user)
+    refresh['family'] = family or uuid.uuid4().hex
+    IssuedRefreshToken.objects.create(
+        jti=refresh[api_settings.JTI_CLAIM],
+        family=refresh['family'],
+        user=user,
+        expires_at=datetime.fromtimestamp(refresh['exp'], tz=dt_timezone.utc),
+    )
+    return refresh
+
+
+def revoke_family(family):
+    IssuedRefreshToken.objects.filter(family=family, revoked=False).update(revoked=True)
+
+
+def revoke_presented_token(raw_token, user):
+    """ Revoke the family of ``raw_token`` if it is a valid refresh token belonging to ``user`` """
+    if not raw_token:
+        return
+    try:
+        token = RefreshToken(raw_token)
+    except TokenError:
+        return
+    if str(token.get(api_settings.USER_ID_CLAIM)) == str(user.pk) and token.get('family'):
+        revoke_family(token['family'])
+
+
+def rotate_refresh_token(raw_token):
+    """ Exchange ``raw_token`` for its successor, or raise InvalidRefreshToken """
+    if not raw_token:
+        # RefreshToken(None) would mint a brand new token rather than fail
+        raise InvalidRefreshToken('Refresh token is required')
+    try:
+        token = RefreshToken(raw_token)
+    except TokenError:
+        raise InvalidRefreshToken('Invalid or expired refresh token')
+    jti = token.get(api_settings.JTI_CLAIM)
+    family = token.get('family')
+    if not jti or not family:
+        raise InvalidRefreshToken('Invalid or expired refresh token')
+
+    user = get_cached_user(token[api_settings.USER_ID_CLAIM])
+    if user is None or not user.is_active:
+        raise InvalidRefreshToken('User not found or inactive')
+    if issued_before_cutoff(token.payload, user):
+        raise InvalidRefreshToken('Refresh token has been revoked')
+
+    with transaction.atomic():
+        # The conditional update is the claim: of two concurrent exchanges only one can win
+        claimed = IssuedRefreshToken.objects.filter(
+            jti=jti, rotated_at__isnull=True, revoked=False,
+        ).update(rotated_at=timezone.now())
+        if claimed:
+            return user, issue_refresh_token(user, family=family)
+
+    if IssuedRefreshToken.objects.filter(jti=jti).exists():
+        revoke_family(family)
+        raise RefreshTokenReused('Refresh token has already been used')
+    raise InvalidRefreshToken('Invalid or expired refresh token')
+
+
+def encode_pair(refresh):
+    """ Sign ``refresh`` and its access token for the response body """
+    with token_seconds.time('encode'):
+        return {'accessToken': str(refresh.access_token), 'refreshToken': str(refresh)}
+
+
+def set_refresh_cookie(response, refresh):
+    """ Also deliver ``refresh`` (a token or its encoded string) as an httpOnly cookie scoped to the refresh endpoint """
+    response.set_cookie(
+        getattr(settings, 'USERAPP_REFRESH_COOKIE', 'refresh_token'),
+        str(refresh),
+        max_age=int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+        path=reverse('refresh_token'),
+        secure=getattr(settings, 'USERAPP_REFRESH_COOKIE_SECURE', True),
+        httponly=True,
+        samesite='Strict',
+    )
+    return response
+
+
+def delete_refresh_cookie(response):
+    response.delete_cookie(
+        getattr(settings, 'USERAPP_REFRESH_COOKIE', 'refresh_token'), path=reverse('refresh_token'), samesite='Strict',
+    )
+    return response
+
+
+def get_presented_token(request, data):
+    """ The refresh token from the ``refreshToken`` body field, falling back to the cookie """
+    token = data.get('refreshToken') if hasattr(data, 'get') else None
+    if not token:
+        token = request.COOKIES.get(getattr(settings, 'USERAPP_REFRESH_COOKIE', 'refresh_token'))
+    return token if isinstance(token, str) else None
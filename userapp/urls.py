@@ -1,34 +1,38 @@
 from django.urls import path
+from drf_yasg.renderers import ReDocRenderer
 from . import views
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="User API Title",
-        default_version='v1',
-        description="Your API description",
-        terms_of_service="https://www.example.com/policies/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 urlpatterns = [
     # Authentication endpoints
     path('auth/register/', views.register_user, name='register_user'),
     path('auth/login/', views.login_user, name='login_user'),
-    path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('api/redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('auth/refresh/', views.refresh_token, name='refresh_token'),
+    path('auth/logout/', views.logout_user, name='logout_user'),
+    # The UIs load the pre-rendered schema (SWAGGER_SETTINGS/REDOC_SETTINGS SPEC_URL),
+    # so rendering the pages themselves never introspects the API
+    path('', views.SchemaUIView.as_view(), name='schema-swagger-ui'),
+    path('api/redoc/', views.SchemaUIView.as_view(renderer_class=ReDocRenderer), name='schema-redoc'),
+    path('api/schema.json', views.get_schema_file, {'fmt': 'json'}, name='schema-json'),
+    path('api/schema.yaml', views.get_schema_file, {'fmt': 'yaml'}, name='schema-yaml'),
+    path('health/', views.health, name='health'),
+    path('metrics/', views.get_metrics, name='metrics'),
 
     # User endpoints
-    path('api/users/<int:pk>/', views.get_user_details, name='get_user_details'),
+    path('api/users/import/', views.import_users, name='import_users'),
+    path('api/users/search/', views.search_users, name='search_users'),
+    path('api/users/<int:id>/', views.get_user_details, name='get_user_details'),
     
+    # Operational endpoints
+    path('api/cache/stats/', views.get_cache_stats, name='get_cache_stats'),
+    path('api/throttle/stats/', views.get_throttle_stats, name='get_throttle_stats'),
+    path('api/queries/stats/', views.get_query_stats, name='get_query_stats'),
+
     # Organisation endpoints
     path('api/organisations/', views.get_organisations, name='get_organisations'),
+    path('api/organisations/create/', views.create_organisation, name='create_organisation'),
+    path('api/organisations/search/', views.search_organisations, name='search_organisations'),
+    path('api/organisations/export/', views.export_memberships, name='export_memberships'),
     path('api/organisations/<str:orgId>/', views.get_organisation, name='get_organisation'),
+    path('api/organisations/<str:orgId>/members/', views.get_organisation_members, name='get_organisation_members'),
     path('api/organisations/<str:orgId>/users/', views.add_user_to_organisation, name='add_user_to_organisation'),
-    path('api/organisations/create/', views.create_organisation, name='create_organisation'),
 ]
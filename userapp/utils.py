@@ -1,24 +1,109 @@
 # utils.py
 
 import jwt
+import uuid
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.core.cache import caches
+from .cache import LRUCache, bump_versions, get_versions
+from .ids import new_id
+from .routers import use_primary
 from .models import User  # Replace with your actual user model if not using Django's default
 
+# Verified user records keyed by primary key, so authenticating a hot client needs no query.
+# Each entry is stored under the user's version in the shared USERAPP_AUTH_VERSION_CACHE
+# and only served while that version is current. The User post_save/post_delete signals
+# replace the version (see signals.py), which retires the entry in every worker sharing
+# that cache. The version is read before the fill's query, so a fill that races a save is
+# stored under a version that is already gone.
+user_cache = LRUCache(
+    maxsize=getattr(settings, 'USERAPP_AUTH_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'USERAPP_AUTH_CACHE_TTL', 60),
+)
+
+def generate_id():
+    """ Generate a unique public identifier for userId / orgId (time-ordered, see ids.py) """
+    return new_id()
+
 def create_access_token(user):
     """ Generate access token for the given user """
     token_payload = {
         'user_id': str(user.id),  # Assuming user.id is the unique identifier
         'exp': datetime.utcnow() + timedelta(days=1),  # Token expiration time (1 day in this example)
         'iat': datetime.utcnow(),  # Token issue time
+        'jti': uuid.uuid4().hex,  # Lets this one token be revoked (see revocation.py)
     }
     return jwt.encode(token_payload, settings.SECRET_KEY, algorithm='HS256')
 
-def decode_access_token(token):
-    """ Decode and verify access token """
+def decode_access_token_claims(token):
+    """ Verify an access token and return its claims, or None if it is invalid """
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        user_id = payload['user_id']
-        return User.objects.get(id=user_id)  # Replace with your actual user model
-    except (jwt.ExpiredSignatureError, jwt.DecodeError, User.DoesNotExist):
+    except jwt.InvalidTokenError:
+        return None
+    # Refresh tokens minted by simplejwt share the signing key; never accept them as access tokens
+    if payload.get('token_type', 'access') != 'access' or 'user_id' not in payload:
+        return None
+    return payload
+
+def _version_cache():
+    return caches[getattr(settings, 'USERAPP_AUTH_VERSION_CACHE', 'default')]
+
+def user_version_key(user_id):
+    return f'userapp:user-version:{user_id}'
+
+def _user_version(user_id):
+    key = user_version_key(user_id)
+    return get_versions(_version_cache(), [key])[key]
+
+def _cache_user(user, version):
+    values = tuple(getattr(user, f.attname) for f in User._meta.concrete_fields)
+    user_cache.set(str(user.pk), (version, user._state.db, values))
+
+def _user_from_cache(user_id, version):
+    cached = user_cache.get(str(user_id))
+    if cached is None or cached[0] != version:
+        return None
+    # Build a fresh instance per call so request-level state is never shared between requests
+    _, db, values = cached
+    return User.from_db(db, [f.attname for f in User._meta.concrete_fields], values)
+
+def get_cached_user(user_id):
+    """ Return the user with the given primary key, served from the user cache when possible """
+    version = _user_version(user_id)
+    user = _user_from_cache(user_id, version)
+    if user is not None:
+        return user
+    try:
+        # Cache fills read the primary so a lagging replica can't undo an invalidation
+        with use_primary():
+            user = User.objects.get(id=user_id)
+    except (User.DoesNotExist, ValueError):
+        return None
+    _cache_user(user, version)
+    return user
+
+async def aget_cached_user(user_id):
+    """ Async version of get_cached_user() """
+    version = _user_version(user_id)
+    user = _user_from_cache(user_id, version)
+    if user is not None:
+        return user
+    try:
+        with use_primary():
+            user = await User.objects.aget(id=user_id)
+    except (User.DoesNotExist, ValueError):
+        return None
+    _cache_user(user, version)
+    return user
+
+def invalidate_cached_user(user_id):
+    user_cache.delete(str(user_id))
+    bump_versions(_version_cache(), [user_version_key(user_id)])
+
+def decode_access_token(token):
+    """ Decode and verify access token """
+    payload = decode_access_token_claims(token)
+    if payload is None:
         return None
+    return get_cached_user(payload['user_id'])
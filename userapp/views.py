@@ -1,20 +1,79 @@
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import condition, require_GET
+from django.views.generic import TemplateView
 from .models import User
+from .fast_serializers import organisation_serializer, user_serializer
 from .serializers import UserSerializer, OrganisationSerializer
 from .models import Organisation
+from .permissions import get_org_ids, shares_organisation
+from . import hashing
+from .hashing import HashingQueueFull
+from . import bulk_import
+from . import export
+from .membership import add_members, parse_user_ids
+from .pagination import KeysetPagination
+from . import response_cache
+from . import schema
+from . import search
+from . import throttling
+from . import tokens
+from . import revocation
+from . import instrumentation
+from . import metrics
+from . import registration
+from .write_queue import write_queue
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from drf_yasg.renderers import SwaggerUIRenderer
+
+def hashing_unavailable_response():
+    # The password hashing pool is saturated; ask the client to back off briefly
+    return Response({
+        'status': 'Service Unavailable',
+        'message': 'Server is busy, please retry shortly',
+        'statusCode': status.HTTP_503_SERVICE_UNAVAILABLE
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
+def registration_response(body, replayed=False):
+    headers = {'Idempotent-Replayed': 'true'} if replayed else None
+    response = Response(body, status=status.HTTP_201_CREATED, headers=headers)
+    return tokens.set_refresh_cookie(response, body['data']['refreshToken'])
+
+def replayed_registration(idempotency):
+    """ The stored response of the registration made with this idempotency key, or None """
+    try:
+        body = registration.replay(idempotency)
+    except registration.IdempotencyKeyReused as e:
+        return Response({
+            'status': 'Unprocessable Entity',
+            'message': str(e),
+            'statusCode': status.HTTP_422_UNPROCESSABLE_ENTITY
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return registration_response(body, replayed=True) if body is not None else None
 
 @swagger_auto_schema(
     method='post',
-    operation_description="Register a new user and create a default organisation for them.",
+    operation_description=(
+        "Register a new user and create a default organisation for them. Retrying with the same "
+        "Idempotency-Key and body returns the original response, with a new token pair, instead of "
+        "registering again."
+    ),
     request_body=UserSerializer,
+    manual_parameters=[
+        openapi.Parameter(
+            'Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+            description='Client-chosen key (1-255 characters) that makes retries of this registration safe',
+        ),
+    ],
     responses={
         201: openapi.Response(
             description="Registration successful",
@@ -24,6 +83,7 @@ from drf_yasg import openapi
                     'message': 'Registration successful',
                     'data': {
                         'accessToken': 'your_jwt_access_token',
+                        'refreshToken': 'your_jwt_refresh_token',
                         'user': {
                             'username': 'johndoe',
                             'email': 'johndoe@example.com',
@@ -49,29 +109,61 @@ from drf_yasg import openapi
                     }
                 }
             }
+        ),
+        422: openapi.Response(
+            description="Idempotency-Key already used for a different request",
+            examples={
+                "application/json": {
+                    'status': 'Unprocessable Entity',
+                    'message': 'Idempotency-Key was already used for a different request',
+                    'statusCode': 422
+                }
+            }
         )
     }
 )
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(throttling.REGISTER_THROTTLES)
 def register_user(request):
+    try:
+        idempotency = registration.idempotency(request.headers.get(registration.IDEMPOTENCY_HEADER), request.data)
+    except ValueError as e:
+        return Response({
+            'status': 'Bad request',
+            'message': str(e),
+            'statusCode': status.HTTP_400_BAD_REQUEST
+        }, status=status.HTTP_400_BAD_REQUEST)
+    # A retry of a registration that already succeeded: no validation, hashing or inserts
+    replayed = replayed_registration(idempotency)
+    if replayed is not None:
+        return replayed
+
     serializer = UserSerializer(data=request.data)
     if serializer.is_valid():
-        # Hash the password before saving
-        user = serializer.save()
-        # Create default organisation
-        org_name = f"{user.first_name}'s Organisation"
-        organisation = Organisation.objects.create(name=org_name)
-        # Return response with access token and user data
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'status': 'success',
-            'message': 'Registration successful',
-            'data': {
-                'accessToken': str(refresh.access_token),
-                'user': serializer.data
-            }
-        }, status=status.HTTP_201_CREATED)
+        # Hash the password before queueing the inserts, so the writer never waits on the hasher
+        try:
+            encoded = hashing.make_password(serializer.validated_data['password'])
+        except HashingQueueFull:
+            return hashing_unavailable_response()
+        # The user, their default organisation, the refresh token and the idempotency key commit together
+        try:
+            body = write_queue.run(registration.register, serializer.validated_data, encoded, idempotency)
+        except IntegrityError:
+            # A concurrent request registered the same email or key first
+            replayed = replayed_registration(idempotency)
+            if replayed is not None:
+                return replayed
+            serializer = UserSerializer(data=request.data)
+            if serializer.is_valid():
+                raise
+        else:
+            return registration_response(body)
+    else:
+        # The email may belong to an earlier attempt with this key that committed after the check above
+        replayed = replayed_registration(idempotency)
+        if replayed is not None:
+            return replayed
     return Response({
         'status': 'Bad request',
         'message': 'Registration unsuccessful',
@@ -98,6 +190,7 @@ def register_user(request):
                     'message': 'Login successful',
                     'data': {
                         'accessToken': 'your_jwt_access_token',
+                        'refreshToken': 'your_jwt_refresh_token',
                         'user': {
                             'username': 'johndoe',
                             'email': 'johndoe@example.com',
@@ -124,22 +217,26 @@ def register_user(request):
 )
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(throttling.LOGIN_THROTTLES)
 def login_user(request):
     email = request.data.get('email')
     password = request.data.get('password')
-    user = authenticate(email=email, password=password)
+    try:
+        user = authenticate(email=email, password=password)
+    except HashingQueueFull:
+        return hashing_unavailable_response()
 
     if user:
-        serializer = UserSerializer(user)
-        refresh = RefreshToken.for_user(user)
-        return Response({
+        refresh = tokens.issue_refresh_token(user)
+        pair = tokens.encode_pair(refresh)
+        return tokens.set_refresh_cookie(Response({
             'status': 'success',
             'message': 'Login successful',
             'data': {
-                'accessToken': str(refresh.access_token),
-                'user': serializer.data
+                **pair,
+                'user': user_serializer.one(user)
             }
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), pair['refreshToken'])
     else:
         return Response({
             'status': 'Bad request',
@@ -148,6 +245,101 @@ def login_user(request):
         }, status=status.HTTP_401_UNAUTHORIZED)
 
 
+@swagger_auto_schema(
+    method='post',
+    operation_description="Exchange a refresh token for a new access token and a rotated refresh token. "
+                          "The refresh token is read from the request body or, failing that, the refresh_token cookie. "
+                          "Each refresh token can be used once; reusing one revokes every token descended from the same login.",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'refreshToken': openapi.Schema(type=openapi.TYPE_STRING, description='Refresh token from login, registration or a previous refresh')
+        }
+    ),
+    responses={
+        200: openapi.Response(
+            description="Token refreshed",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Token refreshed',
+                    'data': {
+                        'accessToken': 'your_jwt_access_token',
+                        'refreshToken': 'your_new_jwt_refresh_token'
+                    }
+                }
+            }
+        ),
+        401: openapi.Response(
+            description="Invalid, expired or reused refresh token",
+            examples={
+                "application/json": {
+                    'status': 'Unauthorized',
+                    'message': 'Invalid or expired refresh token',
+                    'statusCode': 401
+                }
+            }
+        )
+    }
+)
+@api_view(['POST'])
+# An expired access token in the Authorization header must not block the refresh
+@authentication_classes([])
+@permission_classes([AllowAny])
+def refresh_token(request):
+    try:
+        user, refresh = tokens.rotate_refresh_token(tokens.get_presented_token(request, request.data))
+    except tokens.InvalidRefreshToken as e:
+        return tokens.delete_refresh_cookie(Response({
+            'status': 'Unauthorized',
+            'message': str(e),
+            'statusCode': status.HTTP_401_UNAUTHORIZED
+        }, status=status.HTTP_401_UNAUTHORIZED))
+    pair = tokens.encode_pair(refresh)
+    return tokens.set_refresh_cookie(Response({
+        'status': 'success',
+        'message': 'Token refreshed',
+        'data': pair
+    }, status=status.HTTP_200_OK), pair['refreshToken'])
+
+
+@swagger_auto_schema(
+    method='post',
+    operation_description="Revoke the access token used for this request and the refresh token presented "
+                          "in the body or cookie. With everywhere=true, revoke every token issued to the user so far.",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'refreshToken': openapi.Schema(type=openapi.TYPE_STRING, description='Refresh token to revoke'),
+            'everywhere': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Sign out of every session')
+        }
+    ),
+    responses={
+        200: openapi.Response(
+            description="Logged out",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Logged out'
+                }
+            }
+        )
+    }
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_user(request):
+    if request.data.get('everywhere') is True:
+        revocation.revoke_user_tokens(request.user)
+    else:
+        revocation.revoke_token(request.auth)
+        tokens.revoke_presented_token(tokens.get_presented_token(request, request.data), request.user)
+    return tokens.delete_refresh_cookie(Response({
+        'status': 'success',
+        'message': 'Logged out'
+    }, status=status.HTTP_200_OK))
+
+
 @swagger_auto_schema(
     method='get',
     operation_description="Retrieve user details by user ID.",
@@ -200,14 +392,12 @@ def get_user_details(request, id):
     try:
         # Retrieve user details
         user = User.objects.get(id=id)
-        # Check if the requesting user has access to this user's details (e.g., own record or in organizations they belong to or created)
-        # Example logic, adjust according to your actual requirements:
-        if request.user == user or request.user.organisations.filter(id=user.organisation.id).exists():
-            serializer = UserSerializer(user)
+        # The requesting user may see their own record or anyone they share an organisation with
+        if shares_organisation(request.user, user):
             return Response({
                 'status': 'success',
                 'message': 'User details retrieved',
-                'data': serializer.data
+                'data': user_serializer.one(user)
             }, status=status.HTTP_200_OK)
         else:
             return Response({
@@ -220,18 +410,50 @@ def get_user_details(request, id):
             'message': 'User not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+PAGINATION_PARAMETERS = [
+    openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from a previous page's next/previous link", type=openapi.TYPE_STRING),
+    openapi.Parameter('pageSize', openapi.IN_QUERY, description="Results per page", type=openapi.TYPE_INTEGER),
+]
+
+def invalid_cursor_response():
+    return Response({
+        'status': 'Bad Request',
+        'message': 'Invalid cursor'
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="List the organisations the user belongs to, one page at a time.",
+    manual_parameters=PAGINATION_PARAMETERS,
+    responses={
+        200: openapi.Response(
+            description="Organisations retrieved",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Organisations retrieved',
+                    'data': {
+                        'organisations': [{'orgId': 'abc123', 'name': "John's Organisation", 'description': None}],
+                        'next': 'http://example.com/api/organisations/?cursor=cD0xMDA%3D',
+                        'previous': None
+                    }
+                }
+            }
+        )
+    }
+)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_organisations(request):
     try:
-        # Retrieve organisations that the user belongs to or created
-        organisations = request.user.organisations.all()
-        serializer = OrganisationSerializer(organisations, many=True)
+        # Retrieve one page of the organisations the user belongs to
         return Response({
             'status': 'success',
             'message': 'Organisations retrieved',
-            'data': serializer.data
+            'data': response_cache.get_organisations_page(request, request.user)
         }, status=status.HTTP_200_OK)
+    except NotFound:
+        return invalid_cursor_response()
     except Exception as e:
         return Response({
             'status': 'Internal Server Error',
@@ -240,17 +462,215 @@ def get_organisations(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@swagger_auto_schema(
+    method='get',
+    operation_description="List the members of an organisation the user belongs to, one page at a time.",
+    manual_parameters=PAGINATION_PARAMETERS,
+    responses={
+        200: openapi.Response(
+            description="Members retrieved",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Members retrieved',
+                    'data': {
+                        'users': [{'userId': 'abc123', 'firstName': 'John', 'lastName': 'Doe', 'email': 'johndoe@example.com', 'phone': None}],
+                        'next': None,
+                        'previous': None
+                    }
+                }
+            }
+        )
+    }
+)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_organisation(request, orgId):
+def get_organisation_members(request, orgId):
     try:
-        # Retrieve a single organisation that the user belongs to or created
+        if not orgId.isdigit():
+            raise Organisation.DoesNotExist
         organisation = request.user.organisations.get(id=orgId)
-        serializer = OrganisationSerializer(organisation)
+        paginator = KeysetPagination()
+        members = paginator.paginate_queryset(
+            organisation.members.values('id', *user_serializer.value_fields), request
+        )
+        return Response({
+            'status': 'success',
+            'message': 'Members retrieved',
+            'data': paginator.get_page_data('users', user_serializer.many(members))
+        }, status=status.HTTP_200_OK)
+    except Organisation.DoesNotExist:
+        return Response({
+            'status': 'Not Found',
+            'message': 'Organisation not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except NotFound:
+        return invalid_cursor_response()
+    except Exception as e:
+        return Response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to retrieve members',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Stream every membership of every organisation the user belongs to, ordered by organisation. "
+                          "Each row has a cursor; pass the last one received as 'cursor' to resume an interrupted export.",
+    manual_parameters=[
+        openapi.Parameter('fmt', openapi.IN_QUERY, description="Output format", type=openapi.TYPE_STRING, enum=['ndjson', 'csv'], default='ndjson'),
+        openapi.Parameter('compress', openapi.IN_QUERY, description="Set to 'gzip' for a gzipped file", type=openapi.TYPE_STRING, enum=['gzip']),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Resume after the row with this cursor", type=openapi.TYPE_STRING),
+    ],
+    responses={
+        200: openapi.Response(
+            description="One membership per line",
+            examples={
+                "application/x-ndjson": {
+                    'cursor': '12.345', 'orgId': '01J9ZQ3V8N6R2K4M7T1W5X0Y3A', 'organisationName': "John's Organisation",
+                    'userId': '01J9ZQ3V8N6R2K4M7T1W5X0Y3B', 'firstName': 'John', 'lastName': 'Doe',
+                    'email': 'johndoe@example.com', 'phone': None, 'dateJoined': '2024-07-01T12:00:00Z'
+                }
+            }
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_memberships(request):
+    try:
+        exporter = export.Exporter(request.query_params.get('fmt', 'ndjson'), request.query_params.get('compress'))
+        after = export.decode_cursor(request.query_params.get('cursor'))
+    except ValueError as e:
+        return Response({
+            'status': 'Bad Request',
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    querysets = export.memberships(get_org_ids(request.user), after)
+    return exporter.response(export.stream(exporter, querysets))
+
+
+SEARCH_PARAMETERS = [
+    openapi.Parameter('q', openapi.IN_QUERY, description="Words to search for; each must match the start of a word", type=openapi.TYPE_STRING, required=True),
+    *PAGINATION_PARAMETERS,
+]
+
+def invalid_search_response():
+    return Response({
+        'status': 'Bad Request',
+        'message': 'Search query needs a word of at least %d characters' % getattr(settings, 'USERAPP_SEARCH_MIN_LENGTH', 2)
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Search the organisations the user belongs to by name and description, one page at a time.",
+    manual_parameters=SEARCH_PARAMETERS,
+    responses={
+        200: openapi.Response(
+            description="Organisations found",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Organisations found',
+                    'data': {
+                        'organisations': [{'orgId': '01J9ZQ3V8N6R2K4M7T1W5X0Y3A', 'name': "John's Organisation", 'description': None}],
+                        'next': None,
+                        'previous': None
+                    }
+                }
+            }
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_organisations(request):
+    words = search.parse_query(request.query_params.get('q'))
+    if not words:
+        return invalid_search_response()
+    try:
+        paginator = KeysetPagination()
+        rows = paginator.paginate_queryset(
+            search.organisations(get_org_ids(request.user), words).values('id', *organisation_serializer.value_fields),
+            request,
+        )
+        return Response({
+            'status': 'success',
+            'message': 'Organisations found',
+            'data': paginator.get_page_data('organisations', organisation_serializer.many(rows))
+        }, status=status.HTTP_200_OK)
+    except NotFound:
+        return invalid_cursor_response()
+    except Exception as e:
+        return Response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to search organisations',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Search the members of the user's organisations by first name, last name and email, one page at a time.",
+    manual_parameters=SEARCH_PARAMETERS,
+    responses={
+        200: openapi.Response(
+            description="Users found",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Users found',
+                    'data': {
+                        'users': [{'userId': '01J9ZQ3V8N6R2K4M7T1W5X0Y3B', 'firstName': 'John', 'lastName': 'Doe', 'email': 'johndoe@example.com', 'phone': None}],
+                        'next': None,
+                        'previous': None
+                    }
+                }
+            }
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_users(request):
+    words = search.parse_query(request.query_params.get('q'))
+    if not words:
+        return invalid_search_response()
+    try:
+        paginator = KeysetPagination()
+        rows = paginator.paginate_queryset(
+            search.users(get_org_ids(request.user), words).values('id', *user_serializer.value_fields), request,
+        )
+        return Response({
+            'status': 'success',
+            'message': 'Users found',
+            'data': paginator.get_page_data('users', user_serializer.many(rows))
+        }, status=status.HTTP_200_OK)
+    except NotFound:
+        return invalid_cursor_response()
+    except Exception as e:
+        return Response({
+            'status': 'Internal Server Error',
+            'message': 'Failed to search users',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_organisation(request, orgId):
+    try:
+        # Retrieve a single organisation that the user belongs to
+        payload = None
+        if orgId.isdigit() and int(orgId) in get_org_ids(request.user):
+            payload = response_cache.get_organisation_payload(int(orgId))
+        if payload is None:
+            raise Organisation.DoesNotExist
         return Response({
             'status': 'success',
             'message': 'Organisation retrieved',
-            'data': serializer.data
+            'data': payload
         }, status=status.HTTP_200_OK)
     except Organisation.DoesNotExist:
         return Response({
@@ -290,22 +710,55 @@ def create_organisation(request):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@swagger_auto_schema(
+    method='post',
+    operation_description=(
+        "Add users to an organisation the caller belongs to. Send a list in 'userIds' "
+        "to add many users at once, or a single 'userId'."
+    ),
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'userIds': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+            'userId': openapi.Schema(type=openapi.TYPE_INTEGER, description='Single user id')
+        }
+    ),
+    responses={
+        200: openapi.Response(
+            description="Users added",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Users added to organisation',
+                    'data': {'added': [2, 3], 'alreadyMembers': [4], 'unknown': [99]}
+                }
+            }
+        )
+    }
+)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_user_to_organisation(request, orgId):
     try:
         organisation = request.user.organisations.get(id=orgId)
-        userId = request.data.get('userId')
-        user_to_add = User.objects.get(id=userId)
-        
-        # Optionally, perform additional checks or validations here
-        
-        # Add user to organisation
-        organisation.members.add(user_to_add)
-        
+        try:
+            user_ids, is_batch = parse_user_ids(
+                request.data, getattr(settings, 'USERAPP_MEMBERSHIP_BATCH_LIMIT', 1000)
+            )
+        except ValueError as e:
+            return Response({
+                'status': 'Bad Request',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        added, already_members, unknown = add_members(organisation, user_ids)
+        if not is_batch and unknown:
+            raise User.DoesNotExist
+
         return Response({
             'status': 'success',
-            'message': 'User added to organisation successfully'
+            'message': 'Users added to organisation' if is_batch else 'User added to organisation successfully',
+            'data': {'added': added, 'alreadyMembers': already_members, 'unknown': unknown}
         }, status=status.HTTP_200_OK)
     except Organisation.DoesNotExist:
         return Response({
@@ -324,3 +777,194 @@ def add_user_to_organisation(request, orgId):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+IMPORT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+
+@swagger_auto_schema(
+    method='post',
+    operation_description=(
+        "Bulk import users from CSV or NDJSON. Send the file as the raw request body "
+        "(Content-Type text/csv or application/x-ndjson) or as a multipart upload named 'file'. "
+        "Each user gets a default organisation; rows that fail are listed in the report."
+    ),
+    responses={
+        200: openapi.Response(
+            description="Import finished",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Import finished',
+                    'data': {
+                        'created': 2,
+                        'failed': 1,
+                        'errors': [{'line': 3, 'errors': {'email': ['Enter a valid email address.']}}]
+                    }
+                }
+            }
+        ),
+        415: openapi.Response(description="Unsupported import format")
+    }
+)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_users(request):
+    if request.content_type.startswith('multipart/form-data'):
+        upload = request.FILES.get('file')
+        name = upload.name.lower() if upload else ''
+        fmt = next((f for ext, f in IMPORT_EXTENSIONS.items() if name.endswith(ext)), None)
+        stream = upload
+    else:
+        fmt = IMPORT_CONTENT_TYPES.get(request.content_type)
+        stream = request.stream
+    if fmt is None or stream is None:
+        return Response({
+            'status': 'Unsupported Media Type',
+            'message': 'Send CSV or NDJSON as the request body or as a file upload named "file"',
+            'statusCode': status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    rows = bulk_import.iter_rows(bulk_import.iter_byte_lines(stream), fmt)
+    report = bulk_import.import_users(rows, chunk_size=getattr(settings, 'USERAPP_IMPORT_CHUNK_SIZE', 500))
+    return Response({
+        'status': 'success',
+        'message': 'Import finished',
+        'data': report.as_dict()
+    }, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Hit/miss counters of the organisation response cache in this process.",
+    responses={
+        200: openapi.Response(
+            description="Cache statistics",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Cache statistics retrieved',
+                    'data': {
+                        'organisation': {'hits': 120, 'misses': 8},
+                        'organisations_page': {'hits': 40, 'misses': 5}
+                    }
+                }
+            }
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_cache_stats(request):
+    return Response({
+        'status': 'success',
+        'message': 'Cache statistics retrieved',
+        'data': response_cache.stats.as_dict()
+    }, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Allowed/rejected counters of the login and registration throttles in this process.",
+    responses={
+        200: openapi.Response(
+            description="Throttle statistics",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Throttle statistics retrieved',
+                    'data': {
+                        'scopes': {'login_ip': {'allowed': 950, 'rejected': 50}},
+                        'hashesAvoided': 50
+                    }
+                }
+            }
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_throttle_stats(request):
+    return Response({
+        'status': 'success',
+        'message': 'Throttle statistics retrieved',
+        'data': throttling.stats.as_dict()
+    }, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="SQL statements and database time per view in this process.",
+    responses={
+        200: openapi.Response(
+            description="Query statistics",
+            examples={
+                "application/json": {
+                    'status': 'success',
+                    'message': 'Query statistics retrieved',
+                    'data': {
+                        'get_user_details': {
+                            'requests': 200, 'queries': 400, 'queriesPerRequest': 2.0, 'maxQueries': 3,
+                            'dbTimeMs': 35.2, 'slowestMs': 1.4,
+                            'slowestSql': 'SELECT "userapp_user"."id", ... WHERE "userapp_user"."id" = %s'
+                        }
+                    }
+                }
+            }
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_query_stats(request):
+    return Response({
+        'status': 'success',
+        'message': 'Query statistics retrieved',
+        'data': instrumentation.stats.as_dict()
+    }, status=status.HTTP_200_OK)
+
+
+@require_GET
+@condition(etag_func=lambda request, fmt: schema.get_schema_document(fmt).etag)
+def get_schema_file(request, fmt):
+    # Plain Django view: serves pre-rendered bytes, revalidated by ETag (304 via @condition)
+    document = schema.get_schema_document(fmt)
+    response = HttpResponse(document.content, content_type=document.content_type)
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'USERAPP_SCHEMA_MAX_AGE', 86400)}"
+    return response
+
+
+class SchemaUIView(TemplateView):
+    """ Swagger UI (or ReDoc, with ``renderer_class=ReDocRenderer``) for the schema at SPEC_URL """
+    renderer_class = SwaggerUIRenderer
+
+    def get_template_names(self):
+        return [self.renderer_class.template]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Given no schema, drf_yasg's renderer only fills in its settings and URLs
+        self.renderer_class().set_context(context)
+        context['title'] = schema.api_info.title
+        return context
+
+
+def health(request):
+    # For load balancer probes: no DRF, no database, no schema generation
+    return JsonResponse({'status': 'ok'})
+
+
+@require_GET
+def get_metrics(request):
+    # Prometheus scrape target; plain Django like health() so scrapes stay cheap
+    token = getattr(settings, 'USERAPP_METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(metrics.registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,133 @@
+"""
+Single-writer queue with group commit.
+
+SQLite allows one writer at a time. When several request threads write at
+once, all but one sleep in SQLite's busy handler and retry. Under load that
+means long waits and eventually "database is locked". ``WriteQueue`` hands
+write jobs to one writer thread instead. Every job queued while a commit is
+in progress joins the next batch. A batch runs in one transaction, so it
+pays for one lock acquisition and one commit however many jobs it holds.
+Each job runs in its own savepoint, so a failing job is rolled back and
+reports its exception without affecting the rest of the batch.
+
+A job submitted from inside an open transaction runs inline on the
+caller's connection. Handing it to another connection would split the
+caller's transaction in two. This is also how jobs run under TestCase.
+With ``USERAPP_WRITE_QUEUE`` off, every job runs inline.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+
+
+class WriteQueue:
+
+    def __init__(self, using='default', enabled=True, max_batch=64):
+        self.using = using
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self._jobs = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='userapp-writer', daemon=True)
+                    self._thread.start()
+
+    def submit(self, fn, *args):
+        """ Queue ``fn(*args)`` for the writer thread and return its future """
+        self._start()
+        future = Future()
+        self._jobs.put((future, fn, args))
+        return future
+
+    def run(self, fn, *args):
+        """ Run ``fn(*args)`` as a write job and return its result once it is committed """
+        if not self.enabled or connections[self.using].in_atomic_block:
+            with transaction.atomic(using=self.using):
+                return fn(*args)
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        """ Async version of run() """
+        # The inline check has to see the connection the caller's sync code uses
+        return await sync_to_async(self.run)(fn, *args)
+
+    def stop(self):
+        """
+        Let queued jobs finish, then end the writer thread and close its
+        connection; the next job starts a new one. For use while nothing else
+        is submitting, e.g. before the database is swapped out in a benchmark.
+        """
+        with self._lock:
+            if self._thread is None:
+                return
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            job = self._jobs.get()
+            while job is not None:
+                batch.append(job)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                # stop() was called
+                stopping = True
+            if batch:
+                self._commit(batch)
+        connections[self.using].close()
+
+    def _commit(self, batch):
+        connections[self.using].close_if_unusable_or_obsolete()
+        if len(batch) == 1:
+            # Nothing to isolate this job from, so skip the savepoint
+            future, fn, args = batch[0]
+            if future.set_running_or_notify_cancel():
+                try:
+                    with transaction.atomic(using=self.using):
+                        result = fn(*args)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+            return
+        outcomes = []
+        try:
+            with transaction.atomic(using=self.using):
+                for future, fn, args in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic(using=self.using):
+                            outcomes.append((future, fn(*args), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            # The commit itself failed, so nothing in the batch was written
+            for future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+
+write_queue = WriteQueue(enabled=getattr(settings, 'USERAPP_WRITE_QUEUE', False))